@@ -0,0 +1,186 @@
+import asyncio
+import gzip
+import logging
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from .. import config, database
+from .services import admission
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+class AdmissionMiddleware:
+    """Run API requests only once the worker's admission controller has a slot for them."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        route_class = None
+        if scope["type"] == "http" and config.ADMISSION_CONTROL:
+            route_class = admission.classify(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        controller = admission.get_admission_controller()
+        if not await controller.acquire(route_class):
+            response = JSONResponse(
+                {"detail": "Server is overloaded, retry later"}, status_code=503,
+                headers={"Retry-After": str(config.ADMISSION_RETRY_AFTER)}
+            )
+            await response(scope, receive, send)
+            return
+        token = admission.current_class.set(route_class)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.current_class.reset(token)
+            controller.release(route_class)
+
+class CancelOnDisconnectMiddleware:
+    """
+    Cancel a GET request's running queries when its client disconnects.
+
+    Watches the connection for `http.disconnect` while the request is handled and then
+    sends a cancel request for the statements running on the request's database
+    connections, which frees them for other requests instead of finishing work nobody
+    will read. Streams watch for disconnects themselves and are left alone.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (scope["type"] != "http" or scope["method"] != "GET" or not config.CANCEL_ON_DISCONNECT
+                or scope["path"].startswith("/analytics/stream")):
+            await self.app(scope, receive, send)
+            return
+
+        connections = database.RequestConnections()
+        messages: asyncio.Queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        responded = False
+
+        async def send_response(message):
+            nonlocal responded
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                # Servers report a disconnect to any receive() after the response is complete
+                responded = True
+            await send(message)
+
+        async def watch():
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    if not responded:
+                        logger.info("Client disconnected from %s; cancelling its queries", scope["path"])
+                        await loop.run_in_executor(None, connections.cancel)
+                    return
+
+        watcher = loop.create_task(watch())
+        token = database.request_connections.set(connections)
+        try:
+            await self.app(scope, messages.get, send_response)
+        finally:
+            database.request_connections.reset(token)
+            watcher.cancel()
+
+# gzip level and brotli quality: most of the size reduction for a fraction of the CPU
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Bodies at least this large are compressed in the threadpool, off the event loop
+_OFFLOAD_SIZE = 64 * 1024
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the content coding to compress a response with.
+
+    Args:
+        accept_encoding: The request's Accept-Encoding header
+
+    Returns:
+        "br" or "gzip", whichever the client accepts with the higher q-value (brotli on
+        ties, if the brotli package is installed), or None to send the body as is
+    """
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            weights[coding.strip().lower()] = quality
+    available = (["br"] if brotli is not None else []) + ["gzip"]
+    ranked = sorted(
+        ((weights.get(coding, weights.get("*", 0.0)), -index, coding) for index, coding in enumerate(available)),
+        reverse=True
+    )
+    return ranked[0][2] if ranked and ranked[0][0] > 0 else None
+
+def compress(encoding: str, body: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+class CompressionMiddleware:
+    """
+    Compress response bodies of at least COMPRESSION_MIN_SIZE bytes with brotli or gzip.
+
+    The coding is negotiated from Accept-Encoding. Only complete bodies are compressed;
+    streamed responses (the analytics stream), already encoded ones and small ones pass
+    through untouched.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        encoding = None
+        if scope["type"] == "http" and config.RESPONSE_COMPRESSION:
+            encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if (message.get("more_body", False) or len(body) < config.COMPRESSION_MIN_SIZE
+                    or "content-encoding" in headers):
+                await send(start)
+                start = None
+                await send(message)
+                return
+            if len(body) >= _OFFLOAD_SIZE:
+                body = await asyncio.get_running_loop().run_in_executor(None, compress, encoding, body)
+            else:
+                body = compress(encoding, body)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            start = None
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
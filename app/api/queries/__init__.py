@@ -1,7 +1,3 @@
 """
 Database query layer for the application
 """
-
-from .health_queries import check_database_connection
-
-__all__ = ['check_database_connection'] 
\ No newline at end of file
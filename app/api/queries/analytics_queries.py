@@ -1,8 +1,41 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, asc, extract
+from sqlalchemy import func, desc, asc, and_
+from typing import Optional
+from datetime import datetime, timezone
 from ... import models, schemas
 
-def get_orders_by_zip_code_query(db: Session, address_type: str = "billing", order_by: str = "desc"):
+def filter_order_window(query, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                        column=models.Order.order_date):
+    """
+    Restrict a query over orders to a half-open order_date window.
+    
+    Filtering on the partition key lets Postgres prune the monthly partitions
+    that fall outside the window. Timezone-aware bounds are converted to naive UTC
+    to match the column type; comparing against timestamptz would defeat pruning.
+    
+    Args:
+        query: Query selecting from orders
+        start_date: Inclusive lower bound on order_date
+        end_date: Exclusive upper bound on order_date
+        column: Partition key column to filter (orders or order_shipping_addresses)
+    
+    Returns:
+        The filtered query
+    """
+    if start_date is not None:
+        query = query.filter(column >= as_naive_utc(start_date))
+    if end_date is not None:
+        query = query.filter(column < as_naive_utc(end_date))
+    return query
+
+def as_naive_utc(value: datetime) -> datetime:
+    """Convert a datetime to the naive UTC representation stored in order_date."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def get_orders_by_zip_code_query(db: Session, address_type: str = "billing", order_by: str = "desc",
+                                 start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
     """
     Get order count aggregated by zip code query.
     
@@ -10,6 +43,8 @@ def get_orders_by_zip_code_query(db: Session, address_type: str = "billing", ord
         db: Database session
         address_type: Type of address to analyze (billing or shipping)
         order_by: Sort order (asc or desc)
+        start_date: Inclusive lower bound on order_date
+        end_date: Exclusive upper bound on order_date
     
     Returns:
         Query object for zip code analytics
@@ -30,9 +65,17 @@ def get_orders_by_zip_code_query(db: Session, address_type: str = "billing", ord
             models.OrderShippingAddress.address_id == models.Address.id
         ).join(
             models.Order,
-            models.Order.id == models.OrderShippingAddress.order_id
+            and_(
+                models.Order.id == models.OrderShippingAddress.order_id,
+                models.Order.order_date == models.OrderShippingAddress.order_date
+            )
+        )
+        # Range filters are not propagated across the join, so prune both sides
+        query = filter_order_window(
+            query, start_date, end_date, models.OrderShippingAddress.order_date
         )
     
+    query = filter_order_window(query, start_date, end_date)
     query = query.group_by(models.Address.zip_code)
     
     if order_by.lower() == "asc":
@@ -42,44 +85,61 @@ def get_orders_by_zip_code_query(db: Session, address_type: str = "billing", ord
     
     return query
 
-def get_orders_by_time_of_day_query(db: Session):
+def get_orders_by_time_of_day_query(db: Session, start_date: Optional[datetime] = None,
+                                    end_date: Optional[datetime] = None):
     """
     Get order count aggregated by hour of day query.
     
+    Groups by the stored order_hour column (hour in BUSINESS_TIMEZONE), which
+    an index-only scan of its index can serve.
+    
     Args:
         db: Database session
+        start_date: Inclusive lower bound on order_date
+        end_date: Exclusive upper bound on order_date
     
     Returns:
         Query object for time of day analytics
     """
-    return db.query(
-        extract('hour', models.Order.order_date).label('hour'),
-        func.count(models.Order.id).label('order_count')
-    ).group_by(
-        extract('hour', models.Order.order_date)
+    query = db.query(
+        models.Order.order_hour.label('hour'),
+        func.count().label('order_count')
+    )
+    return filter_order_window(query, start_date, end_date).group_by(
+        models.Order.order_hour
     )
 
-def get_orders_by_day_of_week_query(db: Session):
+def get_orders_by_day_of_week_query(db: Session, start_date: Optional[datetime] = None,
+                                    end_date: Optional[datetime] = None):
     """
     Get order count aggregated by day of week query.
     
+    Groups by the stored order_dow column (0 = Monday, 6 = Sunday, in
+    BUSINESS_TIMEZONE), which an index-only scan of its index can serve.
+    
     Args:
         db: Database session
+        start_date: Inclusive lower bound on order_date
+        end_date: Exclusive upper bound on order_date
     
     Returns:
         Query object for day of week analytics
     """
-    return db.query(
-        extract('dow', models.Order.order_date).label('day_of_week'),
-        func.count(models.Order.id).label('order_count')
-    ).group_by(
-        extract('dow', models.Order.order_date)
+    query = db.query(
+        models.Order.order_dow.label('day_of_week'),
+        func.count().label('order_count')
+    )
+    return filter_order_window(query, start_date, end_date).group_by(
+        models.Order.order_dow
     )
 
 def get_top_in_store_customers_query(db: Session, limit: int = 5):
     """
     Get top customers by number of in-store orders query.
     
+    Reads the maintained per-customer counters, so the ranking is a top-N scan of
+    the in_store_order_count index rather than a group-by over all in-store orders.
+    
     Args:
         db: Database session
         limit: Number of top customers to return
@@ -92,17 +152,12 @@ def get_top_in_store_customers_query(db: Session, limit: int = 5):
         models.Customer.first_name,
         models.Customer.last_name,
         models.Customer.email,
-        func.count(models.Order.id).label('in_store_order_count')
+        models.CustomerOrderStats.in_store_order_count
     ).join(
-        models.Order,
-        models.Order.customer_id == models.Customer.id
+        models.CustomerOrderStats,
+        models.CustomerOrderStats.customer_id == models.Customer.id
     ).filter(
-        models.Order.order_type == 'in_store'
-    ).group_by(
-        models.Customer.id,
-        models.Customer.first_name,
-        models.Customer.last_name,
-        models.Customer.email
+        models.CustomerOrderStats.in_store_order_count > 0
     ).order_by(
-        desc('in_store_order_count')
+        desc(models.CustomerOrderStats.in_store_order_count)
     ).limit(limit)
@@ -0,0 +1,144 @@
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import func, text
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+from ... import models
+from .analytics_queries import filter_order_window, as_naive_utc
+from .version_queries import bump_customer_versions, bump_table_versions
+
+# Archived analytics dimensions and the SQL expression each one groups archived
+# orders by. `o` is the batch of orders being archived, `a` the joined address.
+ROLLUP_DIMENSIONS = {
+    "billing_zip": ("a.zip_code", "JOIN addresses a ON a.id = o.billing_address_id"),
+    "shipping_zip": (
+        "a.zip_code",
+        "JOIN order_shipping_addresses s ON s.order_id = o.id AND s.order_date = o.order_date "
+        "JOIN addresses a ON a.id = s.address_id"
+    ),
+    "hour": ("CAST(o.order_hour AS text)", ""),
+    "dow": ("CAST(o.order_dow AS text)", ""),
+}
+
+def select_archive_batch(db: Session, cutoff: datetime, batch_size: int) -> List[Tuple[int, datetime]]:
+    """
+    Lock the oldest batch of hot orders placed before the cutoff.
+
+    SKIP LOCKED lets several archivers run side by side without blocking each other
+    or the write path.
+
+    Args:
+        db: Database session
+        cutoff: Orders placed before this time are eligible
+        batch_size: Maximum number of orders to select
+
+    Returns:
+        List of (order id, order_date) pairs
+    """
+    return db.execute(text("""
+        SELECT id, order_date FROM orders
+        WHERE order_date < :cutoff
+        ORDER BY order_date
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    """), {"cutoff": cutoff, "batch_size": batch_size}).fetchall()
+
+def move_orders_to_archive(db: Session, order_ids: List[int], cutoff: datetime) -> List[int]:
+    """
+    Copy a batch of orders with their shipping rows into the archive, add them to
+    the daily rollups and delete them from the hot tables.
+
+    Customers list their hot orders, so the versions of the customers whose orders
+    moved and of the orders table are bumped. The caller owns the transaction.
+
+    Args:
+        db: Database session
+        order_ids: IDs returned by select_archive_batch
+        cutoff: The cutoff used to select the batch, repeated so both partitioned
+            tables are pruned to the archived months
+
+    Returns:
+        IDs of the customers whose orders were archived
+    """
+    params = {"ids": order_ids, "cutoff": cutoff}
+    batch = "o.id = ANY(:ids) AND o.order_date < :cutoff"
+    for dimension, (key, joins) in ROLLUP_DIMENSIONS.items():
+        db.execute(text(f"""
+            INSERT INTO order_archive_rollups (bucket_date, dimension, key, order_count)
+            SELECT CAST(o.order_date AS date), '{dimension}', {key}, count(*)
+            FROM orders o {joins}
+            WHERE {batch}
+            GROUP BY 1, 3
+            ON CONFLICT (bucket_date, dimension, key)
+            DO UPDATE SET order_count = order_archive_rollups.order_count + excluded.order_count
+        """), params)
+    db.execute(text(f"""
+        INSERT INTO orders_archive
+            (id, customer_id, order_date, total_amount, status, order_type, billing_address_id, version, archived_at)
+        SELECT o.id, o.customer_id, o.order_date, o.total_amount, o.status, o.order_type,
+               o.billing_address_id, o.version, now() at time zone 'utc'
+        FROM orders o
+        WHERE {batch}
+    """), params)
+    db.execute(text("""
+        WITH moved AS (
+            DELETE FROM order_shipping_addresses
+            WHERE order_id = ANY(:ids) AND order_date < :cutoff
+            RETURNING id, order_id, order_date, address_id, sequence
+        )
+        INSERT INTO order_shipping_addresses_archive (id, order_id, order_date, address_id, sequence)
+        SELECT id, order_id, order_date, address_id, sequence FROM moved
+    """), params)
+    customer_ids = sorted({customer_id for customer_id, in db.execute(text(
+        "DELETE FROM orders WHERE id = ANY(:ids) AND order_date < :cutoff RETURNING customer_id"
+    ), params)})
+    bump_table_versions(db, "orders")
+    bump_customer_versions(db, customer_ids)
+    return customer_ids
+
+def get_archived_order(db: Session, order_id: int):
+    return db.query(models.ArchivedOrder).filter(models.ArchivedOrder.id == order_id).first()
+
+def get_archived_orders_by_ids(db: Session, order_ids: List[int]) -> List[models.ArchivedOrder]:
+    """Load several archived orders with their addresses in a fixed number of queries."""
+    return db.query(models.ArchivedOrder).filter(models.ArchivedOrder.id.in_(order_ids)).options(
+        selectinload(models.ArchivedOrder.billing_address),
+        selectinload(models.ArchivedOrder.shipping_addresses).selectinload(models.ArchivedOrderShippingAddress.address),
+    ).all()
+
+def get_archived_customer_orders(db: Session, customer_id: int, skip: int = 0, limit: int = 100,
+                                 start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
+    query = db.query(models.ArchivedOrder).filter(
+        models.ArchivedOrder.customer_id == customer_id
+    )
+    query = filter_order_window(query, start_date, end_date, models.ArchivedOrder.order_date)
+    return query.order_by(models.ArchivedOrder.id.desc()).offset(skip).limit(limit).all()
+
+def get_archive_rollup_counts(db: Session, dimension: str, start_date: Optional[datetime] = None,
+                              end_date: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Get archived order counts for one analytics dimension.
+
+    Rollups are bucketed per day, so a time window is applied at day granularity:
+    a bucket counts if its day starts inside [start_date, end_date).
+
+    Args:
+        db: Database session
+        dimension: One of ROLLUP_DIMENSIONS
+        start_date: Inclusive lower bound on order_date
+        end_date: Exclusive upper bound on order_date
+
+    Returns:
+        Mapping of dimension key to archived order count
+    """
+    rollup = models.ArchivedOrderRollup
+    query = db.query(
+        rollup.key,
+        func.sum(rollup.order_count)
+    ).filter(
+        rollup.dimension == dimension
+    )
+    if start_date is not None:
+        query = query.filter(rollup.bucket_date >= as_naive_utc(start_date))
+    if end_date is not None:
+        query = query.filter(rollup.bucket_date < as_naive_utc(end_date))
+    return {key: int(count) for key, count in query.group_by(rollup.key).all()}
@@ -1,18 +1,64 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import or_, desc, exists, lambda_stmt, select
+from typing import List
 from ... import models, schemas
+from .notification_queries import notify_change
+from .version_queries import bump_customer_versions, bump_table_versions
+
+# The hot lookups below are lambda statements: SQLAlchemy builds and compiles each one
+# once, caches it by the lambda's code location, and afterwards only extracts the
+# closure variables as bound parameters (see scripts/benchmarks/statement_cache.py).
 
 def get_customer(db: Session, customer_id: int):
-    return db.query(models.Customer).filter(models.Customer.id == customer_id).first()
+    return db.execute(lambda_stmt(
+        lambda: select(models.Customer).where(models.Customer.id == customer_id).limit(1)
+    )).scalars().first()
+
+def customer_exists(db: Session, customer_id: int) -> bool:
+    return db.execute(lambda_stmt(
+        lambda: select(exists().where(models.Customer.id == customer_id))
+    )).scalar()
 
 def get_customer_by_email(db: Session, email: str):
-    return db.query(models.Customer).filter(models.Customer.email == email).first()
+    return db.execute(lambda_stmt(
+        lambda: select(models.Customer).where(models.Customer.email == email).limit(1)
+    )).scalars().first()
 
 def get_customer_by_telephone(db: Session, telephone: str):
-    return db.query(models.Customer).filter(models.Customer.telephone == telephone).first()
+    return db.execute(lambda_stmt(
+        lambda: select(models.Customer).where(models.Customer.telephone == telephone).limit(1)
+    )).scalars().first()
 
-def get_customers(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Customer).offset(skip).limit(limit).all()
+# Customer list sort keys backed by the denormalized order counters
+CUSTOMER_SORT_COLUMNS = {
+    "total_spend": models.CustomerOrderStats.total_spend,
+    "order_count": models.CustomerOrderStats.order_count,
+    "last_order_at": models.CustomerOrderStats.last_order_at,
+}
+
+def get_customer_ids(db: Session, skip: int = 0, limit: int = 100, sort_by: str = "id") -> List[int]:
+    """Get one page of customer ids; the customers themselves come from the cache."""
+    query = db.query(models.Customer.id)
+    if sort_by in CUSTOMER_SORT_COLUMNS:
+        query = query.outerjoin(
+            models.CustomerOrderStats
+        ).order_by(
+            desc(CUSTOMER_SORT_COLUMNS[sort_by]).nullslast(),
+            models.Customer.id
+        )
+    else:
+        query = query.order_by(models.Customer.id)
+    return [customer_id for customer_id, in query.offset(skip).limit(limit)]
+
+def get_customers_by_ids(db: Session, customer_ids: List[int]) -> List[models.Customer]:
+    """Load several customers with their addresses and orders in a fixed number of queries."""
+    return db.query(models.Customer).filter(models.Customer.id.in_(customer_ids)).options(
+        selectinload(models.Customer.billing_addresses),
+        selectinload(models.Customer.shipping_addresses),
+        selectinload(models.Customer.orders).selectinload(models.Order.billing_address),
+        selectinload(models.Customer.orders).selectinload(models.Order.shipping_addresses)
+            .selectinload(models.OrderShippingAddress.address),
+    ).all()
 
 def create_customer(db: Session, customer: schemas.CustomerCreate):
     db_customer = models.Customer(
@@ -22,6 +68,9 @@ def create_customer(db: Session, customer: schemas.CustomerCreate):
         telephone=customer.telephone
     )
     db.add(db_customer)
+    db.flush()
+    notify_change(db, "customer", id=db_customer.id)
+    bump_table_versions(db, "customers")
     db.commit()
     db.refresh(db_customer)
     return db_customer
@@ -33,17 +82,21 @@ def create_customer_address(db: Session, address: schemas.AddressCreate, custome
         shipping_customer_id=customer_id if not is_billing else None
     )
     db.add(db_address)
+    db.flush()
+    notify_change(db, "address", id=db_address.id, customer_id=customer_id)
+    bump_table_versions(db, "addresses")
+    bump_customer_versions(db, [customer_id])
     db.commit()
     db.refresh(db_address)
     return db_address
 
 def get_customer_addresses(db: Session, customer_id: int):
-    return db.query(models.Address).filter(
-        or_(
+    return db.execute(lambda_stmt(
+        lambda: select(models.Address).where(or_(
             models.Address.billing_customer_id == customer_id,
             models.Address.shipping_customer_id == customer_id
-        )
-    ).all()
+        ))
+    )).scalars().all()
 
 def search_customers(db: Session, query: str):
     return db.query(models.Customer).filter(
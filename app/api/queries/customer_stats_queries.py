@@ -0,0 +1,81 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, select, union_all
+from sqlalchemy.dialects.postgresql import insert
+from typing import List
+from ... import models
+
+def increment_customer_order_stats(db: Session, orders: List):
+    """
+    Add newly created orders to their customers' counters.
+
+    Orders are summed per customer and written by a single INSERT ... ON CONFLICT DO
+    UPDATE in customer order, so concurrent writers are serialized on each stats row and
+    lock rows in the same order. The caller owns the transaction, so the counters commit
+    or roll back together with the orders.
+
+    Args:
+        db: Database session
+        orders: The inserted orders (ORM objects or rows with the order columns)
+    """
+    totals = {}
+    for order in orders:
+        is_in_store = order.order_type == "in_store"
+        row = totals.setdefault(order.customer_id, {
+            "customer_id": order.customer_id, "order_count": 0, "in_store_order_count": 0,
+            "online_order_count": 0, "total_spend": 0, "last_order_at": order.order_date
+        })
+        row["order_count"] += 1
+        row["in_store_order_count"] += 1 if is_in_store else 0
+        row["online_order_count"] += 0 if is_in_store else 1
+        row["total_spend"] += order.total_amount
+        row["last_order_at"] = max(row["last_order_at"], order.order_date)
+
+    stats = models.CustomerOrderStats.__table__
+    stmt = insert(stats).values([totals[customer_id] for customer_id in sorted(totals)])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[stats.c.customer_id],
+        set_={
+            "order_count": stats.c.order_count + stmt.excluded.order_count,
+            "in_store_order_count": stats.c.in_store_order_count + stmt.excluded.in_store_order_count,
+            "online_order_count": stats.c.online_order_count + stmt.excluded.online_order_count,
+            "total_spend": stats.c.total_spend + stmt.excluded.total_spend,
+            "last_order_at": func.greatest(stats.c.last_order_at, stmt.excluded.last_order_at)
+        }
+    )
+    db.execute(stmt)
+
+def rebuild_customer_order_stats(db: Session) -> int:
+    """
+    Recompute every customer's counters from the hot and archived orders.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Number of customers with counters after the rebuild
+    """
+    stats = models.CustomerOrderStats.__table__
+    columns = ["customer_id", "id", "order_type", "total_amount", "order_date"]
+    orders = union_all(
+        select(*[models.Order.__table__.c[name] for name in columns]),
+        select(*[models.ArchivedOrder.__table__.c[name] for name in columns])
+    ).subquery()
+    source = select(
+        orders.c.customer_id,
+        func.count(orders.c.id),
+        func.count(case([(orders.c.order_type == "in_store", orders.c.id)])),
+        func.count(case([(orders.c.order_type != "in_store", orders.c.id)])),
+        func.sum(orders.c.total_amount),
+        func.max(orders.c.order_date)
+    ).group_by(orders.c.customer_id)
+
+    db.execute(stats.delete())
+    db.execute(stats.insert().from_select(
+        [
+            "customer_id", "order_count", "in_store_order_count",
+            "online_order_count", "total_spend", "last_order_at"
+        ],
+        source
+    ))
+    db.commit()
+    return db.query(func.count(stats.c.customer_id)).scalar()
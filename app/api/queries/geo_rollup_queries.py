@@ -0,0 +1,125 @@
+import random
+from sqlalchemy.orm import Session
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert
+from collections import Counter
+from typing import List, Optional, Tuple
+from ... import models
+
+# Rows per area in order_geo_rollups; more shards, fewer writers waiting on one row lock
+GEO_ROLLUP_SHARDS = 16
+
+# Geographic levels with the (parent, key) each one rolls an address up to, in SQL over
+# an address `a` and in Python for the write path. Drill-down goes
+# state -> city, state -> zip3 -> zip; states have no parent ('').
+GEO_LEVELS = {
+    "state": ("''", "upper(a.state)"),
+    "city": ("upper(a.state)", "a.city"),
+    "zip3": ("upper(a.state)", "left(a.zip_code, 3)"),
+    "zip": ("left(a.zip_code, 3)", "left(a.zip_code, 5)"),
+}
+
+def geo_keys(address: models.Address) -> List[tuple]:
+    """Return the (level, parent, key) rollups an address counts towards."""
+    state = address.state.upper()
+    return [
+        ("state", "", state),
+        ("city", state, address.city),
+        ("zip3", state, address.zip_code[:3]),
+        ("zip", address.zip_code[:3], address.zip_code[:5]),
+    ]
+
+def increment_geo_rollups(db: Session, orders: List[Tuple[models.Address, List[models.Address]]]):
+    """
+    Add newly created orders to the geographic rollups of their addresses.
+
+    All rows go to one shard, picked at random, so concurrent writers mostly update
+    different rows even for a shared area such as their state. They are upserted by one
+    INSERT ... ON CONFLICT DO UPDATE in key order, so writers that do meet lock rows in
+    the same order and cannot deadlock. The caller owns the transaction.
+
+    Args:
+        db: Database session
+        orders: (billing address, shipping addresses) of each inserted order
+    """
+    counts = Counter()
+    for billing_address, shipping_addresses in orders:
+        counts.update(("billing", *key) for key in geo_keys(billing_address))
+        for address in shipping_addresses:
+            counts.update(("shipping", *key) for key in geo_keys(address))
+
+    shard = random.randrange(GEO_ROLLUP_SHARDS)
+    rollups = models.OrderGeoRollup.__table__
+    stmt = insert(rollups).values([
+        {"address_type": address_type, "level": level, "parent": parent, "key": key, "shard": shard,
+         "order_count": count}
+        for (address_type, level, parent, key), count in sorted(counts.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[rollups.c.address_type, rollups.c.level, rollups.c.parent, rollups.c.key, rollups.c.shard],
+        set_={"order_count": rollups.c.order_count + stmt.excluded.order_count}
+    )
+    db.execute(stmt)
+
+def get_geo_rollups(db: Session, address_type: str, level: str, parent: Optional[str] = None,
+                    limit: int = 50):
+    """
+    Get the busiest places of one level, optionally within a parent.
+
+    Sums each area's shards; the primary key narrows the scan to the level (and
+    parent), which holds at most a few thousand areas times GEO_ROLLUP_SHARDS rows.
+
+    Args:
+        db: Database session
+        address_type: billing or shipping
+        level: One of GEO_LEVELS
+        parent: Only places inside this parent (state for city/zip3, zip3 for zip)
+        limit: Number of places to return
+
+    Returns:
+        Rows with level, parent, key and order_count, highest order count first
+    """
+    rollup = models.OrderGeoRollup
+    order_count = func.sum(rollup.order_count).label("order_count")
+    query = db.query(rollup.level, rollup.parent, rollup.key, order_count) \
+        .filter(rollup.address_type == address_type, rollup.level == level)
+    if parent is not None:
+        query = query.filter(rollup.parent == parent)
+    return query.group_by(rollup.level, rollup.parent, rollup.key) \
+        .order_by(order_count.desc(), rollup.key).limit(limit).all()
+
+def rebuild_geo_rollups(db: Session) -> int:
+    """
+    Recompute every geographic rollup from the hot and archived orders.
+
+    Each area's count is rebuilt into a single shard.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Number of rollup rows after the rebuild
+    """
+    sources = {
+        "billing": """
+            SELECT billing_address_id AS address_id FROM orders
+            UNION ALL
+            SELECT billing_address_id FROM orders_archive
+        """,
+        "shipping": """
+            SELECT address_id FROM order_shipping_addresses
+            UNION ALL
+            SELECT address_id FROM order_shipping_addresses_archive
+        """,
+    }
+    db.execute(models.OrderGeoRollup.__table__.delete())
+    for address_type, source in sources.items():
+        for level, (parent, key) in GEO_LEVELS.items():
+            db.execute(text(f"""
+                INSERT INTO order_geo_rollups (address_type, level, parent, key, shard, order_count)
+                SELECT '{address_type}', '{level}', {parent}, {key}, 0, count(*)
+                FROM ({source}) o JOIN addresses a ON a.id = o.address_id
+                GROUP BY 3, 4
+            """))
+    db.commit()
+    return db.query(models.OrderGeoRollup).count()
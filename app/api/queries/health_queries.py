@@ -1,12 +1,55 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import MetaData, text
+from sqlalchemy.engine import Connection
+from typing import List
 
-def check_database_connection(db: Session) -> bool:
+def get_replication_status(connection: Connection) -> dict:
     """
-    Check if the database connection is working by executing a simple query
+    Describe the server's replication role and lag.
+
+    On a replica, the lag is the age of the last replayed transaction; on a primary,
+    the replay lag of each connected standby.
+
+    Args:
+        connection: Database connection
+
+    Returns:
+        {"role": "primary" or "replica", and "lag_seconds" or "standbys"}
+    """
+    if connection.execute(text("SELECT pg_is_in_recovery()")).scalar():
+        lag = connection.execute(text(
+            "SELECT extract(epoch FROM now() - pg_last_xact_replay_timestamp())"
+        )).scalar()
+        return {"role": "replica", "lag_seconds": None if lag is None else round(float(lag), 3)}
+    standbys = connection.execute(text("""
+        SELECT application_name, extract(epoch FROM replay_lag) AS lag
+        FROM pg_stat_replication
+        ORDER BY application_name
+    """))
+    return {"role": "primary", "standbys": [
+        {"name": name, "lag_seconds": None if lag is None else round(float(lag), 3)} for name, lag in standbys
+    ]}
+
+def get_missing_schema(connection: Connection, metadata: MetaData) -> List[str]:
+    """
+    List the tables and columns of the models that the database lacks, i.e. the
+    migrations in scripts/migrations that still have to be run.
+
+    Args:
+        connection: Database connection
+        metadata: Metadata of the models
+
+    Returns:
+        Missing "table" and "table.column" names, sorted
     """
-    try:
-        db.execute(text("SELECT 1"))
-        return True
-    except Exception:
-        return False 
\ No newline at end of file
+    existing = {}
+    for table, column in connection.execute(text(
+        "SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = current_schema()"
+    )):
+        existing.setdefault(table, set()).add(column)
+    missing = []
+    for table in metadata.sorted_tables:
+        if table.name not in existing:
+            missing.append(table.name)
+            continue
+        missing.extend(f"{table.name}.{column.name}" for column in table.columns if column.name not in existing[table.name])
+    return sorted(missing)
@@ -0,0 +1,74 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime, timedelta
+from ... import models
+
+def claim_key(db: Session, scope: str, key: str, fingerprint: str, ttl: float) -> bool:
+    """
+    Claim an idempotency key for the current transaction, or take over an expired one.
+
+    The claim becomes visible when the caller commits its writes. A concurrent claim of
+    the same key blocks on the key's index entry until then, and gets False once the
+    first claim has committed (or True if it rolled back).
+
+    Args:
+        db: Database session
+        scope: Endpoint the key belongs to
+        key: Client-supplied Idempotency-Key
+        fingerprint: Hash of the request the key was sent with
+        ttl: Seconds to remember the key
+
+    Returns:
+        True if this transaction owns the key
+    """
+    now = datetime.utcnow()
+    table = models.IdempotencyKey.__table__
+    stmt = insert(table).values(
+        scope=scope, key=key, fingerprint=fingerprint, response=None, expires_at=now + timedelta(seconds=ttl)
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.scope, table.c.key],
+        set_={"fingerprint": stmt.excluded.fingerprint, "response": None, "expires_at": stmt.excluded.expires_at},
+        where=table.c.expires_at <= now
+    ).returning(table.c.key)
+    return db.execute(stmt).first() is not None
+
+def get_key(db: Session, scope: str, key: str):
+    """Get the fingerprint, response and expiry of an unexpired idempotency key, or None."""
+    table = models.IdempotencyKey.__table__
+    return db.execute(
+        select(table.c.fingerprint, table.c.response, table.c.expires_at).where(
+            table.c.scope == scope, table.c.key == key, table.c.expires_at > datetime.utcnow()
+        )
+    ).first()
+
+def store_response(db: Session, scope: str, key: str, response):
+    """Record the response of a claimed key and commit."""
+    db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.scope == scope, models.IdempotencyKey.key == key
+    ).update({"response": response}, synchronize_session=False)
+    db.commit()
+
+def delete_expired_keys(db: Session, batch_size: int = 10000) -> int:
+    """
+    Delete expired idempotency keys in batches, committing after each.
+
+    Args:
+        db: Database session
+        batch_size: Keys deleted per transaction
+
+    Returns:
+        Number of keys deleted
+    """
+    table = models.IdempotencyKey.__table__
+    deleted = 0
+    while True:
+        expired = select(table.c.scope, table.c.key).where(
+            table.c.expires_at <= datetime.utcnow()
+        ).limit(batch_size)
+        result = db.execute(table.delete().where(tuple_(table.c.scope, table.c.key).in_(expired)))
+        db.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
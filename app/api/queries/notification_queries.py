@@ -0,0 +1,102 @@
+import json
+import uuid
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import List, Tuple
+from ... import models
+
+# Channel every worker LISTENs on for change notifications
+CHANGE_CHANNEL = "radiant_changes"
+
+# Identifies this worker's own notifications, which its write path has already applied
+WORKER_ID = uuid.uuid4().hex[:12]
+
+# pg_notify rejects payloads of 8000 bytes or more, failing the whole transaction
+MAX_PAYLOAD_BYTES = 7999
+
+def notify_change(db: Session, kind: str, **fields):
+    """
+    Queue a change notification for the other workers.
+
+    NOTIFY is transactional: the payload is delivered when the caller's transaction
+    commits and dropped if it rolls back, and identical payloads sent in one transaction
+    are delivered once.
+
+    Args:
+        db: Database session
+        kind: What changed (customer, address or order)
+        **fields: Compact, JSON-serializable description of the change
+    """
+    db.execute(text("SELECT pg_notify(:channel, :payload)"),
+               {"channel": CHANGE_CHANNEL, "payload": _payload(kind, **fields)})
+
+def notify_orders_created(db: Session, orders: List[Tuple[models.Order, models.Address, List[models.Address]]]):
+    """
+    Queue one notification per order, carrying what the in-process caches need to apply it.
+
+    An order whose notification would exceed MAX_PAYLOAD_BYTES (one with very many
+    shipping addresses) is announced by id only, with `"resolve": true`; listeners
+    load it with get_order_changes instead.
+
+    Args:
+        db: Database session
+        orders: (order, billing address, shipping addresses) of each inserted order
+    """
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), [
+        {"channel": CHANGE_CHANNEL, "payload": _order_payload(order, billing_address, shipping_addresses)}
+        for order, billing_address, shipping_addresses in orders
+    ])
+
+def get_order_changes(db: Session, order_ids: List[int]) -> List[dict]:
+    """
+    Load orders in the shape of their change notifications.
+
+    Args:
+        db: Database session
+        order_ids: Ids of orders announced by id only
+
+    Returns:
+        One dict per order found, with the fields notify_orders_created would have sent
+    """
+    rows = db.execute(text("""
+        SELECT o.id, o.order_date, o.customer_id, o.order_type, o.status, o.total_amount,
+               o.order_hour, o.order_dow, b.zip_code AS billing_zip,
+               COALESCE(array_agg(a.zip_code ORDER BY s.sequence) FILTER (WHERE a.id IS NOT NULL), '{}')
+                   AS shipping_zips
+        FROM orders o
+        JOIN addresses b ON b.id = o.billing_address_id
+        LEFT JOIN order_shipping_addresses s ON s.order_id = o.id AND s.order_date = o.order_date
+        LEFT JOIN addresses a ON a.id = s.address_id
+        WHERE o.id = ANY(:ids)
+        GROUP BY o.id, o.order_date, b.zip_code
+    """), {"ids": list(order_ids)})
+    return [
+        {
+            "kind": "order", "id": row.id, "order_date": row.order_date.isoformat(),
+            "customer_id": row.customer_id, "order_type": row.order_type, "status": row.status,
+            "total_amount": str(row.total_amount), "hour": row.order_hour, "dow": row.order_dow,
+            "billing_zip": row.billing_zip, "shipping_zips": list(row.shipping_zips),
+        }
+        for row in rows
+    ]
+
+def _order_payload(order: models.Order, billing_address: models.Address, shipping_addresses: List[models.Address]) -> str:
+    payload = _payload(
+        "order",
+        id=order.id,
+        order_date=order.order_date.isoformat(),
+        customer_id=order.customer_id,
+        order_type=order.order_type,
+        status=order.status,
+        total_amount=str(order.total_amount),
+        hour=order.order_hour,
+        dow=order.order_dow,
+        billing_zip=billing_address.zip_code,
+        shipping_zips=[address.zip_code for address in shipping_addresses],
+    )
+    if len(payload.encode()) <= MAX_PAYLOAD_BYTES:
+        return payload
+    return _payload("order", id=order.id, customer_id=order.customer_id, resolve=True)
+
+def _payload(kind: str, **fields) -> str:
+    return json.dumps({"kind": kind, "worker": WORKER_ID, **fields}, separators=(",", ":"))
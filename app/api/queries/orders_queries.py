@@ -1,6 +1,10 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, func, extract
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import or_, func, extract, lambda_stmt, select, text
+from typing import Dict, List, Optional
+from datetime import datetime
 from ... import models, schemas
+from .analytics_queries import filter_order_window
+from . import archive_queries
 
 def create_order_query(db: Session, order_data: dict, customer_id: int):
     db_order = models.Order(
@@ -12,13 +16,63 @@ def create_order_query(db: Session, order_data: dict, customer_id: int):
     db.refresh(db_order)
     return db_order
 
+def allocate_order_ids(db: Session, count: int) -> List[int]:
+    """Reserve `count` order ids from the orders id sequence in one round trip."""
+    return [order_id for order_id, in db.execute(text("""
+        SELECT nextval(pg_get_serial_sequence('orders', 'id')) FROM generate_series(1, :count)
+    """), {"count": count})]
+
+def insert_orders(db: Session, orders: List[dict]) -> list:
+    """
+    Insert several orders with one multi-row INSERT.
+
+    Args:
+        db: Database session
+        orders: Order column values, including pre-allocated ids and order_date
+
+    Returns:
+        Inserted rows, including the generated hour and day-of-week columns
+    """
+    table = models.Order.__table__
+    return db.execute(table.insert().values(orders).returning(*table.c)).fetchall()
+
+def insert_order_shipping_addresses(db: Session, rows: List[dict]):
+    """Insert the shipping address rows of several orders with one multi-row INSERT."""
+    if rows:
+        db.execute(models.OrderShippingAddress.__table__.insert().values(rows))
+
+def get_addresses_by_id(db: Session, address_ids: List[int]) -> Dict[int, models.Address]:
+    """Load several addresses in one query, keyed by id."""
+    addresses = db.query(models.Address).filter(models.Address.id.in_(set(address_ids))).all()
+    return {address.id: address for address in addresses}
+
 def get_order_query(db: Session, order_id: int):
-    return db.query(models.Order).filter(models.Order.id == order_id).first()
+    # Cached lambda statement, like the hot customer lookups. By id alone this cannot
+    # be pruned: it probes the id index of every monthly partition (see README)
+    order = db.execute(lambda_stmt(
+        lambda: select(models.Order).where(models.Order.id == order_id).limit(1)
+    )).scalars().first()
+    if order is None:
+        # Fall back to cold storage for orders moved out by the archival pipeline
+        order = archive_queries.get_archived_order(db, order_id)
+    return order
 
-def get_customer_orders_query(db: Session, customer_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Order).filter(
+def get_customer_orders_query(db: Session, customer_id: int, skip: int = 0, limit: int = 100,
+                              start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
+    query = db.query(models.Order).filter(
         models.Order.customer_id == customer_id
-    ).offset(skip).limit(limit).all()
+    )
+    query = filter_order_window(query, start_date, end_date)
+    orders = query.order_by(models.Order.id.desc()).offset(skip).limit(limit).all()
+    if len(orders) == limit:
+        return orders
+
+    # The hot page is short, so continue the newest-first listing into the archive,
+    # which only holds orders older than every hot one.
+    hot_count = len(orders) + skip if orders else query.count()
+    return orders + archive_queries.get_archived_customer_orders(
+        db, customer_id, max(skip - hot_count, 0), limit - len(orders), start_date, end_date
+    )
 
 def search_orders_query(db: Session, query: str, skip: int = 0, limit: int = 100):
     """Search orders by customer email or phone number."""
@@ -39,8 +93,23 @@ def search_orders_query(db: Session, query: str, skip: int = 0, limit: int = 100
         )
     ).offset(skip).limit(limit).all()
 
-def get_orders_query(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Order).offset(skip).limit(limit).all()
+def get_order_ids_query(db: Session, skip: int = 0, limit: int = 100,
+                        start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> List[int]:
+    """Get one page of order ids; the orders themselves come from the cache."""
+    query = filter_order_window(db.query(models.Order.id), start_date, end_date)
+    return [order_id for order_id, in query.offset(skip).limit(limit)]
+
+def get_orders_by_ids(db: Session, order_ids: List[int]) -> List[models.Order]:
+    """
+    Load several hot orders with their addresses in a fixed number of queries.
+
+    Without their order dates the ids cannot be pruned to partitions, so every monthly
+    partition's id index is probed once for the whole batch.
+    """
+    return db.query(models.Order).filter(models.Order.id.in_(order_ids)).options(
+        selectinload(models.Order.billing_address),
+        selectinload(models.Order.shipping_addresses).selectinload(models.OrderShippingAddress.address),
+    ).all()
 
 def get_orders_by_zip_code_query(db: Session, address_type: str = "billing", order_by: str = "desc"):
     """Get order counts by zip code."""
@@ -0,0 +1,175 @@
+from datetime import date
+from typing import List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from ... import models
+
+def month_start(day: date) -> date:
+    """Return the first day of the month containing the given date."""
+    return day.replace(day=1)
+
+def add_months(day: date, months: int) -> date:
+    """Return the first day of the month `months` after the month of the given date."""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table: str, month: date) -> str:
+    """Name of the monthly partition of a table, e.g. orders_p2024_01."""
+    return f"{table}_p{month.year:04d}_{month.month:02d}"
+
+def list_partitions(db: Session, table: str = "orders") -> List[dict]:
+    """
+    List the partitions currently attached to a partitioned table.
+
+    Args:
+        db: Database session
+        table: Parent table name
+
+    Returns:
+        List of dicts with the partition name and its bound expression
+    """
+    rows = db.execute(text("""
+        SELECT child.relname AS name, pg_get_expr(child.relpartbound, child.oid) AS bound
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :table
+        ORDER BY child.relname
+    """), {"table": table}).fetchall()
+    return [{"name": name, "bound": bound} for name, bound in rows]
+
+def create_monthly_partitions(db: Session, start: date, months: int) -> List[str]:
+    """
+    Create monthly partitions for every partitioned table.
+
+    Partitions that already exist are left alone. Normally this runs ahead of time
+    (e.g. from a daily cron job) so new partitions are empty. If the DEFAULT partition
+    already holds rows for a month, those rows are moved into the new partition in the
+    same transaction before it is attached.
+
+    Args:
+        db: Database session
+        start: Any date in the first month to cover
+        months: Number of consecutive months to create
+
+    Returns:
+        Names of the partitions that were created
+    """
+    created = []
+    existing = {
+        partition["name"]
+        for table in models.PARTITIONED_TABLES
+        for partition in list_partitions(db, table)
+    }
+    first = month_start(start)
+    for offset in range(months):
+        lower = add_months(first, offset)
+        upper = add_months(first, offset + 1)
+        bounds = {"lower": lower, "upper": upper}
+        missing = [
+            table for table in models.PARTITIONED_TABLES
+            if partition_name(table, lower) not in existing
+        ]
+        if not missing:
+            continue
+        stranded = any(
+            db.execute(text(f"""
+                SELECT EXISTS (
+                    SELECT 1 FROM {table}_default
+                    WHERE order_date >= :lower AND order_date < :upper
+                )
+            """), bounds).scalar()
+            for table in missing
+        )
+        if stranded:
+            # Move rows out of the default partitions into standalone tables, children
+            # first so no shipping row references an order mid-move, then attach.
+            for table in missing:
+                name = partition_name(table, lower)
+                columns = ", ".join(
+                    column.name for column in models.Base.metadata.tables[table].columns
+                    if column.computed is None
+                )
+                db.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING GENERATED)"))
+                db.execute(text(f"""
+                    WITH moved AS (
+                        DELETE FROM {table}_default
+                        WHERE order_date >= :lower AND order_date < :upper
+                        RETURNING {columns}
+                    )
+                    INSERT INTO {name} ({columns}) SELECT {columns} FROM moved
+                """), bounds)
+        # Parent tables first so inherited foreign keys can be validated
+        for table in reversed(missing):
+            name = partition_name(table, lower)
+            if stranded:
+                db.execute(text(f"""
+                    ALTER TABLE {table} ATTACH PARTITION {name}
+                    FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')
+                """))
+            else:
+                db.execute(text(f"""
+                    CREATE TABLE {name} PARTITION OF {table}
+                    FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')
+                """))
+            created.append(name)
+    db.commit()
+    return created
+
+def detach_partitions_before(db: Session, cutoff: date, drop: bool = False) -> List[str]:
+    """
+    Detach every monthly partition that ends on or before the cutoff month.
+
+    The detached tables keep their data and can be archived (pg_dump, moved to cheap
+    storage) and dropped independently of the live table.
+
+    Args:
+        db: Database session
+        cutoff: Partitions for months strictly before this date's month are detached
+        drop: Drop the detached tables instead of keeping them around
+
+    Returns:
+        Names of the partitions that were detached
+    """
+    detached = []
+    boundary = month_start(cutoff)
+    # Children first: shipping rows reference the order partitions
+    for table in models.PARTITIONED_TABLES:
+        for partition in list_partitions(db, table):
+            month = _partition_month(table, partition["name"])
+            if month is None or add_months(month, 1) > boundary:
+                continue
+            db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition['name']}"))
+            _drop_partitioned_references(db, partition["name"])
+            if drop:
+                db.execute(text(f"DROP TABLE {partition['name']}"))
+            detached.append(partition["name"])
+    db.commit()
+    return detached
+
+def _drop_partitioned_references(db: Session, name: str):
+    """
+    Drop foreign keys from a detached table into the partitioned tables.
+
+    A detached partition keeps its inherited constraints, so a detached shipping
+    partition would otherwise still pin the rows of the order partition it refers to.
+    """
+    constraints = db.execute(text("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = CAST(:name AS regclass)
+          AND contype = 'f'
+          AND confrelid IN (SELECT CAST(t AS regclass) FROM unnest(CAST(:tables AS text[])) AS t)
+    """), {"name": name, "tables": list(models.PARTITIONED_TABLES)}).scalars().all()
+    for constraint in constraints:
+        db.execute(text(f'ALTER TABLE {name} DROP CONSTRAINT "{constraint}"'))
+
+def _partition_month(table: str, name: str) -> Optional[date]:
+    """Parse the month out of a partition name produced by partition_name()."""
+    prefix = f"{table}_p"
+    if not name.startswith(prefix):
+        return None
+    try:
+        year, month = name[len(prefix):].split("_")
+        return date(int(year), int(month), 1)
+    except ValueError:
+        return None
@@ -0,0 +1,136 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, text
+from typing import List, Optional, Tuple
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from ... import config, models
+
+BUSINESS_TZ = ZoneInfo(config.BUSINESS_TIMEZONE)
+
+# Revenue dimensions and the SQL expression each one groups orders by. `o` is the
+# order, `a` its billing address. "date" is served from the order_type rows, since
+# every order has exactly one order type. Rollups are bucketed per calendar day in
+# BUSINESS_TIMEZONE, like the hour and day-of-week columns.
+REVENUE_DIMENSIONS = {
+    "zip": "a.zip_code",
+    "hour": "CAST(o.order_hour AS text)",
+    "day_of_week": "CAST(o.order_dow AS text)",
+    "order_type": "o.order_type",
+    "status": "o.status",
+}
+DATE_DIMENSION = "order_type"
+
+def business_day(value: datetime) -> date:
+    """BUSINESS_TIMEZONE day of a naive-UTC timestamp."""
+    return value.replace(tzinfo=timezone.utc).astimezone(BUSINESS_TZ).date()
+
+def day_start(day: date) -> datetime:
+    """Naive-UTC timestamp of midnight of a BUSINESS_TIMEZONE day."""
+    local = datetime.combine(day, datetime.min.time(), tzinfo=BUSINESS_TZ)
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+def get_day_order_values(db: Session, day: date) -> List[tuple]:
+    """
+    Get every hot and archived order placed on one day with its revenue dimensions.
+
+    Args:
+        db: Database session
+        day: The BUSINESS_TIMEZONE day to read
+
+    Returns:
+        List of (zip, hour, day_of_week, order_type, status, total_amount) rows
+    """
+    columns = ", ".join(REVENUE_DIMENSIONS.values())
+    params = {"start": day_start(day), "end": day_start(day + timedelta(days=1))}
+    return db.execute(text(f"""
+        SELECT {columns}, o.total_amount
+        FROM orders o JOIN addresses a ON a.id = o.billing_address_id
+        WHERE o.order_date >= :start AND o.order_date < :end
+        UNION ALL
+        SELECT {columns}, o.total_amount
+        FROM orders_archive o JOIN addresses a ON a.id = o.billing_address_id
+        WHERE o.order_date >= :start AND o.order_date < :end
+    """), params).fetchall()
+
+def replace_day_rollups(db: Session, day: date, rows: List[dict]):
+    """
+    Replace the revenue rollups of one day. The caller owns the transaction.
+
+    Args:
+        db: Database session
+        day: Bucket date to replace
+        rows: Column values of the new OrderRevenueRollup rows
+    """
+    rollups = models.OrderRevenueRollup.__table__
+    db.execute(rollups.delete().where(rollups.c.bucket_date == day))
+    if rows:
+        db.execute(rollups.insert(), rows)
+
+def get_first_order_day(db: Session) -> Optional[date]:
+    """Day of the oldest hot or archived order, or None without orders."""
+    first = db.execute(text("""
+        SELECT least((SELECT min(order_date) FROM orders), (SELECT min(order_date) FROM orders_archive))
+    """)).scalar()
+    return business_day(first) if first is not None else None
+
+def get_sealed_through(db: Session) -> Optional[date]:
+    """Day after the newest sketched day: orders from then on are read live."""
+    latest = db.query(func.max(models.OrderRevenueRollup.bucket_date)).scalar()
+    return latest + timedelta(days=1) if latest is not None else None
+
+def get_revenue_rollups(db: Session, dimension: str, first_day: Optional[date] = None,
+                        end_day: Optional[date] = None):
+    """
+    Get the revenue rollups of one dimension for the days in [first_day, end_day).
+
+    Args:
+        db: Database session
+        dimension: One of REVENUE_DIMENSIONS
+        first_day: First bucket date (None starts at the oldest rollup)
+        end_day: Day after the last bucket date (None ends at the newest rollup)
+
+    Returns:
+        List of OrderRevenueRollup rows
+    """
+    rollup = models.OrderRevenueRollup
+    query = db.query(rollup).filter(rollup.dimension == dimension)
+    if first_day is not None:
+        query = query.filter(rollup.bucket_date >= first_day)
+    if end_day is not None:
+        query = query.filter(rollup.bucket_date < end_day)
+    return query.all()
+
+def get_live_order_values(db: Session, group_by: str,
+                          windows: List[Tuple[Optional[datetime], Optional[datetime]]]) -> List[tuple]:
+    """
+    Get the group key and value of every hot order placed inside one of the windows.
+
+    Args:
+        db: Database session
+        group_by: One of REVENUE_DIMENSIONS or "date"
+        windows: Disjoint (start, end) order_date windows, start inclusive and end
+            exclusive; None leaves that side unbounded
+
+    Returns:
+        List of (key, total_amount) rows
+    """
+    key = f"CAST({models.business_date_sql('o.order_date')} AS text)" if group_by == "date" \
+        else REVENUE_DIMENSIONS[group_by]
+    conditions = []
+    params = {}
+    for index, (start, end) in enumerate(windows):
+        bounds = ["TRUE"]
+        if start is not None:
+            bounds.append(f"o.order_date >= :start_{index}")
+            params[f"start_{index}"] = start
+        if end is not None:
+            bounds.append(f"o.order_date < :end_{index}")
+            params[f"end_{index}"] = end
+        conditions.append(f"({' AND '.join(bounds)})")
+    if not conditions:
+        return []
+    return db.execute(text(f"""
+        SELECT {key}, o.total_amount
+        FROM orders o JOIN addresses a ON a.id = o.billing_address_id
+        WHERE {" OR ".join(conditions)}
+    """), params).fetchall()
@@ -0,0 +1,68 @@
+import random
+from sqlalchemy.orm import Session
+from sqlalchemy import func, lambda_stmt, select, text
+from sqlalchemy.dialects.postgresql import insert
+from typing import Iterable, Optional, Tuple
+from datetime import datetime
+from ... import models
+
+# Rows per table in table_versions; more shards, fewer writers waiting on one row lock
+TABLE_VERSION_SHARDS = 16
+
+def bump_table_versions(db: Session, *tables: str):
+    """
+    Count a change to each table in the caller's transaction.
+
+    Args:
+        db: Database session
+        *tables: Names of the tables written
+    """
+    now = datetime.utcnow()
+    table = models.TableVersion.__table__
+    stmt = insert(table).values([
+        {"table_name": name, "shard": random.randrange(TABLE_VERSION_SHARDS), "version": 1, "changed_at": now}
+        for name in sorted(set(tables))
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.table_name, table.c.shard],
+        set_={"version": table.c.version + 1, "changed_at": stmt.excluded.changed_at}
+    ))
+
+def get_table_versions(db: Session, tables: Iterable[str]) -> Tuple[int, Optional[datetime]]:
+    """
+    Get the combined version of some tables.
+
+    Returns:
+        The total number of changes counted for the tables, and when the last one was
+        counted (None if none was)
+    """
+    table = models.TableVersion.__table__
+    return tuple(db.execute(
+        select(func.coalesce(func.sum(table.c.version), 0), func.max(table.c.changed_at))
+        .where(table.c.table_name.in_(list(tables)))
+    ).one())
+
+def bump_customer_versions(db: Session, customer_ids: Iterable[int]):
+    """Mark customers as changed, e.g. after adding their addresses or orders."""
+    db.execute(text("""
+        UPDATE customers SET version = version + 1, updated_at = now() at time zone 'utc'
+        WHERE id = ANY(:ids)
+    """), {"ids": sorted(set(customer_ids))})
+
+def get_customer_version(db: Session, customer_id: int):
+    """Get the version and last change time of a customer, or None."""
+    return db.execute(lambda_stmt(
+        lambda: select(models.Customer.version, models.Customer.updated_at).where(models.Customer.id == customer_id)
+    )).first()
+
+def get_order_version(db: Session, order_id: int):
+    """Get the version and order date of a hot or archived order, or None."""
+    row = db.execute(lambda_stmt(
+        lambda: select(models.Order.version, models.Order.order_date).where(models.Order.id == order_id)
+    )).first()
+    if row is None:
+        row = db.execute(lambda_stmt(
+            lambda: select(models.ArchivedOrder.version, models.ArchivedOrder.order_date)
+            .where(models.ArchivedOrder.id == order_id)
+        )).first()
+    return row
@@ -0,0 +1,180 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+from ... import models
+from ..services import hyperloglog
+from .analytics_queries import as_naive_utc
+
+def add_order_customers(db: Session, orders: List[Tuple[models.Order, models.Address, List[models.Address]]]):
+    """
+    Add orders' customers to the sketches of their billing and shipping zip codes.
+
+    Each sketch row is updated with an INSERT ... ON CONFLICT DO UPDATE that only
+    writes if the customer's entry raises its register. A sparse sketch gets the entry
+    in place of the register's lower rank (its scans are bounded by SPARSE_MAX_ENTRIES)
+    and is converted to dense when it would pass that size; a dense sketch sets one
+    byte. Rows are written in key order so concurrent writers cannot deadlock. The
+    caller owns the transaction.
+
+    Args:
+        db: Database session
+        orders: (order, billing address, shipping addresses) of each inserted order
+    """
+    updates = set()
+    for order, billing_address, shipping_addresses in orders:
+        entry = hyperloglog.entry_for(order.customer_id)
+        day = order.order_date.date()
+        updates.add((day, "billing", billing_address.zip_code, entry))
+        updates.update((day, "shipping", address.zip_code, entry) for address in shipping_addresses)
+    db.execute(text("""
+        INSERT INTO zip_customer_sketches AS s (bucket_date, address_type, zip_code, entries)
+        VALUES (:bucket_date, :address_type, :zip_code, ARRAY[CAST(:entry AS integer)])
+        ON CONFLICT (bucket_date, address_type, zip_code) DO UPDATE
+        SET entries = CASE
+                WHEN s.registers IS NULL AND cardinality(s.entries) < :sparse_max
+                THEN array_append(
+                    ARRAY(SELECT entry FROM unnest(s.entries) AS entry WHERE entry >> 6 <> :register),
+                    CAST(:entry AS integer)
+                )
+                ELSE '{}'
+            END,
+            registers = CASE
+                WHEN s.registers IS NOT NULL THEN set_byte(s.registers, :register, :rank)
+                WHEN cardinality(s.entries) < :sparse_max THEN NULL
+                ELSE (
+                    SELECT decode(string_agg(lpad(to_hex(coalesce(r.rank, 0)), 2, '0'), '' ORDER BY g.register), 'hex')
+                    FROM generate_series(0, :register_count - 1) AS g(register)
+                    LEFT JOIN (
+                        SELECT entry >> 6 AS register, max(entry & 63) AS rank
+                        FROM unnest(array_append(s.entries, CAST(:entry AS integer))) AS entry
+                        GROUP BY 1
+                    ) r ON r.register = g.register
+                )
+            END
+        WHERE CASE
+            WHEN s.registers IS NULL THEN NOT EXISTS (
+                SELECT 1 FROM unnest(s.entries) AS entry WHERE entry >> 6 = :register AND entry & 63 >= :rank
+            )
+            ELSE get_byte(s.registers, :register) < :rank
+        END
+    """), [
+        {"bucket_date": day, "address_type": address_type, "zip_code": zip_code, "entry": entry,
+         "register": register, "rank": rank,
+         "sparse_max": hyperloglog.SPARSE_MAX_ENTRIES, "register_count": hyperloglog.REGISTERS}
+        for day, address_type, zip_code, entry in sorted(updates)
+        for register, rank in [hyperloglog.split_entry(entry)]
+    ])
+
+def get_unique_customers_by_zip(db: Session, address_type: str = "billing",
+                                start_date: Optional[datetime] = None,
+                                end_date: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Estimate the distinct customers per zip code by merging the daily sketches.
+
+    The sparse entries are merged in SQL (max rank per register), so zip codes with
+    only sparse sketches send two numbers to Python. Dense sketches are sent as they
+    are stored and merged here a byte per register, along with the sparse registers
+    of their zip code. Sketches are bucketed per day, so a time window is applied at
+    day granularity: every day overlapping [start_date, end_date) counts in full.
+
+    Args:
+        db: Database session
+        address_type: billing or shipping
+        start_date: Inclusive lower bound on order_date
+        end_date: Exclusive upper bound on order_date
+
+    Returns:
+        Mapping of zip code to estimated distinct customers
+    """
+    conditions = ["address_type = :address_type"]
+    if start_date is not None:
+        conditions.append("bucket_date >= CAST(:start_date AS date)")
+    if end_date is not None:
+        conditions.append("bucket_date < :end_date")
+    # One statement, so a sketch turning dense meanwhile is read in one form only
+    rows = db.execute(text(f"""
+        WITH sketches AS (
+            SELECT zip_code, entries, registers
+            FROM zip_customer_sketches
+            WHERE {" AND ".join(conditions)}
+        ), sparse AS (
+            SELECT zip_code, entry >> 6 AS register, max(entry & 63) AS rank
+            FROM sketches, unnest(entries) AS entry
+            GROUP BY 1, 2
+        ), dense_zips AS (
+            SELECT DISTINCT zip_code FROM sketches WHERE registers IS NOT NULL
+        )
+        SELECT s.zip_code, count(*), sum(power(2.0, -s.rank)),
+               CASE WHEN d.zip_code IS NOT NULL THEN array_agg(s.register << 6 | s.rank) END, NULL
+        FROM sparse s LEFT JOIN dense_zips d ON d.zip_code = s.zip_code
+        GROUP BY s.zip_code, d.zip_code
+        UNION ALL
+        SELECT zip_code, NULL, NULL, NULL, registers
+        FROM sketches
+        WHERE registers IS NOT NULL
+    """), {
+        "address_type": address_type,
+        "start_date": as_naive_utc(start_date) if start_date is not None else None,
+        "end_date": as_naive_utc(end_date) if end_date is not None else None
+    }).fetchall()
+
+    estimates = {}
+    dense: Dict[str, bytearray] = {}
+    sparse_entries: Dict[str, List[int]] = {}
+    for zip_code, nonzero, harmonic, entries, registers in rows:
+        if registers is None and entries is None:
+            estimates[zip_code] = hyperloglog.estimate(nonzero, float(harmonic))
+        elif registers is None:
+            sparse_entries[zip_code] = entries
+        elif zip_code in dense:
+            dense[zip_code] = bytearray(map(max, dense[zip_code], bytes(registers)))
+        else:
+            dense[zip_code] = bytearray(registers)
+    for zip_code, ranks in dense.items():
+        for entry in sparse_entries.get(zip_code, ()):
+            register, rank = hyperloglog.split_entry(entry)
+            ranks[register] = max(ranks[register], rank)
+        estimates[zip_code] = hyperloglog.estimate_dense(ranks)
+    return estimates
+
+def rebuild_zip_customer_sketches(db: Session) -> int:
+    """
+    Recompute every zip code sketch from the hot and archived orders.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Number of sketch rows after the rebuild
+    """
+    rows = db.execute(text("""
+        SELECT DISTINCT CAST(o.order_date AS date), 'billing', a.zip_code, o.customer_id
+        FROM (SELECT order_date, customer_id, billing_address_id FROM orders
+              UNION ALL
+              SELECT order_date, customer_id, billing_address_id FROM orders_archive) o
+        JOIN addresses a ON a.id = o.billing_address_id
+        UNION
+        SELECT DISTINCT CAST(o.order_date AS date), 'shipping', a.zip_code, o.customer_id
+        FROM (SELECT s.order_date, o.customer_id, s.address_id FROM orders o
+              JOIN order_shipping_addresses s ON s.order_id = o.id AND s.order_date = o.order_date
+              UNION ALL
+              SELECT s.order_date, o.customer_id, s.address_id FROM orders_archive o
+              JOIN order_shipping_addresses_archive s ON s.order_id = o.id) o
+        JOIN addresses a ON a.id = o.address_id
+    """)).fetchall()
+    sketches: Dict[tuple, hyperloglog.HyperLogLog] = {}
+    for bucket_date, address_type, zip_code, customer_id in rows:
+        sketches.setdefault((bucket_date, address_type, zip_code), hyperloglog.HyperLogLog()).add(customer_id)
+
+    table = models.ZipCustomerSketch.__table__
+    db.execute(table.delete())
+    if sketches:
+        db.execute(table.insert(), [
+            {"bucket_date": bucket_date, "address_type": address_type,
+             "zip_code": zip_code, "entries": entries, "registers": registers}
+            for (bucket_date, address_type, zip_code), sketch in sketches.items()
+            for entries, registers in [sketch.storage()]
+        ])
+    db.commit()
+    return len(sketches)
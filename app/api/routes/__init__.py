@@ -1,4 +1,5 @@
 from .customers import router as customers_router
 from .health import router as health_router
 from .orders import router as orders_router
-from .analytics import router as analytics_router 
\ No newline at end of file
+from .analytics import router as analytics_router
+from .batch import router as batch_router 
\ No newline at end of file
@@ -1,19 +1,31 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 from ... import schemas
-from ...database import get_db
-from ..services import analytics_service
+from ...database import get_db, statement_timeout
+from ..routing import SessionReleasingRoute
+from ..services import analytics_service, conditional, event_bus, revenue_service
 
 router = APIRouter(
     prefix="/analytics",
-    tags=["analytics"]
+    tags=["analytics"],
+    route_class=SessionReleasingRoute,
+    dependencies=[Depends(statement_timeout("STATEMENT_TIMEOUT_ANALYTICS_MS"))]
 )
 
-@router.get("/orders/zip-code/", response_model=List[schemas.ZipCodeAnalytics])
+# ETag / Last-Modified from the change counters of the tables analytics aggregate;
+# a current client copy gets 304 before the aggregate runs
+VALIDATE_BY_TABLE_VERSIONS = [Depends(conditional.table_etag("orders", "customers", "addresses"))]
+
+@router.get("/orders/zip-code/", response_model=List[schemas.ZipCodeAnalytics],
+            dependencies=VALIDATE_BY_TABLE_VERSIONS)
 def get_orders_by_zip_code(
     address_type: str = Query("billing", description="Type of address to analyze (billing or shipping)"),
     order_by: str = Query("desc", description="Sort order (asc or desc)"),
+    start_date: Optional[datetime] = Query(None, description="Only count orders placed at or after this time"),
+    end_date: Optional[datetime] = Query(None, description="Only count orders placed before this time"),
     db: Session = Depends(get_db)
 ):
     """
@@ -23,16 +35,51 @@ def get_orders_by_zip_code(
     Parameters:
         address_type (str): Type of address to analyze (billing or shipping)
         order_by (str): Sort order (asc or desc)
+        start_date (datetime): Only count orders placed at or after this time
+        end_date (datetime): Only count orders placed before this time
         db (Session): Database session
 
     Returns:
         List[ZipCodeAnalytics]: List of zip code analytics with order counts
     """
-    return analytics_service.get_orders_by_zip_code(db=db, address_type=address_type, order_by=order_by)
+    return analytics_service.get_orders_by_zip_code(
+        db=db, address_type=address_type, order_by=order_by,
+        start_date=start_date, end_date=end_date
+    )
+
+@router.get("/orders/geo/", response_model=List[schemas.GeoAnalytics],
+            dependencies=VALIDATE_BY_TABLE_VERSIONS)
+def get_orders_by_geo(
+    level: str = Query("state", regex="^(state|city|zip3|zip)$", description="Geographic level (state, city, zip3 or zip)"),
+    parent: Optional[str] = Query(None, description="Drill down into a state (for city/zip3) or zip3 prefix (for zip)"),
+    address_type: str = Query("billing", regex="^(billing|shipping)$", description="Type of address to analyze (billing or shipping)"),
+    limit: int = Query(50, ge=1, le=1000, description="Number of areas to return"),
+    db: Session = Depends(get_db)
+):
+    """
+    Get all-time order counts per state, city, 3-digit zip prefix or zip code.
+    Returns the busiest areas first, optionally within a parent area for drill-down.
+
+    Parameters:
+        level (str): Geographic level (state, city, zip3 or zip)
+        parent (str): Parent area to drill down into
+        address_type (str): Type of address to analyze (billing or shipping)
+        limit (int): Number of areas to return
+        db (Session): Database session
+
+    Returns:
+        List[GeoAnalytics]: List of geo analytics with order counts
+    """
+    return analytics_service.get_orders_by_geo(
+        db=db, level=level, parent=parent, address_type=address_type, limit=limit
+    )
 
-@router.get("/orders/time-of-day/", response_model=List[schemas.TimeOfDayAnalytics])
+@router.get("/orders/time-of-day/", response_model=List[schemas.TimeOfDayAnalytics],
+            dependencies=VALIDATE_BY_TABLE_VERSIONS)
 def get_orders_by_time_of_day(
     limit: int = Query(10, description="Number of hours to return"),
+    start_date: Optional[datetime] = Query(None, description="Only count orders placed at or after this time"),
+    end_date: Optional[datetime] = Query(None, description="Only count orders placed before this time"),
     db: Session = Depends(get_db)
 ):
     """
@@ -41,16 +88,23 @@ def get_orders_by_time_of_day(
 
     Parameters:
         limit (int): Number of hours to return
+        start_date (datetime): Only count orders placed at or after this time
+        end_date (datetime): Only count orders placed before this time
         db (Session): Database session
 
     Returns:
         List[TimeOfDayAnalytics]: List of time of day analytics with order counts
     """
-    return analytics_service.get_orders_by_time_of_day(db=db, limit=limit)
+    return analytics_service.get_orders_by_time_of_day(
+        db=db, limit=limit, start_date=start_date, end_date=end_date
+    )
 
-@router.get("/orders/day-of-week/", response_model=List[schemas.DayOfWeekAnalytics])
+@router.get("/orders/day-of-week/", response_model=List[schemas.DayOfWeekAnalytics],
+            dependencies=VALIDATE_BY_TABLE_VERSIONS)
 def get_orders_by_day_of_week(
     limit: int = Query(7, description="Number of days to return"),
+    start_date: Optional[datetime] = Query(None, description="Only count orders placed at or after this time"),
+    end_date: Optional[datetime] = Query(None, description="Only count orders placed before this time"),
     db: Session = Depends(get_db)
 ):
     """
@@ -59,27 +113,126 @@ def get_orders_by_day_of_week(
 
     Parameters:
         limit (int): Number of days to return
+        start_date (datetime): Only count orders placed at or after this time
+        end_date (datetime): Only count orders placed before this time
         db (Session): Database session
 
     Returns:
         List[DayOfWeekAnalytics]: List of day of week analytics with order counts
     """
-    return analytics_service.get_orders_by_day_of_week(db=db, limit=limit)
+    return analytics_service.get_orders_by_day_of_week(
+        db=db, limit=limit, start_date=start_date, end_date=end_date
+    )
 
-@router.get("/customers/top-in-store/", response_model=List[schemas.TopInStoreCustomerAnalytics])
+@router.get("/customers/top-in-store/", response_model=List[schemas.TopInStoreCustomerAnalytics],
+            dependencies=VALIDATE_BY_TABLE_VERSIONS)
 def get_top_in_store_customers(
     limit: int = Query(5, description="Number of top customers to return"),
+    window: Optional[str] = Query(None, regex="^(today|7d|30d)$", description="Only count orders from today, the last 7 days or the last 30 days"),
     db: Session = Depends(get_db)
 ):
     """
     Get top customers by number of in-store orders.
-    Returns the top N customers with the most in-store orders.
+    Returns the top N customers with the most in-store orders, over their lifetime or
+    within a recent window served from the in-memory leaderboard.
 
     Parameters:
         limit (int): Number of top customers to return
+        window (str): Only count orders from today, the last 7 days or the last 30 days
         db (Session): Database session
 
     Returns:
         List[TopInStoreCustomerAnalytics]: List of top in-store customer analytics
     """
-    return analytics_service.get_top_in_store_customers(db=db, limit=limit) 
\ No newline at end of file
+    return analytics_service.get_top_in_store_customers(db=db, limit=limit, window=window) 
+
+@router.get("/revenue/", response_model=List[schemas.RevenueAnalytics],
+            dependencies=VALIDATE_BY_TABLE_VERSIONS)
+def get_revenue(
+    group_by: str = Query(
+        "zip", regex="^(zip|hour|day_of_week|order_type|status|date)$",
+        description="Group orders by zip, hour, day_of_week, order_type, status or date"
+    ),
+    start_date: Optional[datetime] = Query(None, description="Only count orders placed at or after this time"),
+    end_date: Optional[datetime] = Query(None, description="Only count orders placed before this time"),
+    limit: int = Query(100, ge=1, description="Number of groups to return"),
+    db: Session = Depends(get_db)
+):
+    """
+    Get revenue analytics per group: order count, total revenue, average order value
+    and p50/p90/p99 order value. Groups are sorted by total revenue, highest first.
+    Percentiles are approximate (t-digest); counts and sums are exact.
+
+    Parameters:
+        group_by (str): Dimension to group orders by
+        start_date (datetime): Only count orders placed at or after this time
+        end_date (datetime): Only count orders placed before this time
+        limit (int): Number of groups to return
+        db (Session): Database session
+
+    Returns:
+        List[RevenueAnalytics]: List of revenue analytics per group
+    """
+    return revenue_service.get_revenue(
+        db=db, group_by=group_by, start_date=start_date, end_date=end_date, limit=limit
+    )
+
+@router.get("/dashboard", response_model=schemas.AnalyticsDashboard, dependencies=VALIDATE_BY_TABLE_VERSIONS)
+def get_dashboard(
+    start_date: Optional[datetime] = Query(None, description="Only count orders placed at or after this time"),
+    end_date: Optional[datetime] = Query(None, description="Only count orders placed before this time"),
+    address_type: str = Query("billing", description="Type of address to count zip codes of (billing or shipping)"),
+    order_by: str = Query("desc", description="Sort order of the zip codes (asc or desc)"),
+    hour_limit: int = Query(10, description="Number of hours to return"),
+    day_limit: int = Query(7, description="Number of days to return"),
+    customer_limit: int = Query(5, description="Number of top in-store customers to return"),
+    window: Optional[str] = Query(None, regex="^(today|7d|30d)$", description="Rank top customers by today, the last 7 days or the last 30 days"),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the zip code, time of day, day of week and top in-store customer analytics in
+    one request. The four aggregates run concurrently, so the dashboard takes about as
+    long as the slowest of them. The time filter applies to the three order counts; the
+    top customers are ranked by `window`, or over their lifetime.
+
+    Parameters:
+        start_date (datetime): Only count orders placed at or after this time (not for the top customers)
+        end_date (datetime): Only count orders placed before this time (not for the top customers)
+        address_type (str): Type of address to count zip codes of
+        order_by (str): Sort order of the zip codes
+        hour_limit (int): Number of hours to return
+        day_limit (int): Number of days to return
+        customer_limit (int): Number of top in-store customers to return
+        window (str): Rank top customers by a recent window instead of their lifetime
+        db (Session): Database session
+
+    Returns:
+        AnalyticsDashboard: All four analytics
+    """
+    return analytics_service.get_dashboard(
+        db=db, start_date=start_date, end_date=end_date, address_type=address_type, order_by=order_by,
+        hour_limit=hour_limit, day_limit=day_limit, customer_limit=customer_limit, window=window
+    )
+
+@router.get("/stream")
+async def stream_analytics(request: Request):
+    """
+    Stream live analytics deltas as Server-Sent Events.
+
+    Each `delta` event carries the orders created since the previous event: the number
+    of orders and per-hour, day-of-week, billing/shipping zip and order type counts to
+    add to the analytics routes' results, plus the in-store leaderboard (top entries per
+    window) when it changed. Events are batched per STREAM_FLUSH_INTERVAL and cover
+    orders created by this worker.
+
+    Parameters:
+        request (Request): Incoming request, used to detect client disconnects
+
+    Returns:
+        StreamingResponse: text/event-stream of delta events and keep-alive comments
+    """
+    return StreamingResponse(
+        event_bus.stream(request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
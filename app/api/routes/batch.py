@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from ... import config, database, schemas
+from ...database import SingleTransaction, get_db
+from ..services import batch_service
+
+router = APIRouter(tags=["batch"])
+
+@router.post(batch_service.BATCH_PATH, response_model=schemas.BatchResponse)
+async def run_batch(batch: schemas.BatchRequest, request: Request, response: Response, db: Session = Depends(get_db)):
+    """
+    Run several API requests in one round trip and one database transaction.
+
+    Sub-requests run in order on one session and may refer to earlier results, e.g.
+    `/customers/$0.id/addresses/`. If one doesn't succeed with a 2xx status, the batch
+    stops there, everything is rolled back, and the batch answers with the sub-request's
+    error status (422 for any other status).
+
+    Parameters:
+        batch (BatchRequest): The sub-requests
+        db (Session): Database session shared by the sub-requests
+
+    Returns:
+        BatchResponse: Whether the batch was committed, and the result of each sub-request run
+
+    Raises:
+        HTTPException: If the batch has more than BATCH_MAX_REQUESTS sub-requests
+    """
+    if len(batch.requests) > config.BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=422, detail=f"A batch may have at most {config.BATCH_MAX_REQUESTS} requests")
+
+    results = []
+    transaction = SingleTransaction(db)
+    await run_in_threadpool(transaction.begin)
+    token = database.shared_session.set(db)
+    try:
+        for operation in batch.requests:
+            try:
+                status_code, body = await batch_service.dispatch(
+                    request.app, request.scope, operation.method,
+                    batch_service.resolve_path(operation.path, results),
+                    batch_service.resolve(operation.body, results)
+                )
+            except batch_service.BatchError as error:
+                status_code, body = 422, {"detail": str(error)}
+            results.append(schemas.BatchResult(status=status_code, body=body))
+            if not 200 <= status_code < 300:
+                await run_in_threadpool(transaction.rollback)
+                # A sub-request that didn't succeed nor fail (e.g. a redirect) can't be batched
+                response.status_code = status_code if status_code >= 400 else 422
+                return schemas.BatchResponse(committed=False, results=results)
+        await run_in_threadpool(transaction.commit)
+    except BaseException:
+        # Also when the commit itself failed; a no-op once the transaction has ended
+        await run_in_threadpool(transaction.rollback)
+        raise
+    finally:
+        database.shared_session.reset(token)
+    return schemas.BatchResponse(committed=True, results=results)
@@ -1,23 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
-from ... import schemas
-from ...database import get_db
-from ..services import customers_service
+from typing import List, Optional
+from ... import config, schemas
+from ...database import get_db, statement_timeout
+from ..routing import SessionReleasingRoute
+from ..services import conditional, customers_service, idempotency_service
+from ..services.cache import NAMESPACES
 
 router = APIRouter(
     prefix="/customers",
-    tags=["customers"]
+    tags=["customers"],
+    route_class=SessionReleasingRoute
 )
 
 @router.post("/", response_model=schemas.Customer)
-def create_customer(customer: schemas.CustomerCreate, db: Session = Depends(get_db)):
+def create_customer(
+    customer: schemas.CustomerCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
     """
     Create a new customer in the database.
     Checks for duplicate email and telephone numbers before creation.
+    A retry with the same Idempotency-Key returns the original response.
 
     Parameters:
         customer (CustomerCreate): Customer data to create
+        idempotency_key (str): Optional Idempotency-Key header
         db (Session): Database session
 
     Returns:
@@ -26,34 +36,70 @@ def create_customer(customer: schemas.CustomerCreate, db: Session = Depends(get_
     Raises:
         HTTPException: If email or telephone number is already registered
     """
-    db_customer = customers_service.get_customer_by_email(db, email=customer.email)
-    if db_customer:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    db_customer = customers_service.get_customer_by_telephone(db, telephone=customer.telephone)
-    if db_customer:
-        raise HTTPException(status_code=400, detail="Telephone number already registered")
-    return customers_service.create_customer(db=db, customer=customer)
+    def create():
+        db_customer = customers_service.get_customer_by_email(db, email=customer.email)
+        if db_customer:
+            raise HTTPException(status_code=400, detail="Email already registered")
+        db_customer = customers_service.get_customer_by_telephone(db, telephone=customer.telephone)
+        if db_customer:
+            raise HTTPException(status_code=400, detail="Telephone number already registered")
+        return customers_service.create_customer(db=db, customer=customer)
+
+    result, replayed = idempotency_service.run_once(
+        db, idempotency_key, "create_customer", {"customer": customer}, create, schemas.Customer
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
 @router.get("/", response_model=List[schemas.Customer])
-def read_customers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_customers(
+    skip: int = 0,
+    limit: int = 100,
+    sort_by: str = Query("id", regex="^(id|total_spend|order_count|last_order_at)$", description="Sort key (id, total_spend, order_count or last_order_at)"),
+    db: Session = Depends(get_db)
+):
     """
     Get a list of customers with pagination support.
+    Customers can be sorted by their lifetime order counters, highest first.
 
     Parameters:
         skip (int): Number of records to skip (for pagination)
         limit (int): Maximum number of records to return
+        sort_by (str): Sort key (id, total_spend, order_count or last_order_at)
         db (Session): Database session
 
     Returns:
         List[Customer]: List of customer objects
     """
-    customers = customers_service.get_customers(db, skip=skip, limit=limit)
+    customers = customers_service.get_customers(db, skip=skip, limit=limit, sort_by=sort_by)
     return customers
 
+@router.post("/batch-get", response_model=schemas.CustomerBatch)
+def batch_get_customers(request: schemas.BatchGetRequest, db: Session = Depends(get_db)):
+    """
+    Get several customers by ID in one request.
+
+    Parameters:
+        request (BatchGetRequest): IDs of the customers to retrieve
+        db (Session): Database session
+
+    Returns:
+        CustomerBatch: The customers found, in the order requested, and the IDs that don't exist
+
+    Raises:
+        HTTPException: If more than BATCH_GET_MAX_IDS IDs are requested
+    """
+    if len(request.ids) > config.BATCH_GET_MAX_IDS:
+        raise HTTPException(status_code=422, detail=f"At most {config.BATCH_GET_MAX_IDS} ids may be fetched at once")
+    customers, missing = customers_service.get_customers_by_ids(db, request.ids)
+    return schemas.CustomerBatch(customers=customers, missing=missing)
+
 @router.get("/{customer_id}", response_model=schemas.Customer)
-def read_customer(customer_id: int, db: Session = Depends(get_db)):
+def read_customer(customer_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """
     Get a specific customer by their ID.
+    Answers 304 Not Modified if the client's copy (If-None-Match / If-Modified-Since) is current.
 
     Parameters:
         customer_id (int): ID of the customer to retrieve
@@ -64,7 +110,14 @@ def read_customer(customer_id: int, db: Session = Depends(get_db)):
 
     Raises:
         HTTPException: If customer is not found
+        NotModified: If the client's copy is current
     """
+    version = customers_service.get_customer_version(db, customer_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    conditional.check(
+        request, response, conditional.make_etag("customer", NAMESPACES["customer"], customer_id, version[0]), version[1]
+    )
     db_customer = customers_service.get_customer(db, customer_id=customer_id)
     if db_customer is None:
         raise HTTPException(status_code=404, detail="Customer not found")
@@ -74,16 +127,20 @@ def read_customer(customer_id: int, db: Session = Depends(get_db)):
 def create_address(
     customer_id: int,
     address: schemas.AddressCreate,
+    response: Response,
     is_billing: bool = False,
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
     """
     Create a new address for a specific customer.
+    A retry with the same Idempotency-Key returns the original response.
 
     Parameters:
         customer_id (int): ID of the customer to add the address to
         address (AddressCreate): Address data to create
         is_billing (bool): Whether this is a billing address
+        idempotency_key (str): Optional Idempotency-Key header
         db (Session): Database session
 
     Returns:
@@ -92,10 +149,18 @@ def create_address(
     Raises:
         HTTPException: If customer is not found
     """
-    db_customer = customers_service.get_customer(db, customer_id=customer_id)
-    if db_customer is None:
-        raise HTTPException(status_code=404, detail="Customer not found")
-    return customers_service.create_customer_address(db=db, address=address, customer_id=customer_id, is_billing=is_billing)
+    def create():
+        if not customers_service.customer_exists(db, customer_id=customer_id):
+            raise HTTPException(status_code=404, detail="Customer not found")
+        return customers_service.create_customer_address(db=db, address=address, customer_id=customer_id, is_billing=is_billing)
+
+    result, replayed = idempotency_service.run_once(
+        db, idempotency_key, "create_address",
+        {"customer_id": customer_id, "is_billing": is_billing, "address": address}, create, schemas.Address
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
 @router.get("/{customer_id}/addresses/", response_model=List[schemas.Address])
 def read_customer_addresses(customer_id: int, db: Session = Depends(get_db)):
@@ -112,12 +177,12 @@ def read_customer_addresses(customer_id: int, db: Session = Depends(get_db)):
     Raises:
         HTTPException: If customer is not found
     """
-    db_customer = customers_service.get_customer(db, customer_id=customer_id)
-    if db_customer is None:
+    if not customers_service.customer_exists(db, customer_id=customer_id):
         raise HTTPException(status_code=404, detail="Customer not found")
     return customers_service.get_customer_addresses(db=db, customer_id=customer_id)
 
-@router.get("/search/{query}", response_model=List[schemas.Customer])
+@router.get("/search/{query}", response_model=List[schemas.Customer],
+            dependencies=[Depends(statement_timeout("STATEMENT_TIMEOUT_SEARCH_MS"))])
 def search_customers(query: str, db: Session = Depends(get_db)):
     """
     Search for customers based on a query string.
@@ -1,7 +1,6 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from ...database import get_db
-from ..services.health_service import HealthService
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from ..services import health_service
 
 router = APIRouter(
     tags=["health"]
@@ -12,6 +11,26 @@ async def root():
     return {"message": "Hello World"}
 
 @router.get("/health")
-async def health_check(db: Session = Depends(get_db)):
-    health_service = HealthService(db)
-    return health_service.get_health_status() 
\ No newline at end of file
+async def health_check():
+    """Summary of the worker's health from the cached database probe, pool and admission state."""
+    return health_service.get_health_status()
+
+@router.get("/health/live")
+async def liveness():
+    """Liveness probe: answers as long as the worker's event loop runs; no I/O."""
+    return health_service.get_liveness()
+
+@router.get("/health/ready")
+async def readiness():
+    """Readiness probe: 200 if the background database probe recently succeeded, 503 otherwise."""
+    status = health_service.get_readiness()
+    return JSONResponse(status, status_code=200 if status["status"] == "ready" else 503)
+
+@router.get("/health/deep")
+def deep_health():
+    """
+    Deep check of pool, admission, replication lag and schema state.
+    Runs in the threadpool with bounded timeouts; results are cached briefly.
+    """
+    status = health_service.get_deep_status()
+    return JSONResponse(status, status_code=200 if status["status"] == "healthy" else 503)
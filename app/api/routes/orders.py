@@ -1,51 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
-from ... import schemas
-from ...database import get_db
-from ..services import orders_service
+from typing import List, Optional
+from datetime import datetime
+from ... import config, schemas
+from ...database import get_db, statement_timeout
+from ..routing import SessionReleasingRoute
+from ..services import conditional, idempotency_service, orders_service
+from ..services.cache import NAMESPACES
 
 router = APIRouter(
     prefix="/orders",
-    tags=["orders"]
+    tags=["orders"],
+    route_class=SessionReleasingRoute
 )
 
 @router.post("/customers/{customer_id}/orders/", response_model=schemas.Order)
 def create_order(
     customer_id: int,
     order: schemas.OrderCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    db_customer = orders_service.get_customer(db, customer_id=customer_id)
-    if db_customer is None:
-        raise HTTPException(status_code=404, detail="Customer not found")
-    
-    # Verify billing address exists and belongs to customer
-    billing_address = orders_service.get_customer_addresses(db, customer_id=customer_id)
-    if not any(addr.id == order.billing_address_id for addr in billing_address):
-        raise HTTPException(status_code=400, detail="Invalid billing address")
-    
-    # Verify all shipping addresses exist and belong to customer
-    shipping_addresses = orders_service.get_customer_addresses(db, customer_id=customer_id)
-    for shipping_addr in order.shipping_addresses:
-        if not any(addr.id == shipping_addr.address_id for addr in shipping_addresses):
-            raise HTTPException(status_code=400, detail=f"Invalid shipping address ID: {shipping_addr.address_id}")
-    
-    return orders_service.create_order(db=db, order=order, customer_id=customer_id)
+    """Create an order; a retry with the same Idempotency-Key returns the original response."""
+    def create():
+        if not orders_service.customer_exists(db, customer_id=customer_id):
+            raise HTTPException(status_code=404, detail="Customer not found")
+
+        # Verify billing address exists and belongs to customer
+        address_ids = {addr.id for addr in orders_service.get_customer_addresses(db, customer_id=customer_id)}
+        if order.billing_address_id not in address_ids:
+            raise HTTPException(status_code=400, detail="Invalid billing address")
+
+        # Verify all shipping addresses exist and belong to customer
+        for shipping_addr in order.shipping_addresses:
+            if shipping_addr.address_id not in address_ids:
+                raise HTTPException(status_code=400, detail=f"Invalid shipping address ID: {shipping_addr.address_id}")
+
+        return orders_service.create_order(db=db, order=order, customer_id=customer_id)
+
+    result, replayed = idempotency_service.run_once(
+        db, idempotency_key, "create_order", {"customer_id": customer_id, "order": order}, create, schemas.Order
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
 @router.get("/customers/{customer_id}/orders/", response_model=List[schemas.Order])
 def read_customer_orders(
     customer_id: int,
     skip: int = 0,
     limit: int = 100,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
     db: Session = Depends(get_db)
 ):
-    db_customer = orders_service.get_customer(db, customer_id=customer_id)
-    if db_customer is None:
+    if not orders_service.customer_exists(db, customer_id=customer_id):
         raise HTTPException(status_code=404, detail="Customer not found")
-    return orders_service.get_customer_orders(db=db, customer_id=customer_id, skip=skip, limit=limit)
+    return orders_service.get_customer_orders(
+        db=db, customer_id=customer_id, skip=skip, limit=limit,
+        start_date=start_date, end_date=end_date
+    )
 
-@router.get("/search/", response_model=List[schemas.Order])
+@router.get("/search/", response_model=List[schemas.Order],
+            dependencies=[Depends(statement_timeout("STATEMENT_TIMEOUT_SEARCH_MS"))])
 def search_orders(
     query: str,
     skip: int = 0,
@@ -54,8 +72,30 @@ def search_orders(
 ):
     return orders_service.search_orders(db=db, query=query, skip=skip, limit=limit)
 
+@router.get("/batch", response_model=schemas.OrderBatch)
+def batch_get_orders(
+    ids: str = Query(..., description="Comma-separated ids of the orders to fetch"),
+    db: Session = Depends(get_db)
+):
+    """Get several hot or archived orders by id, in the order given, along with the ids that don't exist."""
+    try:
+        order_ids = [int(order_id) for order_id in ids.split(",") if order_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be a comma-separated list of integers")
+    if len(order_ids) > config.BATCH_GET_MAX_IDS:
+        raise HTTPException(status_code=422, detail=f"At most {config.BATCH_GET_MAX_IDS} ids may be fetched at once")
+    orders, missing = orders_service.get_orders_by_ids(db, order_ids)
+    return schemas.OrderBatch(orders=orders, missing=missing)
+
 @router.get("/{order_id}", response_model=schemas.Order)
-def read_order(order_id: int, db: Session = Depends(get_db)):
+def read_order(order_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    """Get a hot or archived order; 304 Not Modified if the client's copy is current."""
+    version = orders_service.get_order_version(db, order_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    conditional.check(
+        request, response, conditional.make_etag("order", NAMESPACES["order"], order_id, version[0]), version[1]
+    )
     db_order = orders_service.get_order(db, order_id=order_id)
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -65,7 +105,11 @@ def read_order(order_id: int, db: Session = Depends(get_db)):
 def read_orders(
     skip: int = 0,
     limit: int = 100,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all orders with pagination."""
-    return orders_service.get_orders(db=db, skip=skip, limit=limit) 
\ No newline at end of file
+    """Get all orders with pagination, optionally limited to an order_date window."""
+    return orders_service.get_orders(
+        db=db, skip=skip, limit=limit, start_date=start_date, end_date=end_date
+    )
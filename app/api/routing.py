@@ -0,0 +1,54 @@
+"""
+Route class releasing the request's database connection before serialization.
+
+A session keeps its connection from its first query until the transaction ends, which
+for reads is when `get_db` closes it, after the response has been serialized and sent.
+`SessionReleasingRoute` ends the transaction as soon as the endpoint returns instead:
+ORM objects in the result are first converted to the route's response model (any lazy
+loads still run on the open session), then the session is rolled back, returning its
+connection to the pool. Writes are committed by the services, so the rollback only ends
+read transactions and discards nothing that `get_db` would have kept.
+"""
+
+import asyncio
+import functools
+from typing import Callable
+from fastapi.routing import APIRoute
+from sqlalchemy.orm import Session
+from starlette.responses import Response
+from .. import database
+
+class SessionReleasingRoute(APIRoute):
+    """APIRoute whose sync endpoints give their session's connection back before serialization."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        # Routes are copied when their router is included; wrap the endpoint only once
+        if not asyncio.iscoroutinefunction(endpoint) and not hasattr(endpoint, "releases_session"):
+            endpoint = self._releasing(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def _releasing(self, endpoint: Callable) -> Callable:
+        @functools.wraps(endpoint)
+        def run(*args, **kwargs):
+            token = database.current_route.set(self.path)
+            sessions = [value for value in kwargs.values() if isinstance(value, Session)]
+            try:
+                result = endpoint(*args, **kwargs)
+                if any(session.identity_map for session in sessions):
+                    result = self._to_response_model(result)
+                return result
+            finally:
+                for session in sessions:
+                    if session.in_transaction():
+                        session.rollback()
+                database.current_route.reset(token)
+        run.releases_session = True
+        return run
+
+    def _to_response_model(self, result):
+        """Convert a result to the response model while its ORM objects can still load."""
+        if self.response_field is None or isinstance(result, Response):
+            return result
+        value, errors = self.response_field.validate(result, {}, loc=("response",))
+        # Invalid results are left for FastAPI to report as usual
+        return result if errors else value
@@ -0,0 +1,208 @@
+"""
+Admission control for the API workers.
+
+Every request is classified as a write, a read or an analytics request and must hold
+one of the worker's ADMISSION_MAX_CONCURRENCY slots while it runs; by default there are
+as many slots as pooled connections, so admitted requests rarely wait on the pool and
+the ones that would are queued here instead, where the wait is bounded. Analytics may
+hold at most ADMISSION_ANALYTICS_SHARE of the slots.
+
+When every slot is taken, requests queue in priority order (writes, then reads, then
+analytics) and a freed slot goes to the first waiter whose class still has room. A
+request still queued after its class's timeout is rejected with 503 and Retry-After
+instead of adding to the backlog; analytics give up sooner than writes and reads.
+
+The controller lives on the worker's event loop. Queue and pool wait statistics per
+class are reported by `/health`.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+from typing import Dict, Optional
+from ... import config, database
+
+WRITE = "write"
+READ = "read"
+ANALYTICS = "analytics"
+
+# Lower is served first
+PRIORITIES = {WRITE: 0, READ: 1, ANALYTICS: 2}
+
+# Class of the request being handled, for attributing pool waits
+current_class: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("admission_class", default=None)
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Return the admission class of a request, or None if it is not admission controlled."""
+    if path.startswith("/analytics"):
+        # Streams stay open indefinitely and never touch the pool after connecting
+        return None if path.startswith("/analytics/stream") else ANALYTICS
+    if path.startswith(("/customers", "/orders")):
+        # Batch gets are POSTs only to carry their ids in the body
+        return READ if method in ("GET", "HEAD") or path.endswith("/batch-get") else WRITE
+    if path.rstrip("/") == "/batch":
+        # One transaction holding its connection for every sub-request
+        return WRITE
+    return None
+
+class ClassStats:
+    """Counters of one admission class."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.pool_waits = 0
+        self.pool_wait_total = 0.0
+        self.pool_wait_max = 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queue_wait_avg_ms": round(self.queue_wait_total / self.admitted * 1000, 2) if self.admitted else 0.0,
+            "queue_wait_max_ms": round(self.queue_wait_max * 1000, 2),
+            "pool_wait_avg_ms": round(self.pool_wait_total / self.pool_waits * 1000, 2) if self.pool_waits else 0.0,
+            "pool_wait_max_ms": round(self.pool_wait_max * 1000, 2),
+        }
+
+class AdmissionController:
+    """Concurrency slots shared by the request classes, handed out by priority."""
+
+    def __init__(self, max_concurrency: int, class_limits: Dict[str, int], queue_timeouts: Dict[str, float]):
+        self.max_concurrency = max_concurrency
+        self.class_limits = class_limits
+        self.queue_timeouts = queue_timeouts
+        self.in_flight = 0
+        self.stats = {route_class: ClassStats() for route_class in PRIORITIES}
+        self._waiters = []  # heap of (priority, sequence, route_class, future)
+        self._sequence = itertools.count()
+        self._stats_lock = threading.Lock()
+
+    async def acquire(self, route_class: str) -> bool:
+        """
+        Take a slot for a request, queueing up to the class's timeout.
+
+        Returns:
+            True if the request was admitted and must `release` its slot, False if it
+            should be rejected
+        """
+        stats = self.stats[route_class]
+        priority = PRIORITIES[route_class]
+        if self._has_room(route_class) and not any(
+            waiter[0] <= priority and not waiter[3].done() for waiter in self._waiters
+        ):
+            self._admit(route_class)
+            self._record_queue_wait(stats, 0.0)
+            return True
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), route_class, future))
+        stats.queued += 1
+        started = loop.time()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeouts[route_class])
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                stats.rejected += 1
+                return False
+        except asyncio.CancelledError:
+            # The client went away; give back a slot handed over meanwhile
+            if future.done() and not future.cancelled():
+                self.release(route_class)
+            else:
+                future.cancel()
+            raise
+        finally:
+            stats.queued -= 1
+        self._record_queue_wait(stats, loop.time() - started)
+        return True
+
+    def release(self, route_class: str):
+        """Give a slot back and hand it to the first waiter that may take it."""
+        self.in_flight -= 1
+        self.stats[route_class].in_flight -= 1
+        self._wake()
+
+    def record_pool_wait(self, route_class: str, seconds: float):
+        """Record how long a request waited for a pooled connection; called from request threads."""
+        stats = self.stats[route_class]
+        with self._stats_lock:
+            stats.pool_waits += 1
+            stats.pool_wait_total += seconds
+            stats.pool_wait_max = max(stats.pool_wait_max, seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "classes": {route_class: stats.snapshot() for route_class, stats in self.stats.items()},
+        }
+
+    def _has_room(self, route_class: str) -> bool:
+        return (self.in_flight < self.max_concurrency
+                and self.stats[route_class].in_flight < self.class_limits[route_class])
+
+    def _admit(self, route_class: str):
+        self.in_flight += 1
+        self.stats[route_class].in_flight += 1
+
+    def _record_queue_wait(self, stats: ClassStats, waited: float):
+        stats.admitted += 1
+        stats.queue_wait_total += waited
+        stats.queue_wait_max = max(stats.queue_wait_max, waited)
+
+    def _wake(self):
+        skipped = []
+        while self._waiters and self.in_flight < self.max_concurrency:
+            entry = heapq.heappop(self._waiters)
+            route_class, future = entry[2], entry[3]
+            if future.done():
+                continue
+            if not self._has_room(route_class):
+                # Its class is at its limit; let lower priority classes use the slot
+                skipped.append(entry)
+                continue
+            self._admit(route_class)
+            future.set_result(True)
+        for entry in skipped:
+            heapq.heappush(self._waiters, entry)
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+def get_admission_controller() -> AdmissionController:
+    """Return the worker's admission controller, built from the ADMISSION_* settings on first use."""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            slots = config.ADMISSION_MAX_CONCURRENCY or database.POOL_SIZE + database.MAX_OVERFLOW
+            _controller = AdmissionController(
+                slots,
+                {WRITE: slots, READ: slots, ANALYTICS: max(1, int(slots * config.ADMISSION_ANALYTICS_SHARE))},
+                {WRITE: config.ADMISSION_QUEUE_TIMEOUT, READ: config.ADMISSION_QUEUE_TIMEOUT,
+                 ANALYTICS: config.ADMISSION_ANALYTICS_QUEUE_TIMEOUT}
+            )
+        return _controller
+
+def reset_admission_controller():
+    """Drop the worker's controller so the next request rebuilds it from the settings."""
+    global _controller
+    with _controller_lock:
+        _controller = None
+
+def _observe_checkout(seconds: float):
+    route_class = current_class.get()
+    if route_class is not None and _controller is not None:
+        _controller.record_pool_wait(route_class, seconds)
+
+database.checkout_observers.append(_observe_checkout)
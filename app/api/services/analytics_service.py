@@ -1,8 +1,22 @@
+import contextvars
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from sqlalchemy.orm import Session
-from ... import schemas
-from ..queries import analytics_queries
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+from ... import config, database, models, schemas
+from ...database import SessionLocal
+from ..queries import analytics_queries, archive_queries, geo_rollup_queries, zip_sketch_queries
+from . import columnar_analytics, leaderboard
+from .cache import cached_response
 
-def get_orders_by_zip_code(db: Session, address_type: str = "billing", order_by: str = "desc"):
+def _use_columnar() -> bool:
+    return config.ANALYTICS_BACKEND == "columnar"
+
+@cached_response("analytics", schemas.ZipCodeAnalytics, "CACHE_ANALYTICS_TTL")
+def get_orders_by_zip_code(db: Session, address_type: str = "billing", order_by: str = "desc",
+                           start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
     """
     Get order count aggregated by zip code.
     
@@ -10,99 +24,149 @@ def get_orders_by_zip_code(db: Session, address_type: str = "billing", order_by:
         db: Database session
         address_type: Type of address to analyze (billing or shipping)
         order_by: Sort order (asc or desc)
+        start_date: Inclusive lower bound on order_date
+        end_date: Exclusive upper bound on order_date
     
     Returns:
-        List of zip code analytics with order counts
+        List of zip code analytics with order counts and estimated distinct customers
     """
-    results = analytics_queries.get_orders_by_zip_code_query(db, address_type, order_by).all()
+    if _use_columnar():
+        # The snapshot already holds archived orders
+        counts = dict(columnar_analytics.get_snapshot(db).zip_counts(address_type, start_date, end_date))
+    else:
+        results = analytics_queries.get_orders_by_zip_code_query(
+            db, address_type, order_by, start_date, end_date
+        ).all()
+
+        # Add archived orders from the precomputed rollups
+        counts = dict(results)
+        dimension = "billing_zip" if address_type == "billing" else "shipping_zip"
+        for zip_code, count in archive_queries.get_archive_rollup_counts(db, dimension, start_date, end_date).items():
+            counts[zip_code] = counts.get(zip_code, 0) + count
+    sorted_counts = sorted(counts.items(), key=lambda item: item[1], reverse=order_by.lower() != "asc")
+    unique_customers = zip_sketch_queries.get_unique_customers_by_zip(db, address_type, start_date, end_date)
     
     return [
         schemas.ZipCodeAnalytics(
             zip_code=zip_code,
-            order_count=count
-        ) for zip_code, count in results
+            order_count=count,
+            unique_customers=unique_customers.get(zip_code, 0)
+        ) for zip_code, count in sorted_counts
     ]
 
-def get_orders_by_time_of_day(db: Session, limit: int = 10):
+@cached_response("analytics", schemas.GeoAnalytics, "CACHE_ANALYTICS_TTL")
+def get_orders_by_geo(db: Session, level: str = "state", parent: Optional[str] = None,
+                      address_type: str = "billing", limit: int = 50):
+    """
+    Get all-time order counts per geographic area from the precomputed rollups.
+    
+    Args:
+        db: Database session
+        level: state, city, zip3 or zip
+        parent: Only areas inside this parent (state for city/zip3, zip3 for zip)
+        address_type: Type of address to analyze (billing or shipping)
+        limit: Number of areas to return, busiest first
+    
+    Returns:
+        List of geo analytics with order counts
+    """
+    if level == "state":
+        parent = ""
+    elif parent is not None and level in ("city", "zip3"):
+        parent = parent.upper()
+    rollups = geo_rollup_queries.get_geo_rollups(db, address_type, level, parent, limit)
+
+    return [
+        schemas.GeoAnalytics(
+            level=rollup.level,
+            key=rollup.key,
+            parent=rollup.parent or None,
+            order_count=rollup.order_count
+        ) for rollup in rollups
+    ]
+
+@cached_response("analytics", schemas.TimeOfDayAnalytics, "CACHE_ANALYTICS_TTL")
+def get_orders_by_time_of_day(db: Session, limit: int = 10, start_date: Optional[datetime] = None,
+                              end_date: Optional[datetime] = None):
     """
     Get order count aggregated by hour of day.
     
     Args:
         db: Database session
         limit: Number of hours to return
+        start_date: Inclusive lower bound on order_date
+        end_date: Exclusive upper bound on order_date
     
     Returns:
         List of time of day analytics with order counts
     """
-    results = analytics_queries.get_orders_by_time_of_day_query(db).all()
-
-    # Create a dictionary of all hours with zero counts
-    all_hours = {hour: 0 for hour in range(24)}
-    
-    # Update with actual counts
-    for hour, count in results:
-        all_hours[int(hour)] = count
-
-    # Convert to list and sort by count (desc) and hour (asc)
-    sorted_hours = sorted(
-        [{"hour": hour, "order_count": count} for hour, count in all_hours.items()],
-        key=lambda x: (-x["order_count"], x["hour"])
-    )
+    if _use_columnar():
+        results, archived = columnar_analytics.get_snapshot(db).hour_counts(start_date, end_date), {}
+    else:
+        results = analytics_queries.get_orders_by_time_of_day_query(db, start_date, end_date).all()
+        archived = archive_queries.get_archive_rollup_counts(db, "hour", start_date, end_date)
 
-    # Return top N hours
     return [
         schemas.TimeOfDayAnalytics(
-            hour=item["hour"],
-            order_count=item["order_count"]
-        ) for item in sorted_hours[:limit]
+            hour=hour,
+            order_count=count
+        ) for hour, count in _busiest_buckets(results, archived, 24, limit)
     ]
 
-def get_orders_by_day_of_week(db: Session, limit: int = 7):
+@cached_response("analytics", schemas.DayOfWeekAnalytics, "CACHE_ANALYTICS_TTL")
+def get_orders_by_day_of_week(db: Session, limit: int = 7, start_date: Optional[datetime] = None,
+                              end_date: Optional[datetime] = None):
     """
     Get order count aggregated by day of week.
     
     Args:
         db: Database session
         limit: Number of days to return
+        start_date: Inclusive lower bound on order_date
+        end_date: Exclusive upper bound on order_date
     
     Returns:
         List of day of week analytics with order counts
     """
-    results = analytics_queries.get_orders_by_day_of_week_query(db).all()
+    if _use_columnar():
+        results, archived = columnar_analytics.get_snapshot(db).day_of_week_counts(start_date, end_date), {}
+    else:
+        results = analytics_queries.get_orders_by_day_of_week_query(db, start_date, end_date).all()
+        archived = archive_queries.get_archive_rollup_counts(db, "dow", start_date, end_date)
 
-    # Create a dictionary of all days with zero counts
-    all_days = {day: 0 for day in range(7)}
-    
-    # Update with actual counts
-    for day, count in results:
-        all_days[int(day)] = count
-
-    # Convert to list and sort by count (desc) and day (asc)
-    sorted_days = sorted(
-        [{"day_of_week": day, "order_count": count} for day, count in all_days.items()],
-        key=lambda x: (-x["order_count"], x["day_of_week"])
-    )
-
-    # Return top N days
     return [
         schemas.DayOfWeekAnalytics(
-            day_of_week=item["day_of_week"],
-            order_count=item["order_count"]
-        ) for item in sorted_days[:limit]
+            day_of_week=day,
+            order_count=count
+        ) for day, count in _busiest_buckets(results, archived, 7, limit)
     ]
 
-def get_top_in_store_customers(db: Session, limit: int = 5):
+@cached_response("analytics", schemas.TopInStoreCustomerAnalytics, "CACHE_ANALYTICS_TTL")
+def get_top_in_store_customers(db: Session, limit: int = 5, window: Optional[str] = None):
     """
     Get top customers by number of in-store orders.
     
     Args:
         db: Database session
         limit: Number of top customers to return
+        window: today, 7d or 30d to rank by recent orders from the in-memory
+            leaderboard (at most LEADERBOARD_TOP_SIZE customers); None ranks by
+            lifetime orders
     
     Returns:
         List of top in-store customer analytics
     """
-    results = analytics_queries.get_top_in_store_customers_query(db, limit).all()
+    if window is not None:
+        counts = leaderboard.get_leaderboard(db).top(window, limit)
+        details = leaderboard.get_customer_details(db, [customer_id for customer_id, _ in counts])
+        results = [
+            (customer_id, *details[customer_id], count)
+            for customer_id, count in counts if customer_id in details
+        ]
+    elif _use_columnar():
+        results = _with_customer_details(db, columnar_analytics.get_snapshot(db).top_in_store_customers(limit))
+    else:
+        results = analytics_queries.get_top_in_store_customers_query(db, limit).all()
     
     return [
         schemas.TopInStoreCustomerAnalytics(
@@ -113,3 +177,109 @@ def get_top_in_store_customers(db: Session, limit: int = 5):
             in_store_order_count=count
         ) for customer_id, first_name, last_name, email, count in results
     ]
+
+_dashboard_executor: Optional[ThreadPoolExecutor] = None
+_dashboard_executor_lock = threading.Lock()
+
+def _get_dashboard_executor() -> ThreadPoolExecutor:
+    global _dashboard_executor
+    with _dashboard_executor_lock:
+        if _dashboard_executor is None:
+            _dashboard_executor = ThreadPoolExecutor(
+                max_workers=config.ANALYTICS_DASHBOARD_CONCURRENCY, thread_name_prefix="analytics-dashboard"
+            )
+        return _dashboard_executor
+
+@cached_response("analytics", schemas.AnalyticsDashboard, "CACHE_ANALYTICS_TTL")
+def get_dashboard(db: Session, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                  address_type: str = "billing", order_by: str = "desc", hour_limit: int = 10,
+                  day_limit: int = 7, customer_limit: int = 5, window: Optional[str] = None):
+    """
+    Get the zip code, time of day, day of week and top in-store customer analytics at once.
+
+    The parts run concurrently, each on its own session, so the dashboard takes about
+    as long as its slowest part. The first runs on the request's connection, the others
+    on the dashboard engine's. They bypass the per-part response cache; the dashboard
+    is cached as one entry.
+
+    Args:
+        db: Database session
+        start_date: Inclusive lower bound on order_date of the order counts (not of
+            the top customers, which are ranked by `window`)
+        end_date: Exclusive upper bound on order_date of the order counts
+        address_type: Type of address to count zip codes of (billing or shipping)
+        order_by: Sort order of the zip codes (asc or desc)
+        hour_limit: Number of hours to return
+        day_limit: Number of days to return
+        customer_limit: Number of top in-store customers to return
+        window: Leaderboard window of the top customers (today, 7d or 30d), or None for lifetime
+
+    Returns:
+        The dashboard
+    """
+    parts = [
+        (_uncached(get_orders_by_zip_code), {"address_type": address_type, "order_by": order_by,
+                                             "start_date": start_date, "end_date": end_date}),
+        (_uncached(get_orders_by_time_of_day), {"limit": hour_limit, "start_date": start_date, "end_date": end_date}),
+        (_uncached(get_orders_by_day_of_week), {"limit": day_limit, "start_date": start_date, "end_date": end_date}),
+        (_uncached(get_top_in_store_customers), {"limit": customer_limit, "window": window}),
+    ]
+    # Parts inherit the request's statement timeout and cancel-on-disconnect registration
+    info = {key: value for key, value in db.info.items() if key == "statement_timeout_ms"}
+
+    def run_part(function, kwargs):
+        session = SessionLocal(bind=database.dashboard_engine, info=dict(info))
+        try:
+            return function(session, **kwargs)
+        finally:
+            session.close()
+
+    executor = _get_dashboard_executor()
+    futures = [
+        executor.submit(contextvars.copy_context().run, run_part, function, kwargs)
+        for function, kwargs in parts[1:]
+    ]
+    try:
+        zip_codes = parts[0][0](db, **parts[0][1])
+    finally:
+        # Even if this part failed, none of the others may outlive the request
+        wait(futures)
+    time_of_day, day_of_week, top_in_store_customers = [future.result() for future in futures]
+    return schemas.AnalyticsDashboard(
+        zip_codes=zip_codes, time_of_day=time_of_day, day_of_week=day_of_week,
+        top_in_store_customers=top_in_store_customers
+    )
+
+def _uncached(function):
+    return getattr(function, "__wrapped__", function)
+
+def _with_customer_details(db: Session, counts: List[Tuple[int, int]]) -> List[tuple]:
+    """Attach name and email to (customer_id, count) pairs with a single lookup."""
+    customers = {
+        customer.id: customer
+        for customer in db.query(models.Customer).filter(
+            models.Customer.id.in_([customer_id for customer_id, _ in counts])
+        )
+    }
+    return [
+        (customer_id, customers[customer_id].first_name, customers[customer_id].last_name,
+         customers[customer_id].email, count)
+        for customer_id, count in counts if customer_id in customers
+    ]
+
+def _busiest_buckets(results: List[Tuple[int, int]], archived: Dict[str, int], size: int,
+                     limit: int) -> List[Tuple[int, int]]:
+    """
+    Combine live and archived counts for buckets 0..size-1 and rank them.
+
+    Buckets without orders count as zero. Ties are broken by the lower bucket.
+
+    Returns:
+        The `limit` busiest (bucket, count) pairs
+    """
+    counts = [0] * size
+    for bucket, count in results:
+        counts[bucket] = count
+    for bucket, count in archived.items():
+        counts[int(bucket)] += count
+    return heapq.nsmallest(limit, enumerate(counts), key=lambda item: (-item[1], item[0]))
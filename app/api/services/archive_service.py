@@ -0,0 +1,48 @@
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Optional
+from ... import config
+from ...database import after_commit
+from ..queries import archive_queries
+from .cache import get_cache
+
+def archive_orders(db: Session, horizon_days: Optional[int] = None, batch_size: Optional[int] = None,
+                   max_batches: Optional[int] = None) -> int:
+    """
+    Move orders older than the horizon, with their shipping addresses, into the archive.
+
+    Each batch is archived in its own transaction so the hot tables are never locked
+    for long and an interrupted run simply resumes with the next batch.
+
+    Args:
+        db: Database session
+        horizon_days: Keep orders newer than this many days hot (default ARCHIVE_HORIZON_DAYS)
+        batch_size: Orders moved per transaction (default ARCHIVE_BATCH_SIZE)
+        max_batches: Stop after this many batches (default: run until nothing is left)
+
+    Returns:
+        Number of orders archived
+    """
+    horizon_days = config.ARCHIVE_HORIZON_DAYS if horizon_days is None else horizon_days
+    batch_size = batch_size or config.ARCHIVE_BATCH_SIZE
+    cutoff = datetime.utcnow() - timedelta(days=horizon_days)
+
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        batch = archive_queries.select_archive_batch(db, cutoff, batch_size)
+        if not batch:
+            db.rollback()
+            break
+        order_ids = [order_id for order_id, _ in batch]
+        customer_ids = archive_queries.move_orders_to_archive(db, order_ids, cutoff)
+        db.commit()
+        # Cached customers list the moved orders among their hot ones
+        after_commit(db, lambda: _invalidate(customer_ids, order_ids), also_on_rollback=True)
+        archived += len(batch)
+        batches += 1
+    return archived
+
+def _invalidate(customer_ids, order_ids):
+    get_cache().delete("customer", customer_ids)
+    get_cache().delete("order", order_ids)
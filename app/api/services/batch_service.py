@@ -0,0 +1,168 @@
+"""
+Multi-request batches: several API calls in one round trip and one transaction.
+
+`POST /batch` runs its sub-requests in order through the application's own routers
+(without its middleware), every one on the batch's session, inside a
+`SingleTransaction`. The services' commits then only release savepoints, and the batch
+commits once all of its sub-requests have succeeded, or rolls all of them back at the
+first one that fails.
+
+A sub-request can use the results of earlier ones with references of the form
+`$<index>.<field>`, e.g. `$0.id` for the id of the customer created by the first
+sub-request, or `$2.shipping_addresses.0.address_id`. References are substituted into
+paths anywhere, and into JSON bodies where a string value is exactly one reference,
+which is then replaced by the referenced value with its JSON type.
+"""
+
+import json
+import re
+from contextlib import AsyncExitStack
+from typing import Any, List, Tuple
+from urllib.parse import urlsplit
+from starlette.exceptions import ExceptionMiddleware
+from starlette.types import ASGIApp, Scope
+from ... import schemas
+
+BATCH_PATH = "/batch"
+
+# Redirects followed per sub-request
+MAX_REDIRECTS = 3
+
+REFERENCE = re.compile(r"\$(\d+)((?:\.\w+)*)")
+
+class BatchError(Exception):
+    """A sub-request that cannot be run, such as one with a broken reference."""
+
+def resolve(value: Any, results: List[schemas.BatchResult]) -> Any:
+    """
+    Replace the references to earlier results in a sub-request's body.
+
+    Args:
+        value: The body, or a part of it
+        results: Results of the sub-requests run so far
+
+    Raises:
+        BatchError: If a reference doesn't point into an earlier result
+    """
+    if isinstance(value, str):
+        match = REFERENCE.fullmatch(value)
+        return value if match is None else _lookup(match, results)
+    if isinstance(value, list):
+        return [resolve(item, results) for item in value]
+    if isinstance(value, dict):
+        return {key: resolve(item, results) for key, item in value.items()}
+    return value
+
+def resolve_path(path: str, results: List[schemas.BatchResult]) -> str:
+    """Substitute the references to earlier results in a sub-request's path."""
+    return REFERENCE.sub(lambda match: str(_lookup(match, results)), path)
+
+def _lookup(match, results: List[schemas.BatchResult]) -> Any:
+    index = int(match.group(1))
+    if index >= len(results):
+        raise BatchError(f"{match.group(0)} refers to a sub-request that has not run")
+    value = results[index].body
+    for field in match.group(2).split(".")[1:]:
+        if isinstance(value, dict) and field in value:
+            value = value[field]
+        elif isinstance(value, list) and field.isdigit() and int(field) < len(value):
+            value = value[int(field)]
+        else:
+            raise BatchError(f"{match.group(0)} is not in the result of sub-request {index}")
+    return value
+
+async def dispatch(app, parent: Scope, method: str, path: str, body: Any) -> Tuple[int, Any]:
+    """
+    Run one sub-request through the application's routers.
+
+    The sub-request goes through the routers and exception handlers only, not the
+    middleware, which the batch request itself has already passed. Redirects that keep
+    the method and body (307/308) to another path of this API, such as the one the
+    router sends for a missing trailing slash, are followed.
+
+    Args:
+        app: The FastAPI application
+        parent: ASGI scope of the batch request
+        method: HTTP method
+        path: Path and query string, references already resolved
+        body: JSON body, or None
+
+    Returns:
+        The response's status code and decoded body
+
+    Raises:
+        BatchError: If the path is not an absolute path of this API, or is a batch
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        url = urlsplit(path)
+        if not url.path.startswith("/") or url.scheme or url.netloc:
+            raise BatchError(f"{path!r} is not a path of this API")
+        if url.path.rstrip("/") == BATCH_PATH:
+            raise BatchError("Batches cannot be nested")
+        status, headers, content = await _run(app, parent, method, url, body)
+        location = headers.get(b"location")
+        if status not in (307, 308) or location is None:
+            return status, _decode(content)
+        redirect = urlsplit(location.decode("latin-1"))
+        if redirect.netloc and redirect.netloc != _host(parent):
+            return status, _decode(content)
+        path = redirect.path + (f"?{redirect.query}" if redirect.query else "")
+    raise BatchError(f"Too many redirects for {path!r}")
+
+async def _run(app, parent: Scope, method: str, url, body: Any):
+    """Run a request through the routers; returns its status, headers and body."""
+    content = b"" if body is None else json.dumps(body).encode()
+    headers = [(b"content-length", str(len(content)).encode())]
+    if body is not None:
+        headers.append((b"content-type", b"application/json"))
+    scope = {
+        "type": "http", "http_version": parent.get("http_version", "1.1"), "scheme": parent.get("scheme", "http"),
+        "method": method, "path": url.path, "raw_path": url.path.encode(), "query_string": url.query.encode(),
+        "root_path": parent.get("root_path", ""), "headers": headers,
+        "client": parent.get("client"), "server": parent.get("server"), "app": app,
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": content, "more_body": False}
+
+    response = {"status": 500, "headers": {}, "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = dict(message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    async with AsyncExitStack() as stack:
+        # Generator dependencies (the session) are closed when the sub-request ends
+        scope["fastapi_astack"] = stack
+        await _routers(app)(scope, receive, send)
+    return response["status"], response["headers"], response["body"]
+
+def _host(scope: Scope) -> str:
+    """The host:port a redirect within this API points to, as the router builds it."""
+    server = scope.get("server")
+    if server is None:
+        return ""
+    host, port = server
+    default_port = {"http": 80, "https": 443}[scope.get("scheme", "http")]
+    return host if port == default_port else f"{host}:{port}"
+
+def _routers(app) -> ASGIApp:
+    """The application's routers behind its exception handlers, as its middleware stack builds them."""
+    handlers = {key: handler for key, handler in app.exception_handlers.items() if key not in (500, Exception)}
+    return ExceptionMiddleware(app.router, handlers=handlers, debug=app.debug)
+
+def _decode(content: bytes) -> Any:
+    if not content:
+        return None
+    try:
+        return json.loads(content)
+    except ValueError:
+        return content.decode(errors="replace")
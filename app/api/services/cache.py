@@ -0,0 +1,447 @@
+"""
+Shared read-through cache for customers, orders and analytics responses.
+
+Values are response-shaped plain data (pydantic `.dict()` output), serialized with
+orjson, msgpack or the standard library json (CACHE_SERIALIZER), and stored by one of
+two drivers (CACHE_BACKEND):
+
+- "local": an in-process LRU with per-entry TTL, bounded by CACHE_MAX_ENTRIES;
+- "redis": any Redis-protocol server at CACHE_REDIS_URL, shared by every replica so
+  one replica's miss warms the others. Multi-gets are a single MGET and multi-sets one
+  pipelined round trip.
+
+Keys are namespaced and versioned, `radiant:<namespace>:v<version>:<key>`; bumping a
+namespace's version in NAMESPACES retires every entry of the old shape at deploy time.
+
+Loads are protected against stampedes twice: threads of one worker missing the same key
+wait on a striped lock for the first one's result, and across replicas the first loader
+takes a short `SET NX` lock key that the others poll for the value before giving up and
+loading themselves. Cache failures are logged and treated as misses, so an unreachable
+Redis slows requests down but never fails them.
+
+Deleting a key also leaves a short-lived tombstone next to it, a token unique to that
+delete. Loaders read the tombstone along with the key and store their result only if
+it is still the same, atomically, so a load that started before a write committed (a
+"not found" for a customer being created, say) cannot cache its stale result after the
+write's invalidation.
+"""
+
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+from ... import config
+from ...database import in_single_transaction
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "radiant"
+
+# Cached namespaces and the version of the value shape stored in each
+NAMESPACES = {"customer": 2, "customer_exists": 1, "order": 2, "analytics": 1}
+
+_LOCK_STRIPES = 64
+_LOCK_POLL_INTERVAL = 0.02
+# Seconds a tombstone outlives its delete; longer than any load still in flight
+_TOMBSTONE_TTL = 60.0
+
+def _encode_default(value):
+    """Encode the non-JSON types found in response data."""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+class JsonSerializer:
+    name = "json"
+
+    def dumps(self, value) -> bytes:
+        return json.dumps(value, default=_encode_default, separators=(",", ":")).encode()
+
+    def loads(self, data: bytes):
+        return json.loads(data)
+
+class OrjsonSerializer:
+    name = "orjson"
+
+    def dumps(self, value) -> bytes:
+        return orjson.dumps(value, default=_encode_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data: bytes):
+        return orjson.loads(data)
+
+class MsgpackSerializer:
+    name = "msgpack"
+
+    def dumps(self, value) -> bytes:
+        return msgpack.packb(value, default=_encode_default, use_bin_type=True)
+
+    def loads(self, data: bytes):
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+def get_serializer(name: str):
+    """Return the serializer for CACHE_SERIALIZER; "auto" prefers orjson when installed."""
+    if name == "auto":
+        name = "orjson" if orjson is not None else "json"
+    if name == "orjson":
+        if orjson is None:
+            raise RuntimeError("CACHE_SERIALIZER=orjson requires orjson")
+        return OrjsonSerializer()
+    if name == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("CACHE_SERIALIZER=msgpack requires msgpack")
+        return MsgpackSerializer()
+    if name == "json":
+        return JsonSerializer()
+    raise ValueError(f"Unknown CACHE_SERIALIZER: {name!r}")
+
+class LocalDriver:
+    """In-process LRU of serialized values with per-entry expiry."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] <= now:
+                    del self._entries[key]
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                values.append(None if entry is None else entry[1])
+        return values
+
+    def set_many(self, values: Dict[str, bytes], ttl: float):
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return False
+            self._entries[key] = (now + ttl, value)
+            return True
+
+    def set_many_if(self, values: Dict[str, bytes], ttl: float, guards: Dict[str, Tuple[str, Optional[bytes]]]):
+        """Set each key whose guard key (from `guards`) still holds the expected value."""
+        now = time.monotonic()
+        with self._lock:
+            for key, value in values.items():
+                guard_key, expected = guards[key]
+                guard = self._entries.get(guard_key)
+                if (None if guard is None or guard[0] <= now else guard[1]) == expected:
+                    self._entries[key] = (now + ttl, value)
+                    self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys: List[str]):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+class RedisDriver:
+    """Driver for Redis-protocol servers (Redis, Valkey, KeyDB, fakeredis)."""
+
+    def __init__(self, url: Optional[str] = None, client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("CACHE_BACKEND=redis requires redis") from None
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return self.client.mget(keys) if keys else []
+
+    def set_many(self, values: Dict[str, bytes], ttl: float):
+        pipeline = self.client.pipeline(transaction=False)
+        for key, value in values.items():
+            pipeline.set(key, value, px=int(ttl * 1000))
+        pipeline.execute()
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return bool(self.client.set(key, value, nx=True, px=int(ttl * 1000)))
+
+    def set_many_if(self, values: Dict[str, bytes], ttl: float, guards: Dict[str, Tuple[str, Optional[bytes]]]):
+        from redis.exceptions import WatchError
+        guard_keys = sorted({guard_key for guard_key, _ in guards.values()})
+        with self.client.pipeline() as pipeline:
+            try:
+                pipeline.watch(*guard_keys)
+                current = dict(zip(guard_keys, pipeline.mget(guard_keys)))
+                pipeline.multi()
+                for key, value in values.items():
+                    guard_key, expected = guards[key]
+                    if current[guard_key] == expected:
+                        pipeline.set(key, value, px=int(ttl * 1000))
+                pipeline.execute()
+            except WatchError:
+                # A delete raced the load; leave its keys uncached
+                pass
+
+    def delete_many(self, keys: List[str]):
+        if keys:
+            self.client.delete(*keys)
+
+class Cache:
+    """Namespaced, versioned read-through cache over a driver."""
+
+    def __init__(self, driver, serializer):
+        self.driver = driver
+        self.serializer = serializer
+        self.hits = 0
+        self.misses = 0
+        self._stripes = [threading.RLock() for _ in range(_LOCK_STRIPES)]
+
+    def key(self, namespace: str, key: Hashable) -> str:
+        return f"{KEY_PREFIX}:{namespace}:v{NAMESPACES[namespace]}:{key}"
+
+    def get_many(self, namespace: str, keys: Iterable[Hashable]) -> Dict[Hashable, object]:
+        """Return the cached values of the keys that are present."""
+        keys = list(keys)
+        values = self._call("get", self.driver.get_many, [self.key(namespace, key) for key in keys],
+                            default=[None] * len(keys))
+        found = {key: self.serializer.loads(value) for key, value in zip(keys, values) if value is not None}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, namespace: str, values: Dict[Hashable, object], ttl: float):
+        if values:
+            encoded = {self.key(namespace, key): self.serializer.dumps(value) for key, value in values.items()}
+            self._call("set", self.driver.set_many, encoded, ttl)
+
+    def delete(self, namespace: str, keys: Iterable[Hashable]):
+        """Delete keys, leaving tombstones that keep loads already in flight from caching them."""
+        full_keys = [self.key(namespace, key) for key in keys]
+        if full_keys:
+            token = uuid.uuid4().hex.encode()
+            self._call("delete", self.driver.set_many, {_tombstone(key): token for key in full_keys}, _TOMBSTONE_TTL)
+            self._call("delete", self.driver.delete_many, full_keys)
+
+    def _get_with_tombstones(self, namespace: str, keys: List[Hashable]):
+        """Multi-get keys along with their tombstones: (found values, tombstone per key)."""
+        full_keys = [self.key(namespace, key) for key in keys]
+        values = self._call("get", self.driver.get_many, full_keys + [_tombstone(key) for key in full_keys],
+                            default=[None] * (2 * len(keys)))
+        found = {key: self.serializer.loads(value) for key, value in zip(keys, values) if value is not None}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found, dict(zip(keys, values[len(keys):]))
+
+    def _set_unless_deleted(self, namespace: str, values: Dict[Hashable, object], ttl: float,
+                            tombstones: Dict[Hashable, Optional[bytes]]):
+        """Store loaded values whose keys were not deleted since their tombstones were read."""
+        if values:
+            encoded, guards = {}, {}
+            for key, value in values.items():
+                full_key = self.key(namespace, key)
+                encoded[full_key] = self.serializer.dumps(value)
+                guards[full_key] = (_tombstone(full_key), tombstones.get(key))
+            self._call("set", self.driver.set_many_if, encoded, ttl, guards)
+
+    def get_or_load(self, namespace: str, key: Hashable, loader: Callable[[], object], ttl: float,
+                    negative_ttl: float = 0):
+        """
+        Return a cached value, loading and caching it on a miss.
+
+        Concurrent misses for the same key load it once. A loader result of None
+        means "not found" and is cached for `negative_ttl` seconds, if any.
+
+        Args:
+            namespace: One of NAMESPACES
+            key: Key within the namespace
+            loader: Called without arguments to produce the value on a miss
+            ttl: Seconds to keep a loaded value
+            negative_ttl: Seconds to remember that the key has no value
+
+        Returns:
+            The cached or loaded value
+        """
+        found = self.get_many(namespace, [key])
+        if key in found:
+            return found[key]
+        full_key = self.key(namespace, key)
+        with self._stripes[hash(full_key) % _LOCK_STRIPES]:
+            found, tombstones = self._get_with_tombstones(namespace, [key])
+            if key in found:
+                return found[key]
+            lock_key = f"{full_key}:lock"
+            locked = self._call("lock", self.driver.add, lock_key, b"1", config.CACHE_LOCK_TIMEOUT, default=True)
+            if not locked:
+                # Another replica is loading it; wait for its result
+                deadline = time.monotonic() + config.CACHE_LOCK_TIMEOUT
+                while time.monotonic() < deadline:
+                    time.sleep(_LOCK_POLL_INTERVAL)
+                    value = self._call("get", self.driver.get_many, [full_key], default=[None])[0]
+                    if value is not None:
+                        self.hits += 1
+                        return self.serializer.loads(value)
+            try:
+                value = loader()
+                if value is not None:
+                    self._set_unless_deleted(namespace, {key: value}, ttl, tombstones)
+                elif negative_ttl > 0:
+                    self._set_unless_deleted(namespace, {key: None}, negative_ttl, tombstones)
+            finally:
+                if locked:
+                    self._call("unlock", self.driver.delete_many, [lock_key])
+            return value
+
+    def get_many_or_load(self, namespace: str, keys: Iterable[Hashable],
+                         loader: Callable[[List[Hashable]], Dict[Hashable, object]], ttl: float):
+        """
+        Return the values of several keys with one multi-get, loading all misses at once.
+
+        Args:
+            namespace: One of NAMESPACES
+            keys: Keys within the namespace
+            loader: Called with the missing keys; returns a dict of the values it found
+            ttl: Seconds to keep loaded values
+
+        Returns:
+            Dict of key to value for every key that exists
+        """
+        keys = list(keys)
+        found, tombstones = self._get_with_tombstones(namespace, keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            loaded = loader(missing)
+            self._set_unless_deleted(namespace, loaded, ttl, tombstones)
+            found.update(loaded)
+        return found
+
+    @staticmethod
+    def _call(operation: str, function, *args, default=None):
+        try:
+            return function(*args)
+        except Exception:
+            logger.exception("Cache %s failed; treating as a miss", operation)
+            return default
+
+class NullDriver:
+    """Driver for CACHE_BACKEND=none: stores nothing."""
+
+    def get_many(self, keys):
+        return [None] * len(keys)
+
+    def set_many(self, values, ttl):
+        pass
+
+    def add(self, key, value, ttl):
+        return True
+
+    def set_many_if(self, values, ttl, guards):
+        pass
+
+    def delete_many(self, keys):
+        pass
+
+def _tombstone(full_key: str) -> str:
+    return f"{full_key}:deleted"
+
+_cache: Optional[Cache] = None
+_cache_lock = threading.Lock()
+
+# Stand-in for the cache while a session's writes are uncommitted
+_uncached = Cache(NullDriver(), JsonSerializer())
+
+def get_cache(db=None) -> Cache:
+    """
+    Return the process-wide cache, built from the CACHE_* settings on first use.
+
+    Args:
+        db: Session the values are read with, when reading through the cache. In a
+            single transaction (a batch) the cache is bypassed: reads see the
+            transaction's own writes, and uncommitted rows are never cached.
+    """
+    global _cache
+    if db is not None and in_single_transaction(db):
+        return _uncached
+    with _cache_lock:
+        if _cache is None:
+            if config.CACHE_BACKEND == "redis":
+                driver = RedisDriver(config.CACHE_REDIS_URL)
+            elif config.CACHE_BACKEND == "local":
+                driver = LocalDriver(config.CACHE_MAX_ENTRIES)
+            elif config.CACHE_BACKEND == "none":
+                driver = NullDriver()
+            else:
+                raise ValueError(f"Unknown CACHE_BACKEND: {config.CACHE_BACKEND!r}")
+            _cache = Cache(driver, get_serializer(config.CACHE_SERIALIZER))
+        return _cache
+
+def reset_cache():
+    """Drop the process-wide cache so the next use rebuilds it from the settings."""
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+def cached_response(namespace: str, schema, ttl_setting: str):
+    """
+    Cache a service function returning a `schema` model or a list of them, keyed by its arguments.
+
+    The `db` argument is not part of the key. A TTL setting of 0 disables caching.
+
+    Args:
+        namespace: One of NAMESPACES
+        schema: Pydantic model of the result or of its items
+        ttl_setting: Name of the config setting holding the TTL in seconds
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        def load(db, *args, **kwargs):
+            result = function(db, *args, **kwargs)
+            return [row.dict() for row in result] if isinstance(result, list) else result.dict()
+
+        @functools.wraps(function)
+        def wrapper(db, *args, **kwargs):
+            ttl = getattr(config, ttl_setting)
+            if ttl <= 0:
+                return function(db, *args, **kwargs)
+            bound = signature.bind(db, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = ",".join(
+                f"{name}={value.isoformat() if isinstance(value, datetime) else value}"
+                for name, value in bound.arguments.items() if name != "db"
+            )
+            value = get_cache(db).get_or_load(
+                namespace, f"{function.__name__}:{arguments}", lambda: load(db, *args, **kwargs), ttl
+            )
+            return [schema.parse_obj(row) for row in value] if isinstance(value, list) else schema.parse_obj(value)
+        return wrapper
+    return decorator
@@ -0,0 +1,211 @@
+"""
+Cross-worker cache invalidation over Postgres LISTEN/NOTIFY.
+
+Customer, address and order writes queue a compact NOTIFY payload in their transaction
+(see notification_queries), which Postgres delivers to every listening connection on
+commit. Orders too large for a NOTIFY payload are announced by id only and loaded by
+the listener with one query per burst. Each worker runs one ChangeListener thread
+holding a dedicated autocommit connection. It collects notifications for
+CHANGE_COALESCE_INTERVAL seconds after the first one arrives, drops duplicates and the
+worker's own writes (already applied by its write path), and applies the burst to the
+in-process caches in one go:
+
+- orders are appended to the columnar snapshot, counted by the in-store leaderboard
+  and published to this worker's analytics streams;
+- the customers they touch are dropped from the leaderboard details cache and from the
+  response cache, and cached "not found" answers for new ids are forgotten (a no-op
+  for a shared Redis cache, where the writer already did it).
+
+Notifications sent while a listener is disconnected are lost, so after reconnecting it
+resets the leaderboard, which then re-seeds from SQL; the columnar snapshot catches up
+through its regular polling.
+"""
+
+import json
+import logging
+import select
+import socket
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from ... import config
+from ..queries import notification_queries
+from ..queries.notification_queries import CHANGE_CHANNEL, WORKER_ID
+from . import columnar_analytics, event_bus, leaderboard
+from .cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+def apply_changes(changes: List[dict]):
+    """
+    Apply a burst of change notifications to this worker's caches.
+
+    Args:
+        changes: Decoded notification payloads, oldest first
+    """
+    unique = OrderedDict()
+    for change in changes:
+        if change.get("worker") != WORKER_ID:
+            unique[(change["kind"], change["id"])] = change
+    orders = [change for (kind, _), change in unique.items() if kind == "order"]
+    new_customer_ids = [change["id"] for (kind, _), change in unique.items() if kind == "customer"]
+    customer_ids = set(new_customer_ids)
+    customer_ids.update(change["customer_id"] for (kind, _), change in unique.items() if kind != "customer")
+
+    if orders:
+        for order in orders:
+            order["order_date"] = datetime.fromisoformat(order["order_date"])
+            order["total_amount"] = Decimal(order["total_amount"])
+        columnar_analytics.record_changes(orders)
+        leaderboard.record_changes(orders)
+        event_bus.publish_changes(orders)
+        # New ids may have been cached as not found
+        get_cache().delete("order", [order["id"] for order in orders])
+    if new_customer_ids:
+        get_cache().delete("customer_exists", new_customer_ids)
+    if customer_ids:
+        leaderboard.forget_customers(customer_ids)
+        get_cache().delete("customer", customer_ids)
+
+class ChangeListener:
+    """LISTENs for change notifications on a dedicated connection."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self._connection = None
+        self._stopping = threading.Event()
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._thread: Optional[threading.Thread] = None
+
+    def connect(self):
+        """Open the listening connection, outside the engine's pool."""
+        pooled = self.engine.raw_connection()
+        pooled.detach()
+        connection = pooled.connection
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {CHANGE_CHANNEL}")
+        self._connection = connection
+
+    def close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            finally:
+                self._connection = None
+
+    def poll(self, timeout: float) -> List[dict]:
+        """
+        Wait up to `timeout` seconds for notifications and return a coalesced burst.
+
+        Once the first notification arrives, keeps collecting for
+        CHANGE_COALESCE_INTERVAL seconds so a burst of writes is applied at once.
+
+        Returns:
+            Decoded payloads, oldest first, with orders announced by id only
+            loaded from the database; empty on timeout or stop
+        """
+        if not self._wait(timeout):
+            return []
+        deadline = time.monotonic() + config.CHANGE_COALESCE_INTERVAL
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._wait(remaining):
+                break
+        notifies = list(self._connection.notifies)
+        del self._connection.notifies[:]
+        changes = []
+        for notify in notifies:
+            try:
+                changes.append(json.loads(notify.payload))
+            except ValueError:
+                logger.warning("Ignoring malformed change notification %r", notify.payload)
+        return self._resolve(changes)
+
+    def _resolve(self, changes: List[dict]) -> List[dict]:
+        """Replace id-only order notifications by the orders as loaded from the database."""
+        order_ids = [change["id"] for change in changes
+                     if change.get("resolve") and change.get("worker") != WORKER_ID]
+        if not order_ids:
+            return changes
+        with Session(self.engine) as db:
+            loaded = {change["id"]: change for change in notification_queries.get_order_changes(db, order_ids)}
+        resolved = []
+        for change in changes:
+            if change.get("resolve") and change.get("worker") != WORKER_ID:
+                if change["id"] not in loaded:
+                    # Archived or deleted since; nothing left to apply
+                    continue
+                change = {**loaded[change["id"]], "worker": change["worker"]}
+            resolved.append(change)
+        return resolved
+
+    def _wait(self, timeout: float) -> bool:
+        """Wait for the connection to be readable; False on timeout or stop."""
+        if self._stopping.is_set():
+            return False
+        readable, _, _ = select.select([self._connection, self._wake_reader], [], [], timeout)
+        if self._connection in readable:
+            self._connection.poll()
+            return True
+        return False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="change-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake_writer.send(b"\0")
+        if self._thread is not None:
+            self._thread.join()
+        self.close()
+        self._wake_reader.close()
+        self._wake_writer.close()
+
+    def _run(self):
+        connected_before = False
+        while not self._stopping.is_set():
+            try:
+                self.connect()
+                if connected_before:
+                    # Notifications were missed while disconnected
+                    leaderboard.reset_leaderboard()
+                connected_before = True
+                while not self._stopping.is_set():
+                    changes = self.poll(timeout=60)
+                    if changes:
+                        self._apply(changes)
+            except Exception:
+                logger.exception("Change listener failed; reconnecting")
+                self.close()
+                self._stopping.wait(config.CHANGE_LISTENER_RETRY_INTERVAL)
+
+    @staticmethod
+    def _apply(changes: List[dict]):
+        try:
+            apply_changes(changes)
+        except Exception:
+            # A bad payload must not take the listener down; the caches' own
+            # reconciliation repairs whatever was skipped
+            logger.exception("Failed to apply %d change notifications", len(changes))
+
+_listener: Optional[ChangeListener] = None
+
+def start_listener(engine: Engine):
+    """Start this worker's change listener thread."""
+    global _listener
+    if _listener is None:
+        _listener = ChangeListener(engine)
+        _listener.start()
+
+def stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
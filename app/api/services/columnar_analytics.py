@@ -0,0 +1,285 @@
+"""
+In-process columnar analytics backend.
+
+Keeps an append-only NumPy snapshot of every order (hot and archived) and answers the
+analytics group-bys with vectorized bincount/argpartition instead of SQL. Enabled with
+ANALYTICS_BACKEND=columnar; requires numpy.
+
+New orders reach the snapshot two ways: the local write path appends them directly,
+and orders written by other workers are picked up by polling `id > watermark`. Ids are
+allocated before commit, so a poll re-reads a window of COLUMNAR_POLL_OVERLAP ids below
+the high-water mark and skips ids it already holds.
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from ... import config, models
+from ..queries.analytics_queries import as_naive_utc
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+_ORDER_COLUMNS = """
+    o.id, o.order_date, o.customer_id, o.order_type, o.status, o.total_amount,
+    o.order_hour, o.order_dow, a.zip_code
+"""
+_SHIPPING_COLUMNS = "s.order_id, s.order_date, a.zip_code"
+
+class _Column:
+    """A growable NumPy array with amortized O(1) appends."""
+
+    def __init__(self, dtype, capacity: int = 1024):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype)
+        needed = self.size + len(values)
+        if needed > len(self.data):
+            grown = np.empty(max(needed, len(self.data) * 2), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:needed] = values
+        self.size = needed
+
+    def view(self):
+        return self.data[:self.size]
+
+class _Dictionary:
+    """Dictionary encoding of a string column into dense integer codes."""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+def _to_micros(value: datetime) -> int:
+    """Microseconds since the epoch of a naive-UTC datetime."""
+    return int((value - datetime(1970, 1, 1)).total_seconds() * 1_000_000)
+
+class OrderSnapshot:
+    """Columnar in-memory copy of all orders for analytics."""
+
+    def __init__(self):
+        if np is None:
+            raise RuntimeError("ANALYTICS_BACKEND=columnar requires numpy")
+        self._lock = threading.Lock()
+        self.order_date = _Column(np.int64)      # microseconds since epoch, naive UTC
+        self.customer_id = _Column(np.int64)
+        self.order_type = _Column(np.int8)       # code in self.order_types
+        self.status = _Column(np.int16)          # code in self.statuses
+        self.total_amount = _Column(np.float64)
+        self.order_hour = _Column(np.int8)
+        self.order_dow = _Column(np.int8)
+        self.billing_zip = _Column(np.int32)     # code in self.zip_codes
+        self.shipping_date = _Column(np.int64)   # one row per order shipping address
+        self.shipping_zip = _Column(np.int32)
+        self.order_types = _Dictionary()
+        self.statuses = _Dictionary()
+        self.zip_codes = _Dictionary()
+        self.high_water_id = 0
+        self._recent_ids = set()
+        self.refreshed_at = 0.0
+
+    # Loading and appending
+
+    def load(self, db: Session):
+        """
+        Load every hot and archived order.
+
+        Both tables are read in one REPEATABLE READ transaction, so an archival run
+        moving orders between them meanwhile can't drop or double count any.
+        """
+        info = {key: value for key, value in db.info.items() if key == "statement_timeout_ms"}
+        session = Session(bind=db.get_bind().execution_options(isolation_level="REPEATABLE READ"), info=info)
+        try:
+            for table, shipping in (("orders_archive", "order_shipping_addresses_archive"),
+                                    ("orders", "order_shipping_addresses")):
+                self._append_from(session, table, shipping, floor=0)
+        finally:
+            session.close()
+        self.refreshed_at = time.monotonic()
+
+    def poll(self, db: Session):
+        """Append orders committed by other workers since the last poll."""
+        floor = max(self.high_water_id - config.COLUMNAR_POLL_OVERLAP, 0)
+        self._append_from(db, "orders", "order_shipping_addresses", floor)
+        self.refreshed_at = time.monotonic()
+
+    def _append_from(self, db: Session, table: str, shipping: str, floor: int):
+        orders = db.execute(text(f"""
+            SELECT {_ORDER_COLUMNS} FROM {table} o
+            JOIN addresses a ON a.id = o.billing_address_id
+            WHERE o.id > :floor
+        """).execution_options(stream_results=True), {"floor": floor})
+        added = set()
+        dates = []
+        for chunk in orders.partitions(50_000):
+            new = self._append_orders(chunk)
+            added |= new
+            dates += [row[1] for row in chunk if row[0] in new]
+        if not added:
+            return
+        if floor == 0:
+            where, params = "TRUE", {}
+        else:
+            # Only the new orders' addresses: by id, within their dates so the
+            # partitions of other dates are pruned
+            where = "s.order_id = ANY(:ids) AND s.order_date BETWEEN :first AND :last"
+            params = {"ids": sorted(added), "first": min(dates), "last": max(dates)}
+        shipping_rows = db.execute(text(f"""
+            SELECT {_SHIPPING_COLUMNS} FROM {shipping} s
+            JOIN addresses a ON a.id = s.address_id
+            WHERE {where}
+        """).execution_options(stream_results=True), params)
+        for chunk in shipping_rows.partitions(50_000):
+            self._append_shipping([row for row in chunk if row[0] in added])
+
+    def append_order(self, order: models.Order):
+        """Append an order created by this worker's write path."""
+        added = self._append_orders([(
+            order.id, order.order_date, order.customer_id, order.order_type, order.status,
+            order.total_amount, order.order_hour, order.order_dow, order.billing_address.zip_code
+        )])
+        if not added:
+            return
+        self._append_shipping([
+            (order.id, order.order_date, shipping.address.zip_code)
+            for shipping in order.shipping_addresses
+        ])
+
+    def append_changes(self, orders: List[dict]):
+        """Append orders announced by other workers' change notifications."""
+        added = self._append_orders([(
+            order["id"], order["order_date"], order["customer_id"], order["order_type"], order["status"],
+            order["total_amount"], order["hour"], order["dow"], order["billing_zip"]
+        ) for order in orders])
+        self._append_shipping([
+            (order["id"], order["order_date"], zip_code)
+            for order in orders if order["id"] in added
+            for zip_code in order["shipping_zips"]
+        ])
+
+    def _append_orders(self, rows) -> set:
+        """Append order rows not already in the snapshot and return their ids."""
+        with self._lock:
+            rows = [row for row in rows if row[0] not in self._recent_ids]
+            if not rows:
+                return set()
+            ids = [row[0] for row in rows]
+            self.order_date.extend([_to_micros(row[1]) for row in rows])
+            self.customer_id.extend([row[2] for row in rows])
+            self.order_type.extend([self.order_types.encode(row[3]) for row in rows])
+            self.status.extend([self.statuses.encode(row[4]) for row in rows])
+            self.total_amount.extend([float(row[5]) for row in rows])
+            self.order_hour.extend([row[6] for row in rows])
+            self.order_dow.extend([row[7] for row in rows])
+            self.billing_zip.extend([self.zip_codes.encode(row[8]) for row in rows])
+            self.high_water_id = max(self.high_water_id, max(ids))
+            self._recent_ids.update(ids)
+            # Only ids inside the poll overlap window can be seen twice
+            floor = self.high_water_id - config.COLUMNAR_POLL_OVERLAP
+            if len(self._recent_ids) > 2 * config.COLUMNAR_POLL_OVERLAP:
+                self._recent_ids = {order_id for order_id in self._recent_ids if order_id > floor}
+            return set(ids)
+
+    def _append_shipping(self, rows):
+        if not rows:
+            return
+        with self._lock:
+            self.shipping_date.extend([_to_micros(row[1]) for row in rows])
+            self.shipping_zip.extend([self.zip_codes.encode(row[2]) for row in rows])
+
+    # Queries
+
+    def _window(self, dates, start_date: Optional[datetime], end_date: Optional[datetime]):
+        mask = np.ones(len(dates), dtype=bool)
+        if start_date is not None:
+            mask &= dates >= _to_micros(as_naive_utc(start_date))
+        if end_date is not None:
+            mask &= dates < _to_micros(as_naive_utc(end_date))
+        return mask
+
+    def zip_counts(self, address_type: str = "billing", start_date: Optional[datetime] = None,
+                   end_date: Optional[datetime] = None) -> List[Tuple[str, int]]:
+        with self._lock:
+            if address_type == "billing":
+                dates, zips = self.order_date.view(), self.billing_zip.view()
+            else:
+                dates, zips = self.shipping_date.view(), self.shipping_zip.view()
+            zip_codes = list(self.zip_codes.values)
+        counts = np.bincount(zips[self._window(dates, start_date, end_date)], minlength=len(zip_codes))
+        return [(zip_codes[code], int(counts[code])) for code in np.flatnonzero(counts)]
+
+    def _bucket_counts(self, column: _Column, size: int, start_date: Optional[datetime],
+                       end_date: Optional[datetime]) -> List[Tuple[int, int]]:
+        with self._lock:
+            dates, buckets = self.order_date.view(), column.view()
+        counts = np.bincount(buckets[self._window(dates, start_date, end_date)], minlength=size)
+        return [(bucket, int(count)) for bucket, count in enumerate(counts) if count]
+
+    def hour_counts(self, start_date: Optional[datetime] = None,
+                    end_date: Optional[datetime] = None) -> List[Tuple[int, int]]:
+        return self._bucket_counts(self.order_hour, 24, start_date, end_date)
+
+    def day_of_week_counts(self, start_date: Optional[datetime] = None,
+                           end_date: Optional[datetime] = None) -> List[Tuple[int, int]]:
+        return self._bucket_counts(self.order_dow, 7, start_date, end_date)
+
+    def top_in_store_customers(self, limit: int = 5) -> List[Tuple[int, int]]:
+        """Return the top (customer_id, in-store order count) pairs, highest first."""
+        with self._lock:
+            in_store = self.order_types.codes.get("in_store")
+            customers = self.customer_id.view()[self.order_type.view() == in_store]
+        if in_store is None or not len(customers) or limit <= 0:
+            return []
+        counts = np.bincount(customers)
+        limit = min(limit, int(np.count_nonzero(counts)))
+        top = np.argpartition(-counts, limit - 1)[:limit]
+        top = top[np.lexsort((top, -counts[top]))]
+        return [(int(customer_id), int(counts[customer_id])) for customer_id in top]
+
+_snapshot: Optional[OrderSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+def get_snapshot(db: Session) -> OrderSnapshot:
+    """Return the process-wide snapshot, loading it on first use and polling for
+    other workers' orders at most every COLUMNAR_POLL_INTERVAL seconds."""
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None:
+            snapshot = OrderSnapshot()
+            snapshot.load(db)
+            _snapshot = snapshot
+        elif time.monotonic() - _snapshot.refreshed_at >= config.COLUMNAR_POLL_INTERVAL:
+            _snapshot.poll(db)
+        return _snapshot
+
+def record_order(order: models.Order):
+    """Write-path hook: append a committed order if the snapshot is loaded."""
+    if _snapshot is not None:
+        _snapshot.append_order(order)
+
+def record_changes(orders: List[dict]):
+    """Change-notification hook: append other workers' orders if the snapshot is loaded."""
+    snapshot = _snapshot
+    if snapshot is not None:
+        snapshot.append_changes(orders)
+
+def reset_snapshot():
+    """Drop the snapshot so the next analytics call reloads it."""
+    global _snapshot
+    with _snapshot_lock:
+        _snapshot = None
@@ -0,0 +1,114 @@
+"""
+HTTP conditional requests: ETag / If-None-Match and Last-Modified / If-Modified-Since.
+
+Routes compute a validator before doing the expensive part of a request: entity reads
+from the row version of the customer or order (peeked from the cache when it's there,
+otherwise one primary-key lookup), analytics from the change counters of the tables
+they aggregate. If the client's copy is current, `check` raises NotModified, which the
+application answers with an empty 304; otherwise the validators are set on the 200
+response.
+
+ETags are weak (W/"..."), since the same representation may be sent compressed or not.
+Analytics ETags also change with time wherever a result can differ without a write:
+every CACHE_ANALYTICS_TTL seconds (cached results lag their tables by up to that),
+every COLUMNAR_POLL_INTERVAL with the columnar backend (whose snapshot lags by up to a
+poll), and at UTC midnight for leaderboard windows, which slide with the date. A
+response computed from stale data is thus never confirmed for longer than its lag.
+"""
+
+import hashlib
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, Optional
+from fastapi import Depends, Request, Response
+from sqlalchemy.orm import Session
+from ... import config
+from ...database import get_db
+from ..queries import version_queries
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+class NotModified(Exception):
+    """The client's cached copy of the response is current."""
+
+    def __init__(self, headers: Dict[str, str]):
+        super().__init__("Not Modified")
+        self.headers = headers
+
+def make_etag(*parts) -> str:
+    """Build a weak ETag from the values identifying a representation."""
+    return 'W/"' + hashlib.sha1(":".join(map(str, parts)).encode()).hexdigest()[:24] + '"'
+
+def check(request: Request, response: Response, etag: str, last_modified: Optional[datetime] = None):
+    """
+    Answer a conditional GET.
+
+    Args:
+        request: The request, with its If-None-Match / If-Modified-Since headers
+        response: The route's response, which gets the validators
+        etag: Current ETag of the requested representation
+        last_modified: When it last changed (naive UTC), if known
+
+    Raises:
+        NotModified: If the client's copy is current
+    """
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+    if _is_current(request, etag, last_modified):
+        raise NotModified(headers)
+    response.headers.update(headers)
+
+def _is_current(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison; If-Modified-Since is ignored when If-None-Match is sent
+        tags = {_opaque_tag(tag.strip()) for tag in if_none_match.split(",")}
+        return "*" in tags or _opaque_tag(etag) in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+
+def _opaque_tag(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+def table_etag(*tables: str):
+    """
+    Route dependency validating a response by the versions of the tables it reads.
+
+    The ETag covers the request path and query string, so every distinct analytics
+    request has its own.
+
+    Args:
+        *tables: Names of the tables the response is computed from
+    """
+    def validate(request: Request, response: Response, db: Session = Depends(get_db)):
+        version, changed_at = version_queries.get_table_versions(db, tables)
+        now = time.time()
+        buckets = []
+        for seconds in _bucket_lengths(request):
+            bucket = int(now // seconds)
+            buckets.append(bucket)
+            bucket_start = datetime.utcfromtimestamp(bucket * seconds)
+            changed_at = bucket_start if changed_at is None else max(changed_at, bucket_start)
+        check(request, response, make_etag(request.url.path, str(request.query_params), version, *buckets), changed_at)
+    return validate
+
+def _bucket_lengths(request: Request) -> List[float]:
+    """Lengths in seconds of the time buckets an analytics ETag must roll over with."""
+    lengths = []
+    if config.CACHE_ANALYTICS_TTL > 0:
+        lengths.append(config.CACHE_ANALYTICS_TTL)
+    if config.ANALYTICS_BACKEND == "columnar":
+        lengths.append(max(config.COLUMNAR_POLL_INTERVAL, 1))
+    if request.query_params.get("window"):
+        lengths.append(SECONDS_PER_DAY)
+    return lengths
@@ -1,9 +1,54 @@
 from sqlalchemy.orm import Session
-from ... import schemas
-from ..queries import customer_queries
+from datetime import datetime
+from typing import List, Optional, Tuple
+from ... import config, schemas
+from ...database import after_commit
+from ..queries import customer_queries, version_queries
+from .cache import get_cache
+from .dataloader import DataLoader
 
-def get_customer(db: Session, customer_id: int):
-    return customer_queries.get_customer(db, customer_id)
+def get_customer(db: Session, customer_id: int) -> Optional[schemas.Customer]:
+    """Get a customer with their addresses and orders, read through the cache."""
+    def load():
+        customer = customer_queries.get_customer(db, customer_id)
+        return None if customer is None else schemas.Customer.from_orm(customer).dict()
+
+    customer = get_cache(db).get_or_load(
+        "customer", customer_id, load, config.CACHE_ENTITY_TTL, config.CACHE_NEGATIVE_TTL
+    )
+    return None if customer is None else schemas.Customer.parse_obj(customer)
+
+def get_customer_version(db: Session, customer_id: int) -> Optional[Tuple[int, datetime]]:
+    """
+    Get what a customer's ETag and Last-Modified derive from, without loading the customer.
+
+    Returns:
+        The customer's version and last change time, from the cached customer when
+        there is one and otherwise from its row; None if the customer doesn't exist
+    """
+    cached = get_cache(db).get_many("customer", [customer_id])
+    if customer_id in cached:
+        customer = cached[customer_id]
+        if customer is None:
+            return None
+        updated_at = customer.get("updated_at")
+        return customer.get("version", 1), datetime.fromisoformat(updated_at) if updated_at else None
+    row = version_queries.get_customer_version(db, customer_id)
+    return None if row is None else (row.version, row.updated_at)
+
+def customer_exists(db: Session, customer_id: int) -> bool:
+    """
+    Check that a customer exists without loading it.
+
+    Answered from the cache when possible, otherwise by an EXISTS query whose answer is
+    cached; customers are never deleted, so only "not found" answers expire early.
+    """
+    def load():
+        return customer_queries.customer_exists(db, customer_id) or None
+
+    return bool(get_cache(db).get_or_load(
+        "customer_exists", customer_id, load, config.CACHE_ENTITY_TTL, config.CACHE_NEGATIVE_TTL
+    ))
 
 def get_customer_by_email(db: Session, email: str):
     return customer_queries.get_customer_by_email(db, email)
@@ -11,14 +56,62 @@ def get_customer_by_email(db: Session, email: str):
 def get_customer_by_telephone(db: Session, telephone: str):
     return customer_queries.get_customer_by_telephone(db, telephone)
 
-def get_customers(db: Session, skip: int = 0, limit: int = 100):
-    return customer_queries.get_customers(db, skip, limit)
+def customer_loader(db: Session) -> DataLoader:
+    """Return a loader of customers by id: one cache multi-get, then one query for the misses."""
+    def load(customer_ids):
+        def load_from_db(missing):
+            return {
+                customer.id: schemas.Customer.from_orm(customer).dict()
+                for customer in customer_queries.get_customers_by_ids(db, missing)
+            }
+
+        customers = get_cache(db).get_many_or_load("customer", customer_ids, load_from_db, config.CACHE_ENTITY_TTL)
+        return {
+            customer_id: schemas.Customer.parse_obj(customer)
+            for customer_id, customer in customers.items() if customer is not None
+        }
+
+    return DataLoader(load)
+
+def get_customers(db: Session, skip: int = 0, limit: int = 100, sort_by: str = "id") -> List[schemas.Customer]:
+    """Get a page of customers: ids from SQL, customers from one cache multi-get."""
+    customer_ids = customer_queries.get_customer_ids(db, skip, limit, sort_by)
+    return [customer for customer in customer_loader(db).load_many(customer_ids) if customer is not None]
+
+def get_customers_by_ids(db: Session, customer_ids: List[int]) -> Tuple[List[schemas.Customer], List[int]]:
+    """
+    Get several customers by id in one batch.
+
+    Args:
+        db: Database session
+        customer_ids: Ids to fetch; repeated ids are returned once
+
+    Returns:
+        The customers found, in the order asked for, and the ids that don't exist
+    """
+    customer_ids = list(dict.fromkeys(customer_ids))
+    customers = customer_loader(db).load_many(customer_ids)
+    return (
+        [customer for customer in customers if customer is not None],
+        [customer_id for customer_id, customer in zip(customer_ids, customers) if customer is None]
+    )
 
 def create_customer(db: Session, customer: schemas.CustomerCreate):
-    return customer_queries.create_customer(db, customer)
+    db_customer = customer_queries.create_customer(db, customer)
+    # Forget any cached "not found" for the new id
+    customer_id = db_customer.id
+
+    def invalidate():
+        get_cache().delete("customer", [customer_id])
+        get_cache().delete("customer_exists", [customer_id])
+    after_commit(db, invalidate, also_on_rollback=True)
+    return db_customer
 
 def create_customer_address(db: Session, address: schemas.AddressCreate, customer_id: int, is_billing: bool = False):
-    return customer_queries.create_customer_address(db, address, customer_id, is_billing)
+    db_address = customer_queries.create_customer_address(db, address, customer_id, is_billing)
+    # The cached customer lists its addresses
+    after_commit(db, lambda: get_cache().delete("customer", [customer_id]), also_on_rollback=True)
+    return db_address
 
 def get_customer_addresses(db: Session, customer_id: int):
     return customer_queries.get_customer_addresses(db, customer_id)
@@ -0,0 +1,56 @@
+"""
+DataLoader-style batching of entity loads by key.
+
+A loader wraps a batch function that loads many keys at once (typically one `IN` query
+with eager-loaded relationships). Callers ask for keys in any order and with
+duplicates; the loader loads each key at most once for its lifetime, in chunks of at
+most `max_batch_size`, and hands results back in the order they were asked for. Create
+one loader per request (or per unit of work), so its memo never serves stale entities.
+"""
+
+from typing import Callable, Dict, Generic, Hashable, Iterable, List, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+class DataLoader(Generic[K, V]):
+    """Batches and memoizes loads of entities by key."""
+
+    def __init__(self, batch_load: Callable[[List[K]], Dict[K, V]], max_batch_size: int = 1000):
+        """
+        Args:
+            batch_load: Called with distinct keys not loaded yet; returns a dict of the
+                values it found (keys that don't exist are left out)
+            max_batch_size: Most keys passed to one batch_load call
+        """
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self._loaded: Dict[K, Optional[V]] = {}
+
+    def load(self, key: K) -> Optional[V]:
+        """Return the value of one key, or None if it doesn't exist."""
+        return self.load_many([key])[0]
+
+    def load_many(self, keys: Iterable[K]) -> List[Optional[V]]:
+        """
+        Return the values of several keys in the order given.
+
+        Returns:
+            One value per key, None for keys that don't exist
+        """
+        keys = list(keys)
+        missing = list(dict.fromkeys(key for key in keys if key not in self._loaded))
+        for start in range(0, len(missing), self.max_batch_size):
+            batch = missing[start:start + self.max_batch_size]
+            found = self.batch_load(batch)
+            for key in batch:
+                self._loaded[key] = found.get(key)
+        return [self._loaded[key] for key in keys]
+
+    def prime(self, key: K, value: V):
+        """Remember a value loaded elsewhere, so it isn't loaded again."""
+        self._loaded.setdefault(key, value)
+
+    def clear(self, key: K):
+        """Forget a key, e.g. after writing it, so the next load reads it again."""
+        self._loaded.pop(key, None)
@@ -0,0 +1,220 @@
+"""
+In-process event bus pushing live analytics deltas to Server-Sent Events subscribers.
+
+`create_order` publishes one small delta per committed order (order counts per hour,
+day of week, zip code and order type, plus the in-store leaderboard when it changed).
+Publishing only adds the delta to a pending batch under a lock, so it is cheap and safe
+from the threadpool that runs sync routes.
+
+Every STREAM_FLUSH_INTERVAL seconds a single flusher task on the event loop takes the
+pending batch, serializes it once and hands the same batch to every subscriber, so the
+cost per order does not grow with the number of subscribers and thousands of streams
+on one worker share one payload per flush.
+
+Each subscriber holds at most STREAM_MAX_PENDING batches. A slow consumer that falls
+further behind has its queued batches merged into one: deltas are additive and the
+leaderboard is last-write-wins, so the merged batch carries the same information and a
+slow stream costs bounded memory without being disconnected. Event ids are batch
+sequence numbers; after reconnecting, a client should re-read the analytics routes and
+apply the deltas on top.
+
+Orders created by other workers arrive through their change notifications (see
+change_notifications) and are published like local ones.
+"""
+
+import asyncio
+import json
+import threading
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Set
+from ... import config, models
+from . import leaderboard
+
+# Delta dimensions counted per order
+DIMENSIONS = ("hour", "day_of_week", "billing_zip", "shipping_zip", "order_type")
+
+class Batch:
+    """Deltas published during one flush interval."""
+
+    def __init__(self, sequence: int = 0):
+        self.sequence = sequence
+        self.orders = 0
+        self.counts: Dict[str, Counter] = {dimension: Counter() for dimension in DIMENSIONS}
+        self.leaderboard: Optional[Dict[str, list]] = None
+        self._payload: Optional[bytes] = None
+
+    def add(self, delta: dict):
+        self.orders += delta.get("orders", 0)
+        for dimension in DIMENSIONS:
+            self.counts[dimension].update(delta.get(dimension, {}))
+        if delta.get("leaderboard") is not None:
+            self.leaderboard = delta["leaderboard"]
+
+    def merge(self, other: "Batch"):
+        """Fold a later batch into this one."""
+        self.sequence = other.sequence
+        self.orders += other.orders
+        for dimension in DIMENSIONS:
+            self.counts[dimension].update(other.counts[dimension])
+        if other.leaderboard is not None:
+            self.leaderboard = other.leaderboard
+        self._payload = None
+
+    def payload(self) -> bytes:
+        """The batch as one SSE `delta` event, serialized once and shared by subscribers."""
+        if self._payload is None:
+            data = {"orders": self.orders}
+            for dimension in DIMENSIONS:
+                data[dimension] = {str(key): count for key, count in self.counts[dimension].items()}
+            if self.leaderboard is not None:
+                data["leaderboard"] = self.leaderboard
+            self._payload = f"id: {self.sequence}\nevent: delta\ndata: {json.dumps(data)}\n\n".encode()
+        return self._payload
+
+class Subscriber:
+    """One stream's bounded queue of batches waiting to be sent."""
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self.queue: Deque[Batch] = deque()
+        self.ready = asyncio.Event()
+        self.coalesced = 0
+
+    def push(self, batch: Batch):
+        self.queue.append(batch)
+        if len(self.queue) > self.max_pending:
+            # Batches are shared between subscribers, so merge into a fresh one
+            merged = Batch()
+            for pending in self.queue:
+                merged.merge(pending)
+            self.queue = deque([merged])
+            self.coalesced += 1
+        self.ready.set()
+
+    def drain(self) -> List[Batch]:
+        self.ready.clear()
+        batches = list(self.queue)
+        self.queue.clear()
+        return batches
+
+class EventBus:
+    """Fan-out of published deltas to subscribers on one event loop."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Optional[Batch] = None
+        self._sequence = 0
+        self._last_leaderboard: Optional[Dict[str, list]] = None
+        self._subscribers: Set[Subscriber] = set()
+        self._flusher: Optional[asyncio.Task] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, delta: dict):
+        """Add a delta to the pending batch; safe to call from any thread."""
+        if not self._subscribers:
+            return
+        with self._lock:
+            if self._pending is None:
+                self._pending = Batch()
+            self._pending.add(delta)
+
+    def subscribe(self) -> Subscriber:
+        """Register a subscriber; must be called on the event loop that serves it."""
+        subscriber = Subscriber(config.STREAM_MAX_PENDING)
+        self._subscribers.add(subscriber)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_forever())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def flush(self) -> Optional[Batch]:
+        """Hand the pending batch to every subscriber. Runs on the event loop."""
+        with self._lock:
+            batch, self._pending = self._pending, None
+        if batch is None:
+            return None
+        if batch.leaderboard is not None and batch.leaderboard == self._last_leaderboard:
+            batch.leaderboard = None
+        elif batch.leaderboard is not None:
+            self._last_leaderboard = batch.leaderboard
+        self._sequence += 1
+        batch.sequence = self._sequence
+        for subscriber in list(self._subscribers):
+            subscriber.push(batch)
+        return batch
+
+    async def _flush_forever(self):
+        while self._subscribers:
+            await asyncio.sleep(config.STREAM_FLUSH_INTERVAL)
+            self.flush()
+
+bus = EventBus()
+
+def publish_order(order: models.Order, billing_address: models.Address,
+                  shipping_addresses: List[models.Address]):
+    """Write-path hook: publish a committed order's analytics delta."""
+    if not bus.subscriber_count:
+        return
+    delta = {
+        "orders": 1,
+        "hour": {order.order_hour: 1},
+        "day_of_week": {order.order_dow: 1},
+        "billing_zip": {billing_address.zip_code: 1},
+        "shipping_zip": Counter(address.zip_code for address in shipping_addresses),
+        "order_type": {order.order_type: 1},
+    }
+    if order.order_type == "in_store":
+        delta["leaderboard"] = leaderboard.current_top(config.STREAM_LEADERBOARD_SIZE)
+    bus.publish(delta)
+
+def publish_changes(orders: List[dict]):
+    """Change-notification hook: publish other workers' orders as one delta."""
+    if not bus.subscriber_count:
+        return
+    delta = {
+        "orders": len(orders),
+        "hour": Counter(order["hour"] for order in orders),
+        "day_of_week": Counter(order["dow"] for order in orders),
+        "billing_zip": Counter(order["billing_zip"] for order in orders),
+        "shipping_zip": Counter(zip_code for order in orders for zip_code in order["shipping_zips"]),
+        "order_type": Counter(order["order_type"] for order in orders),
+    }
+    if any(order["order_type"] == "in_store" for order in orders):
+        delta["leaderboard"] = leaderboard.current_top(config.STREAM_LEADERBOARD_SIZE)
+    bus.publish(delta)
+
+async def stream(is_disconnected):
+    """
+    Yield SSE messages for one subscriber until the client disconnects.
+
+    Args:
+        is_disconnected: Coroutine function telling whether the client has gone away
+
+    Returns:
+        Async iterator of encoded SSE messages
+    """
+    subscriber = bus.subscribe()
+    try:
+        yield f"retry: {config.STREAM_RETRY_MS}\n\n".encode()
+        while True:
+            try:
+                await asyncio.wait_for(subscriber.ready.wait(), timeout=config.STREAM_HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    break
+                yield b": keep-alive\n\n"
+                continue
+            for batch in subscriber.drain():
+                yield batch.payload()
+    finally:
+        bus.unsubscribe(subscriber)
+
+def reset_event_bus():
+    """Replace the bus, dropping subscribers and pending deltas."""
+    global bus
+    bus = EventBus()
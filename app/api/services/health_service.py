@@ -1,17 +1,194 @@
-from sqlalchemy.orm import Session
-from ..queries.health_queries import check_database_connection
-
-class HealthService:
-    def __init__(self, db: Session):
-        self.db = db
-
-    def get_health_status(self) -> dict:
-        """
-        Get the overall health status of the application
-        """
-        db_status = check_database_connection(self.db)
-        
-        return {
-            "status": "healthy" if db_status else "unhealthy",
-            "database": "connected" if db_status else "disconnected"
-        } 
\ No newline at end of file
+"""
+Liveness, readiness and deep health checks.
+
+Probes hit the health endpoints from every node, so none of them may add load or hang
+with the database:
+
+- liveness does no I/O at all;
+- readiness (and the summary at `/health`) only read the result of the last database
+  probe, which a background thread refreshes every HEALTH_PROBE_INTERVAL seconds; a
+  result older than three intervals, e.g. because the probe is stuck, counts as a
+  failure;
+- the deep check queries pool, replication and schema state, is cached for
+  HEALTH_PROBE_INTERVAL and runs in the threadpool.
+
+Health checks use a separate engine of at most two connections with connect, checkout
+and statement timeouts of HEALTH_PROBE_TIMEOUT, so a saturated application pool or a
+hung database can't stall them.
+"""
+
+import logging
+import threading
+import time
+from typing import Optional
+from sqlalchemy import create_engine, text
+from ... import config, database, models
+from ..queries import health_queries
+from .admission import get_admission_controller
+
+logger = logging.getLogger(__name__)
+
+_STALE_INTERVALS = 3
+
+_health_engine = None
+_health_engine_lock = threading.Lock()
+
+def get_health_engine():
+    """Return the engine dedicated to health checks."""
+    global _health_engine
+    with _health_engine_lock:
+        if _health_engine is None:
+            timeout_ms = int(config.HEALTH_PROBE_TIMEOUT * 1000)
+            _health_engine = create_engine(
+                database.SQLALCHEMY_DATABASE_URL,
+                pool_size=1,
+                max_overflow=database.HEALTH_CHECK_CONNECTIONS - 1,
+                pool_timeout=config.HEALTH_PROBE_TIMEOUT,
+                pool_pre_ping=True,
+                connect_args={
+                    "connect_timeout": max(1, int(config.HEALTH_PROBE_TIMEOUT)),
+                    "options": f"-c statement_timeout={timeout_ms} -c lock_timeout={timeout_ms}",
+                }
+            )
+        return _health_engine
+
+class DatabaseProber:
+    """Background thread keeping the latest database probe result."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.healthy = False
+        self.checked_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def probe(self):
+        """Run one probe and record its result."""
+        started = time.monotonic()
+        try:
+            with get_health_engine().connect() as connection:
+                connection.execute(text("SELECT 1"))
+        except Exception as error:
+            self.healthy, self.error = False, f"{type(error).__name__}: {error}".strip()
+            logger.warning("Database probe failed: %s", self.error)
+        else:
+            self.healthy, self.error = True, None
+        self.checked_at = started
+
+    def is_healthy(self) -> bool:
+        """Whether the last probe succeeded and is recent enough to trust."""
+        return (self.healthy and self.checked_at is not None
+                and time.monotonic() - self.checked_at <= _STALE_INTERVALS * self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=config.HEALTH_PROBE_TIMEOUT + 1)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(self.interval)
+
+_prober: Optional[DatabaseProber] = None
+_prober_lock = threading.Lock()
+
+def get_prober() -> DatabaseProber:
+    """Return the worker's prober; it only refreshes in the background once started."""
+    global _prober
+    with _prober_lock:
+        if _prober is None:
+            _prober = DatabaseProber(config.HEALTH_PROBE_INTERVAL)
+        return _prober
+
+def start_prober():
+    """Start probing the database in the background (at application startup)."""
+    get_prober().start()
+
+def stop_prober():
+    """Stop the background probe and forget its results."""
+    global _prober
+    with _prober_lock:
+        prober, _prober = _prober, None
+    if prober is not None:
+        prober.stop()
+
+def get_liveness() -> dict:
+    """The process is up and serving requests; no I/O."""
+    return {"status": "alive"}
+
+def get_readiness() -> dict:
+    """Whether this worker should receive traffic, from the cached probe result."""
+    prober = get_prober()
+    ready = prober.is_healthy()
+    return {
+        "status": "ready" if ready else "unavailable",
+        "database": "connected" if ready else "disconnected",
+        "checked_seconds_ago": None if prober.checked_at is None else round(time.monotonic() - prober.checked_at, 3),
+        "error": prober.error,
+    }
+
+def get_pool_status() -> dict:
+    pool = database.engine.pool
+    return {"size": pool.size(), "checked_out": pool.checkedout(), "overflow": max(pool.overflow(), 0)}
+
+def get_health_status() -> dict:
+    """
+    Get the overall health status of the application, from the cached probe result
+    """
+    ready = get_prober().is_healthy()
+    return {
+        "status": "healthy" if ready else "unhealthy",
+        "database": "connected" if ready else "disconnected",
+        "pool": get_pool_status(),
+        "admission": get_admission_controller().snapshot()
+    }
+
+_deep_status: Optional[dict] = None
+_deep_checked_at = 0.0
+_deep_lock = threading.Lock()
+
+def get_deep_status() -> dict:
+    """
+    Check the database in depth: connectivity, pool, admission, replication and schema.
+
+    Concurrent calls share one check, and the result is reused for
+    HEALTH_PROBE_INTERVAL seconds.
+
+    Returns:
+        The deep health report; "status" is "healthy" only if the database answered
+        and no model table or column is missing
+    """
+    global _deep_status, _deep_checked_at
+    with _deep_lock:
+        if _deep_status is not None and time.monotonic() - _deep_checked_at < config.HEALTH_PROBE_INTERVAL:
+            return _deep_status
+        report = {"pool": get_pool_status(), "admission": get_admission_controller().snapshot()}
+        started = time.monotonic()
+        try:
+            with get_health_engine().connect() as connection:
+                replication = health_queries.get_replication_status(connection)
+                missing = health_queries.get_missing_schema(connection, models.Base.metadata)
+        except Exception as error:
+            report.update(status="unhealthy", database="disconnected", error=f"{type(error).__name__}: {error}".strip())
+        else:
+            report.update(
+                status="healthy" if not missing else "unhealthy",
+                database="connected",
+                latency_ms=round((time.monotonic() - started) * 1000, 2),
+                replication=replication,
+                schema={"up_to_date": not missing, "missing": missing},
+            )
+        _deep_status, _deep_checked_at = report, time.monotonic()
+        return report
+
+def reset_deep_status():
+    """Forget the cached deep check."""
+    global _deep_status
+    with _deep_lock:
+        _deep_status = None
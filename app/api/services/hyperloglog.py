@@ -0,0 +1,115 @@
+"""
+HyperLogLog sketches for approximate distinct counts.
+
+Values are hashed to 64 bits; the top PRECISION bits pick one of 2^PRECISION registers
+and each register keeps the highest "rank" (position of the first 1 bit in the rest of
+the hash) seen. Sketches merge by taking the maximum rank per register.
+
+A sketch starts sparse, as integer entries `register << 6 | rank` costing four bytes
+each, and switches to dense once it holds more than SPARSE_MAX_ENTRIES of them: one
+byte per register, REGISTERS bytes whatever the count. Either form holds at most one
+entry per register, so a sketch never grows past the dense size.
+
+Counts are estimated with Ertl's improved estimator ("New cardinality estimation
+algorithms for HyperLogLog sketches", 2017), which is unbiased from one value upwards
+without the bias-correction tables of HyperLogLog++. With PRECISION = 14 the relative
+standard error is 1.04 / sqrt(2^14) ~= 0.8%: about 68% of estimates are within 0.8% of
+the exact count and 99.7% within 2.4%; counts far below 2^14 are practically exact.
+Changing PRECISION invalidates stored sketches.
+"""
+
+import hashlib
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PRECISION = 14
+REGISTERS = 1 << PRECISION
+RELATIVE_ERROR = 1.04 / math.sqrt(REGISTERS)
+# Sparse entries a sketch may hold before it is stored dense (8 KB sparse, 16 KB dense)
+SPARSE_MAX_ENTRIES = REGISTERS // 8
+_RANK_BITS = 6
+_ALPHA_INF = 1 / (2 * math.log(2))
+
+def entry_for(value) -> int:
+    """Sparse sketch entry (register << 6 | rank) for one value."""
+    hashed = int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+    register = hashed >> (64 - PRECISION)
+    remainder = hashed & ((1 << (64 - PRECISION)) - 1)
+    rank = (64 - PRECISION) - remainder.bit_length() + 1
+    return register << _RANK_BITS | rank
+
+def split_entry(entry: int):
+    """Return the (register, rank) pair of a sparse entry."""
+    return entry >> _RANK_BITS, entry & ((1 << _RANK_BITS) - 1)
+
+def estimate(nonzero: int, harmonic: float) -> int:
+    """
+    Estimate a distinct count from the merged registers.
+
+    Args:
+        nonzero: Number of registers with a rank
+        harmonic: Sum of 2^-rank over those registers
+
+    Returns:
+        Estimated number of distinct values
+    """
+    zeros = REGISTERS - nonzero
+    if zeros == REGISTERS:
+        return 0
+    return round(_ALPHA_INF * REGISTERS ** 2 / (REGISTERS * _sigma(zeros / REGISTERS) + harmonic))
+
+def estimate_dense(ranks: bytes) -> int:
+    """Estimate a distinct count from dense registers, one rank byte per register."""
+    counts = [(rank, ranks.count(rank)) for rank in range(1, 1 << _RANK_BITS)]
+    nonzero = sum(count for _, count in counts)
+    return estimate(nonzero, sum(count * 2.0 ** -rank for rank, count in counts))
+
+def _sigma(x: float) -> float:
+    """Ertl's sigma(x) = x + sum over k >= 1 of x^(2^k) * 2^(k-1), the zero-register term."""
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y *= 2
+        if z == previous:
+            return z
+
+class HyperLogLog:
+    """An in-memory HyperLogLog sketch, loaded from and stored in either form."""
+
+    def __init__(self, entries: Iterable[int] = (), dense: Optional[bytes] = None):
+        self.registers: Dict[int, int] = {}
+        if dense is not None:
+            self.registers.update((register, rank) for register, rank in enumerate(dense) if rank)
+        for entry in entries:
+            self._update(*split_entry(entry))
+
+    def add(self, value):
+        self._update(*split_entry(entry_for(value)))
+
+    def merge(self, other: "HyperLogLog"):
+        for register, rank in other.registers.items():
+            self._update(register, rank)
+
+    def _update(self, register: int, rank: int):
+        if rank > self.registers.get(register, 0):
+            self.registers[register] = rank
+
+    def entries(self) -> List[int]:
+        return [register << _RANK_BITS | rank for register, rank in sorted(self.registers.items())]
+
+    def dense(self) -> bytes:
+        ranks = bytearray(REGISTERS)
+        for register, rank in self.registers.items():
+            ranks[register] = rank
+        return bytes(ranks)
+
+    def storage(self) -> Tuple[List[int], Optional[bytes]]:
+        """The (sparse entries, dense registers) to store: sparse while small enough, else dense."""
+        if len(self.registers) <= SPARSE_MAX_ENTRIES:
+            return self.entries(), None
+        return [], self.dense()
+
+    def count(self) -> int:
+        return estimate(len(self.registers), sum(2.0 ** -rank for rank in self.registers.values()))
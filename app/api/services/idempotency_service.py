@@ -0,0 +1,145 @@
+"""
+Idempotency-Key support for the create endpoints.
+
+A request sent with an `Idempotency-Key` header claims the key, runs its handler and
+stores the response on the key row in one transaction (a `SingleTransaction`, which
+defers the handler's own commits and keeps its orders off the group-commit pipeline).
+The key, the created entity and the response therefore commit or roll back together:
+no key is ever left claimed without a response. The response is also kept in a
+per-worker in-memory front cache, and any retry with the same key gets it back without
+touching the write path again.
+
+Concurrent duplicates are serialized on the key alone: the second claim blocks on the
+key's unique index entry until the first transaction finishes, then waits (up to
+IDEMPOTENCY_WAIT_TIMEOUT) for the stored response. A key reused with a different
+request is rejected, and keys are forgotten after IDEMPOTENCY_KEY_TTL.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+from ... import config
+from ...database import SingleTransaction, in_single_transaction
+from ..queries import idempotency_queries
+from .cache import LocalDriver
+
+MAX_KEY_LENGTH = 255
+
+_WAIT_POLL_INTERVAL = 0.05
+
+class IdempotencyError(Exception):
+    """A request that cannot be answered because of its Idempotency-Key."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+_front_cache: Optional[LocalDriver] = None
+_front_cache_lock = threading.Lock()
+
+def get_front_cache() -> LocalDriver:
+    """Return the worker's cache of completed keys."""
+    global _front_cache
+    with _front_cache_lock:
+        if _front_cache is None:
+            _front_cache = LocalDriver(config.IDEMPOTENCY_CACHE_SIZE)
+        return _front_cache
+
+def reset_front_cache():
+    """Drop the worker's cache of completed keys."""
+    global _front_cache
+    with _front_cache_lock:
+        _front_cache = None
+
+def run_once(db: Session, key: Optional[str], scope: str, request: dict,
+             handler: Callable[[], object], schema) -> Tuple[object, bool]:
+    """
+    Run a create handler at most once per Idempotency-Key.
+
+    Args:
+        db: Database session the handler writes with
+        key: The request's Idempotency-Key header, if any
+        scope: Endpoint the key belongs to
+        request: Everything that identifies the request (path parameters and body)
+        handler: Performs the request and returns the created entity
+        schema: Pydantic response model of the entity
+
+    Returns:
+        The response, and whether it was replayed from an earlier request
+
+    Raises:
+        IdempotencyError: If the key is invalid, was used with a different request, or
+            its original request is still running after IDEMPOTENCY_WAIT_TIMEOUT
+    """
+    if key is None:
+        return handler(), False
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError(400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+    fingerprint = hashlib.sha256(
+        json.dumps(jsonable_encoder(request), sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+
+    cached = get_front_cache().get_many([f"{scope}:{key}"])[0]
+    if cached is not None:
+        stored = json.loads(cached)
+        return _replay(stored["fingerprint"], stored["response"], fingerprint), True
+
+    try:
+        claimed = idempotency_queries.claim_key(db, scope, key, fingerprint, config.IDEMPOTENCY_KEY_TTL)
+    except Exception:
+        db.rollback()
+        raise
+    if not claimed:
+        db.rollback()
+        return _wait_for_response(db, scope, key, fingerprint), True
+
+    # Already in one (a batch), the claim commits with the rest of it
+    transaction = None if in_single_transaction(db) else SingleTransaction(db)
+    if transaction is not None:
+        transaction.begin()
+    try:
+        response = jsonable_encoder(schema.from_orm(handler()))
+        idempotency_queries.store_response(db, scope, key, response)
+        if transaction is not None:
+            transaction.commit()
+    except Exception:
+        # Releases the claim with the writes, so a retry runs again
+        if transaction is not None:
+            transaction.rollback()
+        else:
+            db.rollback()
+        raise
+    _remember(scope, key, fingerprint, response, config.IDEMPOTENCY_KEY_TTL)
+    return response, False
+
+def _wait_for_response(db: Session, scope: str, key: str, fingerprint: str):
+    """Return the response of a key claimed by another request, once it is stored."""
+    deadline = time.monotonic() + config.IDEMPOTENCY_WAIT_TIMEOUT
+    while True:
+        row = idempotency_queries.get_key(db, scope, key)
+        db.rollback()
+        if row is not None and (row.response is not None or row.fingerprint != fingerprint):
+            if row.response is not None:
+                _remember(scope, key, row.fingerprint, row.response,
+                          (row.expires_at - datetime.utcnow()).total_seconds())
+            return _replay(row.fingerprint, row.response, fingerprint)
+        if time.monotonic() >= deadline:
+            raise IdempotencyError(409, "A request with this Idempotency-Key is still in progress")
+        time.sleep(_WAIT_POLL_INTERVAL)
+
+def _replay(stored_fingerprint: str, response, fingerprint: str):
+    if stored_fingerprint != fingerprint:
+        raise IdempotencyError(422, "Idempotency-Key was already used with a different request")
+    return response
+
+def _remember(scope: str, key: str, fingerprint: str, response, ttl: float):
+    if ttl > 0:
+        get_front_cache().set_many(
+            {f"{scope}:{key}": json.dumps({"fingerprint": fingerprint, "response": response}).encode()}, ttl
+        )
@@ -0,0 +1,282 @@
+"""
+Per-worker real-time leaderboard of in-store customers over sliding windows.
+
+Each UTC day of the last 30 keeps a Space-Saving summary (Metwally et al., 2005) of at
+most LEADERBOARD_CAPACITY customers, so memory is bounded by 30 * capacity entries no
+matter how many customers order. A window (today, 7d, 30d) is the sum of its days'
+summaries; the sums are maintained incrementally as orders arrive, and the top
+LEADERBOARD_TOP_SIZE entries of each window are kept sorted so a read is a list slice.
+
+Space-Saving never undercounts a customer and overcounts by at most the smallest count
+in the summary, so customers whose in-store orders clearly lead are ranked exactly.
+
+The leaderboard is seeded from the database on first use and sees orders created by
+this worker immediately, and other workers' orders as their change notifications
+arrive. Every LEADERBOARD_RECONCILE_INTERVAL seconds it is re-seeded from SQL to repair
+anything missed; drift between the two is logged. A notification can arrive after a
+re-seed that already counted its order, so the seed remembers the ids of the orders it
+counted that were placed today or after the previous seed's newest order, and skips
+them once when they are recorded again.
+"""
+
+import bisect
+import heapq
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from ... import config, models
+
+logger = logging.getLogger(__name__)
+
+# Sliding windows and the number of days (ending today) each one covers
+WINDOWS = {"today": 1, "7d": 7, "30d": 30}
+_HISTORY_DAYS = max(WINDOWS.values())
+
+class SpaceSaving:
+    """Space-Saving heavy-hitters summary holding at most `capacity` items."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[int, int] = {}
+        self._heap: List[Tuple[int, int]] = []  # (count, item), stale entries skipped lazily
+
+    def update(self, item: int, weight: int = 1) -> Optional[Tuple[int, int]]:
+        """
+        Count `weight` occurrences of an item.
+
+        Returns:
+            The (item, count) evicted to make room, if any
+        """
+        evicted = None
+        if item in self.counts:
+            self.counts[item] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = weight
+        else:
+            evicted = self._pop_min()
+            # The newcomer inherits the evicted count as its possible overestimate
+            self.counts[item] = evicted[1] + weight
+        heapq.heappush(self._heap, (self.counts[item], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, item) for item, count in self.counts.items()]
+            heapq.heapify(self._heap)
+        return evicted
+
+    def _pop_min(self) -> Tuple[int, int]:
+        while True:
+            count, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                del self.counts[item]
+                return item, count
+
+class Leaderboard:
+    """Space-Saving summaries per day plus incrementally maintained window totals."""
+
+    def __init__(self, capacity: int, top_size: int):
+        self.capacity = capacity
+        self.top_size = top_size
+        self.today: Optional[date] = None
+        self.days: Dict[date, SpaceSaving] = {}
+        self.window_counts: Dict[str, Dict[int, int]] = {window: {} for window in WINDOWS}
+        self._top: Dict[str, Optional[List[Tuple[int, int]]]] = {window: None for window in WINDOWS}
+        self._seeded_ids: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def seed(self, rows, today: date, order_ids: Iterable[int] = ()):
+        """
+        Rebuild from (day, customer_id, in-store order count) rows of the last 30 days.
+
+        `order_ids` are orders the rows count that may still be recorded afterwards;
+        recording one of them is skipped.
+        """
+        with self._lock:
+            self.today = today
+            self.days = {}
+            self._seeded_ids = set(order_ids)
+            # Heaviest first, so the summaries keep the heavy hitters exactly
+            for day, customer_id, count in sorted(rows, key=lambda row: -row[2]):
+                if today - day < timedelta(days=_HISTORY_DAYS):
+                    self.days.setdefault(day, SpaceSaving(self.capacity)).update(customer_id, count)
+            self._rebuild_windows()
+
+    def advance(self, today: date):
+        """Move the windows forward to a new day, dropping days that fell out."""
+        with self._lock:
+            self._advance(today)
+
+    def record(self, customer_id: int, day: date, order_id: Optional[int] = None):
+        """Count one in-store order placed on `day`, unless the seed already counted it."""
+        with self._lock:
+            if order_id in self._seeded_ids:
+                self._seeded_ids.discard(order_id)
+                return
+            self._advance(day)
+            if self.today - day >= timedelta(days=_HISTORY_DAYS):
+                return
+            evicted = self.days.setdefault(day, SpaceSaving(self.capacity)).update(customer_id)
+            for window, span in WINDOWS.items():
+                if self.today - day >= timedelta(days=span):
+                    continue
+                counts = self.window_counts[window]
+                if evicted is not None:
+                    evicted_id, evicted_count = evicted
+                    counts[evicted_id] -= evicted_count
+                    if counts[evicted_id] <= 0:
+                        del counts[evicted_id]
+                    self._top[window] = None
+                counts[customer_id] = counts.get(customer_id, 0) + (1 if evicted is None else evicted[1] + 1)
+                self._raise_in_top(window, customer_id, counts[customer_id])
+
+    def top(self, window: str, limit: int) -> List[Tuple[int, int]]:
+        """Return up to `limit` (customer_id, in-store order count) pairs, highest first."""
+        with self._lock:
+            if self._top[window] is None:
+                self._top[window] = heapq.nsmallest(
+                    self.top_size,
+                    ((-count, customer_id) for customer_id, count in self.window_counts[window].items())
+                )
+            return [(customer_id, -count) for count, customer_id in self._top[window][:limit]]
+
+    def _raise_in_top(self, window: str, customer_id: int, count: int):
+        """Keep the sorted top list exact after a customer's count went up."""
+        top = self._top[window]
+        if top is None:
+            return
+        for index, (_, member) in enumerate(top):
+            if member == customer_id:
+                del top[index]
+                break
+        entry = (-count, customer_id)
+        if len(top) < self.top_size or entry < top[-1]:
+            bisect.insort(top, entry)
+            del top[self.top_size:]
+
+    def _advance(self, today: date):
+        if self.today is not None and today <= self.today:
+            return
+        self.today = today
+        for day in [day for day in self.days if today - day >= timedelta(days=_HISTORY_DAYS)]:
+            del self.days[day]
+        self._rebuild_windows()
+
+    def _rebuild_windows(self):
+        for window, span in WINDOWS.items():
+            counts = {}
+            for day, summary in self.days.items():
+                if self.today - day < timedelta(days=span):
+                    for customer_id, count in summary.counts.items():
+                        counts[customer_id] = counts.get(customer_id, 0) + count
+            self.window_counts[window] = counts
+            self._top[window] = None
+
+_leaderboard: Optional[Leaderboard] = None
+_leaderboard_lock = threading.Lock()
+_seeded_at = 0.0
+# Newest in-store order id the last seed counted
+_seed_watermark: Optional[int] = None
+# Names and emails of ranked customers; customers are never updated, so this only needs bounding
+_customer_details: "OrderedDict[int, Tuple[str, str, str]]" = OrderedDict()
+_details_lock = threading.Lock()
+
+def _in_store_counts_by_day(db: Session, today: date, watermark: Optional[int]):
+    """(day, customer_id, count, recent order ids) rows, read in one snapshot."""
+    recent = "order_date >= :today" if watermark is None else "(order_date >= :today OR id > :watermark)"
+    return db.execute(text(f"""
+        SELECT CAST(order_date AS date), customer_id, count(*), array_agg(id) FILTER (WHERE {recent})
+        FROM orders
+        WHERE order_type = 'in_store' AND order_date >= :since
+        GROUP BY 1, 2
+    """), {"since": today - timedelta(days=_HISTORY_DAYS - 1), "today": today,
+          "watermark": watermark}).fetchall()
+
+def get_leaderboard(db: Session) -> Leaderboard:
+    """Return the worker's leaderboard, seeding it on first use and re-seeding it from
+    SQL every LEADERBOARD_RECONCILE_INTERVAL seconds."""
+    global _leaderboard, _seeded_at, _seed_watermark
+    with _leaderboard_lock:
+        due = time.monotonic() - _seeded_at >= config.LEADERBOARD_RECONCILE_INTERVAL
+        if _leaderboard is None or due:
+            today = datetime.utcnow().date()
+            rows = _in_store_counts_by_day(db, today, _seed_watermark)
+            order_ids = [order_id for row in rows for order_id in row[3] or ()]
+            leaderboard = Leaderboard(config.LEADERBOARD_CAPACITY, config.LEADERBOARD_TOP_SIZE)
+            leaderboard.seed([row[:3] for row in rows], today, order_ids)
+            _seed_watermark = max(order_ids, default=_seed_watermark)
+            if _leaderboard is not None:
+                _log_drift(_leaderboard, leaderboard)
+            _leaderboard = leaderboard
+            _seeded_at = time.monotonic()
+        _leaderboard.advance(datetime.utcnow().date())
+        return _leaderboard
+
+def _log_drift(current: Leaderboard, reconciled: Leaderboard):
+    for window in WINDOWS:
+        before = current.top(window, current.top_size)
+        after = reconciled.top(window, reconciled.top_size)
+        if before != after:
+            changed = len(set(before) ^ set(after))
+            logger.warning("Leaderboard %s drifted from SQL: %d entries corrected", window, changed)
+
+def record_order(order: models.Order):
+    """Write-path hook: count a committed in-store order if the leaderboard is loaded."""
+    if _leaderboard is not None and order.order_type == "in_store":
+        _leaderboard.record(order.customer_id, order.order_date.date(), order.id)
+
+def record_changes(orders: List[dict]):
+    """Change-notification hook: count other workers' in-store orders if the leaderboard is loaded."""
+    board = _leaderboard
+    if board is None:
+        return
+    for order in orders:
+        if order["order_type"] == "in_store":
+            board.record(order["customer_id"], order["order_date"].date(), order["id"])
+
+def current_top(limit: int) -> Optional[Dict[str, List[dict]]]:
+    """Return the top `limit` customers of every window, or None if the leaderboard is not loaded."""
+    if _leaderboard is None:
+        return None
+    return {
+        window: [{"customer_id": customer_id, "in_store_order_count": count}
+                 for customer_id, count in _leaderboard.top(window, limit)]
+        for window in WINDOWS
+    }
+
+def get_customer_details(db: Session, customer_ids: List[int]) -> Dict[int, Tuple[str, str, str]]:
+    """Return (first_name, last_name, email) per customer, loading only uncached ones."""
+    with _details_lock:
+        missing = [customer_id for customer_id in customer_ids if customer_id not in _customer_details]
+    loaded = {
+        customer.id: (customer.first_name, customer.last_name, customer.email)
+        for customer in db.query(models.Customer).filter(models.Customer.id.in_(missing))
+    } if missing else {}
+    with _details_lock:
+        _customer_details.update(loaded)
+        details = {}
+        for customer_id in customer_ids:
+            if customer_id in _customer_details:
+                _customer_details.move_to_end(customer_id)
+                details[customer_id] = _customer_details[customer_id]
+        while len(_customer_details) > 10 * config.LEADERBOARD_TOP_SIZE:
+            _customer_details.popitem(last=False)
+    return details
+
+def forget_customers(customer_ids):
+    """Drop customers from the details cache so they are reloaded on next use."""
+    with _details_lock:
+        for customer_id in customer_ids:
+            _customer_details.pop(customer_id, None)
+
+def reset_leaderboard():
+    """Drop the leaderboard so the next read re-seeds it."""
+    global _leaderboard, _seeded_at, _seed_watermark
+    with _leaderboard_lock:
+        _leaderboard = None
+        _seeded_at = 0.0
+        _seed_watermark = None
+    with _details_lock:
+        _customer_details.clear()
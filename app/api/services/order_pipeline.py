@@ -0,0 +1,140 @@
+"""
+Group-commit pipeline for order creation.
+
+With ORDER_GROUP_COMMIT enabled, request threads hand their validated orders to one
+writer thread per worker instead of committing them themselves. The writer collects
+orders for up to ORDER_GROUP_COMMIT_MAX_WAIT_MS after the first one arrives, or until
+ORDER_GROUP_COMMIT_MAX_ITEMS are queued, and writes the batch with multi-row statements
+in a single transaction, so a burst of N orders costs one commit (one WAL flush)
+instead of N. Each caller then receives its own order, loaded by the writer.
+
+If a batch fails before its commit, it is rolled back and its orders are retried one
+per transaction, so a bad order fails alone and the others still commit. Side effects
+after the commit (cache invalidation, in-memory analytics) run through `after_commit`,
+which logs their failures, so callers get their committed orders regardless. Only a
+failure to load the committed orders reaches every caller in the batch, and it is
+never retried, since the orders exist. Under light load a batch is a single order and
+the cost is the extra wait, at most ORDER_GROUP_COMMIT_MAX_WAIT_MS.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+from ... import config
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class GroupCommitPipeline:
+    """Batches items from many threads into one `write_batch` call per transaction."""
+
+    def __init__(self, session_factory: Callable[[], Session],
+                 write_batch: Callable[[Session, list], list],
+                 max_items: int, max_wait: float):
+        self.session_factory = session_factory
+        self.write_batch = write_batch
+        self.max_items = max_items
+        self.max_wait = max_wait
+        self.batches = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="order-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue an item and block until its batch has committed; returns its result."""
+        future = Future()
+        self._queue.put((item, future))
+        return future.result()
+
+    def stop(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            stopping = False
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                try:
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch: List[tuple]):
+        db = self.session_factory()
+        committed = []
+        event.listen(db, "after_commit", lambda session: committed.append(True))
+        try:
+            try:
+                results = self.write_batch(db, [item for item, _ in batch])
+            except Exception:
+                db.rollback()
+                # Retrying orders that were committed would write them twice
+                if len(batch) == 1 or committed:
+                    raise
+                logger.warning("Group commit of %d orders failed; retrying them one by one", len(batch))
+                for entry in batch:
+                    self._write_one(db, entry)
+                return
+            self.batches += 1
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        finally:
+            db.close()
+
+    def _write_one(self, db: Session, entry: tuple):
+        item, future = entry
+        try:
+            result = self.write_batch(db, [item])[0]
+        except Exception as error:
+            db.rollback()
+            future.set_exception(error)
+        else:
+            self.batches += 1
+            future.set_result(result)
+
+_pipeline: Optional[GroupCommitPipeline] = None
+_pipeline_lock = threading.Lock()
+
+def get_pipeline(db: Session, write_batch: Callable[[Session, list], list]) -> GroupCommitPipeline:
+    """Return the worker's pipeline, started on first use with sessions on `db`'s engine."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = GroupCommitPipeline(
+                sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind()),
+                write_batch,
+                config.ORDER_GROUP_COMMIT_MAX_ITEMS,
+                config.ORDER_GROUP_COMMIT_MAX_WAIT_MS / 1000
+            )
+        return _pipeline
+
+def reset_pipeline():
+    """Stop the pipeline after writing what is queued; the next order starts a new one."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.stop()
+            _pipeline = None
@@ -1,45 +1,180 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import or_, func, extract
-from ... import models, schemas
-from typing import List
-from .customers_service import get_customer, get_customer_addresses
-from ..queries import orders_queries
+from ... import config, models, schemas
+from ...database import after_commit, in_single_transaction
+from typing import List, Optional, Tuple
+from datetime import datetime
+from .customers_service import customer_exists, get_customer_addresses
+from ..queries import (
+    archive_queries, orders_queries, customer_stats_queries, geo_rollup_queries, notification_queries,
+    version_queries, zip_sketch_queries
+)
+from . import columnar_analytics, event_bus, leaderboard, order_pipeline
+from .cache import get_cache
+from .dataloader import DataLoader
 
 def create_order(db: Session, order: schemas.OrderCreate, customer_id: int):
-    # Create the order
-    order_dict = order.dict()
-    shipping_addresses = order_dict.pop('shipping_addresses')
-    db_order = models.Order(
-        **order_dict,
-        customer_id=customer_id
-    )
-    db.add(db_order)
-    db.flush()  # Flush to get the order ID
-    
-    # Create shipping address entries
-    for shipping_addr in shipping_addresses:
-        db_shipping_addr = models.OrderShippingAddress(
-            order_id=db_order.id,
-            address_id=shipping_addr["address_id"],
-            sequence=shipping_addr["sequence"]
-        )
-        db.add(db_shipping_addr)
-    
+    """
+    Create an order for a customer.
+
+    With ORDER_GROUP_COMMIT the order is handed to the worker's group-commit pipeline,
+    which writes it together with concurrent orders in one transaction; either way the
+    order is committed when this returns. In a single transaction (a batch) the order is
+    always written on the caller's session.
+
+    Args:
+        db: Database session
+        order: Order to create; the customer and addresses have been validated
+        customer_id: ID of the customer placing the order
+
+    Returns:
+        The created order
+    """
+    if config.ORDER_GROUP_COMMIT and not in_single_transaction(db):
+        return order_pipeline.get_pipeline(db, create_orders).submit((order, customer_id))
+    return create_orders(db, [(order, customer_id)])[0]
+
+def create_orders(db: Session, orders: List[Tuple[schemas.OrderCreate, int]]) -> List[models.Order]:
+    """
+    Create several orders in one transaction with multi-row statements.
+
+    The customers' counters, zip sketches and geo rollups are maintained in the same
+    transaction, and the other workers are notified on commit.
+
+    Args:
+        db: Database session
+        orders: (order, customer_id) pairs
+
+    Returns:
+        The created orders, in the same order
+    """
+    order_ids = orders_queries.allocate_order_ids(db, len(orders))
+    position = {order_id: index for index, order_id in enumerate(order_ids)}
+    order_date = datetime.utcnow()
+    rows = orders_queries.insert_orders(db, [
+        {**order.dict(exclude={"shipping_addresses"}), "id": order_id, "customer_id": customer_id,
+         "order_date": order_date}
+        for order_id, (order, customer_id) in zip(order_ids, orders)
+    ])
+    rows = sorted(rows, key=lambda row: position[row.id])
+    orders_queries.insert_order_shipping_addresses(db, [
+        {"order_id": order_id, "order_date": order_date, "address_id": shipping_addr.address_id,
+         "sequence": shipping_addr.sequence}
+        for order_id, (order, _) in zip(order_ids, orders)
+        for shipping_addr in order.shipping_addresses
+    ])
+
+    # Keep the customers' counters, zip sketches and geo rollups in the same
+    # transaction as the orders, and tell the other workers about them on commit
+    addresses = orders_queries.get_addresses_by_id(db, [
+        address_id for order, _ in orders
+        for address_id in (order.billing_address_id, *(addr.address_id for addr in order.shipping_addresses))
+    ])
+    written = [
+        (row, addresses[order.billing_address_id], [addresses[addr.address_id] for addr in order.shipping_addresses])
+        for row, (order, _) in zip(rows, orders)
+    ]
+    customer_stats_queries.increment_customer_order_stats(db, rows)
+    zip_sketch_queries.add_order_customers(db, written)
+    geo_rollup_queries.increment_geo_rollups(db, [(billing, shipping) for _, billing, shipping in written])
+    notification_queries.notify_orders_created(db, written)
+    # Versions for ETags: the orders table for analytics, the customers for their reads
+    version_queries.bump_table_versions(db, "orders")
+    version_queries.bump_customer_versions(db, [customer_id for _, customer_id in orders])
     db.commit()
-    db.refresh(db_order)
-    return db_order
 
-def get_order(db: Session, order_id: int):
-    return orders_queries.get_order_query(db, order_id)
+    db_orders = orders_queries.get_orders_by_ids(db, order_ids)
+    db_orders.sort(key=lambda db_order: position[db_order.id])
+    # Cached customers list their orders, and new ids may have been cached as not found
+    def invalidate():
+        get_cache().delete("customer", {customer_id for _, customer_id in orders})
+        get_cache().delete("order", order_ids)
+
+    def record():
+        for db_order, (_, billing_address, shipping_addresses) in zip(db_orders, written):
+            columnar_analytics.record_order(db_order)
+            leaderboard.record_order(db_order)
+            event_bus.publish_order(db_order, billing_address, shipping_addresses)
+
+    after_commit(db, invalidate, also_on_rollback=True)
+    after_commit(db, record)
+    return db_orders
+
+def get_order(db: Session, order_id: int) -> Optional[schemas.Order]:
+    """Get a hot or archived order, read through the cache. Orders never change once placed."""
+    def load():
+        order = orders_queries.get_order_query(db, order_id)
+        return None if order is None else schemas.Order.from_orm(order).dict()
 
-def get_customer_orders(db: Session, customer_id: int, skip: int = 0, limit: int = 100):
-    return orders_queries.get_customer_orders_query(db, customer_id, skip, limit)
+    order = get_cache(db).get_or_load("order", order_id, load, config.CACHE_ENTITY_TTL, config.CACHE_NEGATIVE_TTL)
+    return None if order is None else schemas.Order.parse_obj(order)
+
+def get_order_version(db: Session, order_id: int) -> Optional[Tuple[int, datetime]]:
+    """
+    Get what an order's ETag and Last-Modified derive from, without loading the order.
+
+    Returns:
+        The order's version and order date, from the cached order when there is one and
+        otherwise from its row; None if the order doesn't exist
+    """
+    cached = get_cache(db).get_many("order", [order_id])
+    if order_id in cached:
+        order = cached[order_id]
+        if order is None:
+            return None
+        return order.get("version", 1), datetime.fromisoformat(order["order_date"])
+    row = version_queries.get_order_version(db, order_id)
+    return None if row is None else (row.version, row.order_date)
+
+def get_customer_orders(db: Session, customer_id: int, skip: int = 0, limit: int = 100,
+                        start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
+    return orders_queries.get_customer_orders_query(db, customer_id, skip, limit, start_date, end_date)
 
 def search_orders(db: Session, query: str, skip: int = 0, limit: int = 100):
     return orders_queries.search_orders_query(db, query, skip, limit)
 
-def get_orders(db: Session, skip: int = 0, limit: int = 100):
-    return orders_queries.get_orders_query(db, skip, limit)
+def order_loader(db: Session) -> DataLoader:
+    """
+    Return a loader of hot or archived orders by id: one cache multi-get, then one query
+    for the misses among hot orders and one for those still missing among archived ones.
+    """
+    def load(order_ids):
+        def load_from_db(missing):
+            orders = orders_queries.get_orders_by_ids(db, missing)
+            found = {order.id for order in orders}
+            archived = [order_id for order_id in missing if order_id not in found]
+            if archived:
+                orders += archive_queries.get_archived_orders_by_ids(db, archived)
+            return {order.id: schemas.Order.from_orm(order).dict() for order in orders}
+
+        orders = get_cache(db).get_many_or_load("order", order_ids, load_from_db, config.CACHE_ENTITY_TTL)
+        return {order_id: schemas.Order.parse_obj(order) for order_id, order in orders.items() if order is not None}
+
+    return DataLoader(load)
+
+def get_orders(db: Session, skip: int = 0, limit: int = 100,
+               start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> List[schemas.Order]:
+    """Get a page of orders: ids from SQL, orders from one cache multi-get."""
+    order_ids = orders_queries.get_order_ids_query(db, skip, limit, start_date, end_date)
+    return [order for order in order_loader(db).load_many(order_ids) if order is not None]
+
+def get_orders_by_ids(db: Session, order_ids: List[int]) -> Tuple[List[schemas.Order], List[int]]:
+    """
+    Get several hot or archived orders by id in one batch.
+
+    Args:
+        db: Database session
+        order_ids: Ids to fetch; repeated ids are returned once
+
+    Returns:
+        The orders found, in the order asked for, and the ids that don't exist
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    orders = order_loader(db).load_many(order_ids)
+    return (
+        [order for order in orders if order is not None],
+        [order_id for order_id, order in zip(order_ids, orders) if order is None]
+    )
 
 def get_orders_by_time_of_day(db: Session, limit: int = 10):
     """
@@ -0,0 +1,159 @@
+from sqlalchemy.orm import Session
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+from ... import config, schemas
+from ..queries import revenue_queries
+from ..queries.analytics_queries import as_naive_utc
+from .cache import cached_response
+from .tdigest import TDigest
+
+CENTS = Decimal("0.01")
+
+class _RevenueGroup:
+    """Exact count and revenue plus a t-digest of order values for one group."""
+
+    def __init__(self):
+        self.order_count = 0
+        self.revenue = Decimal("0")
+        self.digest = TDigest(config.REVENUE_DIGEST_COMPRESSION)
+
+    def add_order(self, amount: Decimal):
+        self.order_count += 1
+        self.revenue += amount
+        self.digest.add(amount)
+
+    def add_rollup(self, rollup):
+        self.order_count += rollup.order_count
+        self.revenue += rollup.revenue
+        self.digest.merge(TDigest(
+            config.REVENUE_DIGEST_COMPRESSION, rollup.digest_means, rollup.digest_weights,
+            float(rollup.min_amount), float(rollup.max_amount)
+        ))
+
+    def percentile(self, q: float) -> Decimal:
+        return Decimal(repr(self.digest.quantile(q))).quantize(CENTS)
+
+@cached_response("analytics", schemas.RevenueAnalytics, "CACHE_ANALYTICS_TTL")
+def get_revenue(db: Session, group_by: str = "zip", start_date: Optional[datetime] = None,
+                end_date: Optional[datetime] = None, limit: int = 100) -> List[schemas.RevenueAnalytics]:
+    """
+    Get revenue, average and p50/p90/p99 order value per group.
+
+    Completed days come from the per-day rollups, merging their t-digests instead of
+    reading the orders. Orders after the newest rollup, and those of a day the window
+    only partly covers, are read live.
+
+    Args:
+        db: Database session
+        group_by: zip, hour, day_of_week, order_type, status or date
+        start_date: Inclusive lower bound on order_date
+        end_date: Exclusive upper bound on order_date
+        limit: Number of groups to return, highest revenue first
+
+    Returns:
+        List of revenue analytics
+    """
+    start = as_naive_utc(start_date) if start_date is not None else None
+    end = as_naive_utc(end_date) if end_date is not None else None
+    groups: Dict[str, _RevenueGroup] = {}
+    windows = [(start, end)]
+
+    sealed_through = revenue_queries.get_sealed_through(db)
+    if sealed_through is not None:
+        # Sketched days the window covers entirely, in BUSINESS_TIMEZONE
+        first_day = None
+        if start is not None:
+            first_day = revenue_queries.business_day(start)
+            if revenue_queries.day_start(first_day) < start:
+                first_day += timedelta(days=1)
+        end_day = sealed_through
+        if end is not None:
+            end_day = min(end_day, revenue_queries.business_day(end))
+        if first_day is None or first_day < end_day:
+            dimension = revenue_queries.DATE_DIMENSION if group_by == "date" else group_by
+            for rollup in revenue_queries.get_revenue_rollups(db, dimension, first_day, end_day):
+                key = rollup.bucket_date.isoformat() if group_by == "date" else rollup.key
+                groups.setdefault(key, _RevenueGroup()).add_rollup(rollup)
+            windows = [(revenue_queries.day_start(end_day), end)]
+            if first_day is not None:
+                windows.append((start, revenue_queries.day_start(first_day)))
+
+    for key, amount in revenue_queries.get_live_order_values(db, group_by, windows):
+        groups.setdefault(key, _RevenueGroup()).add_order(amount)
+
+    ranked = sorted(groups.items(), key=lambda item: item[1].revenue, reverse=True)[:limit]
+    return [
+        schemas.RevenueAnalytics(
+            group=key,
+            order_count=group.order_count,
+            total_revenue=group.revenue,
+            average_order_value=(group.revenue / group.order_count).quantize(CENTS),
+            p50=group.percentile(0.5),
+            p90=group.percentile(0.9),
+            p99=group.percentile(0.99)
+        ) for key, group in ranked
+    ]
+
+def refresh_revenue_rollups(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """
+    Rebuild the revenue rollups of completed days in [start, end).
+
+    By default re-sketches the REVENUE_ROLLUP_LOOKBACK_DAYS days before the newest
+    rollup and every day since, up to yesterday; on an empty table it starts at the
+    oldest order. The current day is never sketched since it is still receiving
+    orders. Each day is replaced in its own transaction.
+
+    Args:
+        db: Database session
+        start: First day to rebuild (clamped so no unsketched gap is left behind)
+        end: Day after the last day to rebuild (default and maximum: today)
+
+    Returns:
+        Number of days rebuilt
+    """
+    today = revenue_queries.business_day(datetime.utcnow())
+    end = min(end or today, today)
+    sealed_through = revenue_queries.get_sealed_through(db)
+    if sealed_through is None:
+        start = start or revenue_queries.get_first_order_day(db)
+    else:
+        default = sealed_through - timedelta(days=config.REVENUE_ROLLUP_LOOKBACK_DAYS)
+        start = min(start or default, sealed_through)
+    if start is None:
+        return 0
+
+    day = start
+    rebuilt = 0
+    while day < end:
+        rows = revenue_queries.get_day_order_values(db, day)
+        revenue_queries.replace_day_rollups(db, day, _build_day_rollups(day, rows))
+        db.commit()
+        day += timedelta(days=1)
+        rebuilt += 1
+    return rebuilt
+
+def _build_day_rollups(day: date, rows: List[tuple]) -> List[dict]:
+    """Group one day's orders by every revenue dimension into rollup rows."""
+    rollups = []
+    for index, dimension in enumerate(revenue_queries.REVENUE_DIMENSIONS):
+        amounts: Dict[str, List[Decimal]] = {}
+        for row in rows:
+            amounts.setdefault(row[index], []).append(row[-1])
+        for key, values in amounts.items():
+            digest = TDigest(config.REVENUE_DIGEST_COMPRESSION)
+            for value in values:
+                digest.add(value)
+            digest.compress()
+            rollups.append({
+                "bucket_date": day,
+                "dimension": dimension,
+                "key": key,
+                "order_count": len(values),
+                "revenue": sum(values, Decimal("0")),
+                "min_amount": min(values),
+                "max_amount": max(values),
+                "digest_means": digest.means,
+                "digest_weights": digest.weights,
+            })
+    return rollups
@@ -0,0 +1,107 @@
+"""
+Mergeable t-digest sketch for approximate percentiles.
+
+Implements the merging t-digest (Dunning & Ertl) with the k1 scale function: values are
+buffered, sorted together with the existing centroids and greedily merged so that
+centroids near the tails stay small. Digests built over disjoint sets of values can be
+merged and queried as if they had been built over the union, which is what lets
+revenue percentiles over any window be answered from per-day sketches.
+"""
+
+import math
+from typing import List, Optional, Sequence
+
+class TDigest:
+    """A t-digest holding (mean, weight) centroids plus the exact min and max."""
+
+    def __init__(self, compression: float = 100, means: Sequence[float] = (),
+                 weights: Sequence[float] = (), minimum: Optional[float] = None,
+                 maximum: Optional[float] = None):
+        self.compression = compression
+        self.means: List[float] = list(means)
+        self.weights: List[float] = list(weights)
+        self.minimum = minimum
+        self.maximum = maximum
+        self._buffer: List[tuple] = []
+
+    @property
+    def count(self) -> float:
+        return sum(self.weights) + sum(weight for _, weight in self._buffer)
+
+    def add(self, value: float, weight: float = 1):
+        value = float(value)
+        self._buffer.append((value, weight))
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+        if len(self._buffer) >= 5 * self.compression:
+            self.compress()
+
+    def merge(self, other: "TDigest"):
+        """Add every centroid of another digest to this one."""
+        other.compress()
+        self._buffer.extend(zip(other.means, other.weights))
+        for value in (other.minimum, other.maximum):
+            if value is not None:
+                self.minimum = value if self.minimum is None else min(self.minimum, value)
+                self.maximum = value if self.maximum is None else max(self.maximum, value)
+        self.compress()
+
+    def compress(self):
+        if not self._buffer:
+            return
+        centroids = sorted(list(zip(self.means, self.weights)) + self._buffer)
+        self._buffer = []
+        total = sum(weight for _, weight in centroids)
+        means, weights = [], []
+        mean, weight = centroids[0]
+        merged_weight = 0.0
+        limit = self._q_limit(0.0)
+        for next_mean, next_weight in centroids[1:]:
+            if (merged_weight + weight + next_weight) / total <= limit:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                merged_weight += weight
+                limit = self._q_limit(merged_weight / total)
+                mean, weight = next_mean, next_weight
+        means.append(mean)
+        weights.append(weight)
+        self.means, self.weights = means, weights
+
+    def _q_limit(self, q: float) -> float:
+        """Largest quantile a centroid starting at q may reach (one unit of k1 scale)."""
+        k = self.compression / (2 * math.pi) * math.asin(2 * q - 1) + 1
+        if k >= self.compression / 4:
+            return 1.0
+        return (math.sin(2 * math.pi * k / self.compression) + 1) / 2
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the value at quantile q (0..1), or None if the digest is empty."""
+        self.compress()
+        if not self.means:
+            return None
+        if len(self.means) == 1:
+            return self.means[0]
+        total = sum(self.weights)
+        target = q * total
+        # Interpolate between centroid centers; the tails are pinned to min/max
+        if target < self.weights[0] / 2:
+            return self._interpolate(self.minimum, self.means[0], target / (self.weights[0] / 2))
+        if target > total - self.weights[-1] / 2:
+            tail = (total - target) / (self.weights[-1] / 2)
+            return self._interpolate(self.maximum, self.means[-1], tail)
+        center = self.weights[0] / 2
+        for index in range(len(self.means) - 1):
+            step = (self.weights[index] + self.weights[index + 1]) / 2
+            if target <= center + step:
+                return self._interpolate(
+                    self.means[index], self.means[index + 1], (target - center) / step
+                )
+            center += step
+        return self.means[-1]
+
+    @staticmethod
+    def _interpolate(low: float, high: float, fraction: float) -> float:
+        return low + (high - low) * fraction
@@ -0,0 +1,174 @@
+"""
+Application settings read from the environment
+"""
+
+import os
+
+# Orders older than this many days are moved to the archive tables
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", "730"))
+
+# Number of orders moved per archival transaction
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "5000"))
+
+# IANA timezone used to bucket orders by hour of day and day of week
+BUSINESS_TIMEZONE = os.getenv("BUSINESS_TIMEZONE", "UTC")
+
+# Analytics backend: "sql" (default) or "columnar" (in-process NumPy snapshot)
+ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "sql")
+
+# Seconds between polls of the columnar snapshot for other workers' orders
+COLUMNAR_POLL_INTERVAL = float(os.getenv("COLUMNAR_POLL_INTERVAL", "1.0"))
+
+# Ids below the high-water mark re-read by each poll, to catch late commits
+COLUMNAR_POLL_OVERLAP = int(os.getenv("COLUMNAR_POLL_OVERLAP", "1000"))
+
+# t-digest compression for revenue percentile sketches (higher = more accurate, larger)
+REVENUE_DIGEST_COMPRESSION = float(os.getenv("REVENUE_DIGEST_COMPRESSION", "100"))
+
+# Completed days re-sketched by each `radiant-graph revenue-rollup` run
+REVENUE_ROLLUP_LOOKBACK_DAYS = int(os.getenv("REVENUE_ROLLUP_LOOKBACK_DAYS", "2"))
+
+# Customers tracked per day by the in-store leaderboard (bounds its memory)
+LEADERBOARD_CAPACITY = int(os.getenv("LEADERBOARD_CAPACITY", "1000"))
+
+# Ranked customers kept ready per leaderboard window (maximum `limit`)
+LEADERBOARD_TOP_SIZE = int(os.getenv("LEADERBOARD_TOP_SIZE", "100"))
+
+# Seconds between re-seeding the leaderboard from SQL
+LEADERBOARD_RECONCILE_INTERVAL = float(os.getenv("LEADERBOARD_RECONCILE_INTERVAL", "300"))
+
+# Seconds between live analytics batches pushed to /analytics/stream subscribers
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", "1.0"))
+
+# Batches queued per stream before a slow consumer's batches are merged
+STREAM_MAX_PENDING = int(os.getenv("STREAM_MAX_PENDING", "30"))
+
+# Seconds of silence before a stream sends a keep-alive comment
+STREAM_HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT_INTERVAL", "15"))
+
+# Reconnect delay suggested to stream clients, in milliseconds
+STREAM_RETRY_MS = int(os.getenv("STREAM_RETRY_MS", "3000"))
+
+# Leaderboard entries per window included in stream deltas
+STREAM_LEADERBOARD_SIZE = int(os.getenv("STREAM_LEADERBOARD_SIZE", "10"))
+
+# Run the LISTEN/NOTIFY listener that applies other workers' writes to in-process caches
+CHANGE_LISTENER = os.getenv("CHANGE_LISTENER", "true").lower() == "true"
+
+# Seconds the listener keeps collecting after a notification, to apply bursts at once
+CHANGE_COALESCE_INTERVAL = float(os.getenv("CHANGE_COALESCE_INTERVAL", "0.05"))
+
+# Seconds between reconnection attempts of the listener
+CHANGE_LISTENER_RETRY_INTERVAL = float(os.getenv("CHANGE_LISTENER_RETRY_INTERVAL", "5"))
+
+# Cache driver: "local" (per-process LRU), "redis" (shared) or "none"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local")
+
+# Redis-protocol server used when CACHE_BACKEND=redis
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Cache value encoding: "auto" (orjson if installed, else json), "orjson", "msgpack" or "json"
+CACHE_SERIALIZER = os.getenv("CACHE_SERIALIZER", "auto")
+
+# Entries kept by the local cache driver
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# Most ids a batch get (GET /orders/batch, POST /customers/batch-get) may ask for
+BATCH_GET_MAX_IDS = int(os.getenv("BATCH_GET_MAX_IDS", "1000"))
+
+# Most sub-requests one POST /batch may run in its transaction
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+
+# Seconds customers and orders stay cached (writes invalidate them earlier)
+CACHE_ENTITY_TTL = float(os.getenv("CACHE_ENTITY_TTL", "300"))
+
+# Seconds a "not found" customer or order lookup stays cached (writes invalidate it earlier)
+CACHE_NEGATIVE_TTL = float(os.getenv("CACHE_NEGATIVE_TTL", "30"))
+
+# Dashboard queries a worker runs at once, each on a connection of the dashboard engine
+# (one part of each dashboard runs on the request's own connection)
+ANALYTICS_DASHBOARD_CONCURRENCY = int(os.getenv("ANALYTICS_DASHBOARD_CONCURRENCY", "3"))
+
+# Seconds analytics responses stay cached, i.e. their maximum staleness (0 disables)
+CACHE_ANALYTICS_TTL = float(os.getenv("CACHE_ANALYTICS_TTL", "5"))
+
+# Seconds a replica may hold a key's load lock before others load it themselves
+CACHE_LOCK_TIMEOUT = float(os.getenv("CACHE_LOCK_TIMEOUT", "5"))
+
+# Batch concurrent order creations into shared transactions (group commit)
+ORDER_GROUP_COMMIT = os.getenv("ORDER_GROUP_COMMIT", "false").lower() == "true"
+
+# Milliseconds the group-commit writer waits for more orders after the first one
+ORDER_GROUP_COMMIT_MAX_WAIT_MS = float(os.getenv("ORDER_GROUP_COMMIT_MAX_WAIT_MS", "2"))
+
+# Orders written per group-commit transaction at most
+ORDER_GROUP_COMMIT_MAX_ITEMS = int(os.getenv("ORDER_GROUP_COMMIT_MAX_ITEMS", "100"))
+
+# Seconds an Idempotency-Key is remembered, and its response replayed
+IDEMPOTENCY_KEY_TTL = float(os.getenv("IDEMPOTENCY_KEY_TTL", "86400"))
+
+# Completed idempotency keys kept in each worker's in-memory front cache
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+# Seconds a duplicate request waits for the original's response before returning 409
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "10"))
+
+# Worker processes of the production server (`radiant-graph start --workers` sets it)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# Database connections the server may hold across all workers (0 keeps SQLAlchemy's per-worker defaults)
+DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", "0"))
+
+# Pooled connections each worker opens before accepting traffic
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "2"))
+
+# Seconds a stopping worker lets in-flight requests finish before it is killed
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+
+# Seconds an idle keep-alive connection stays open
+SERVER_KEEPALIVE = int(os.getenv("SERVER_KEEPALIVE", "5"))
+
+# Limit concurrent requests per worker and shed load with 503 once they queue too long
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+
+# Requests a worker runs at once (0: the size of its connection pool, overflow included)
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "0"))
+
+# Fraction of those slots analytics requests may hold, keeping the rest for writes and reads
+ADMISSION_ANALYTICS_SHARE = float(os.getenv("ADMISSION_ANALYTICS_SHARE", "0.5"))
+
+# Seconds a write or read request may queue for a slot before it is rejected
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "1.0"))
+
+# Seconds an analytics request may queue for a slot before it is rejected
+ADMISSION_ANALYTICS_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_ANALYTICS_QUEUE_TIMEOUT", "0.25"))
+
+# Retry-After seconds sent with rejected requests
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+# Probe the database in the background so /health and /health/ready never do I/O
+HEALTH_PROBER = os.getenv("HEALTH_PROBER", "true").lower() == "true"
+
+# Seconds between background database probes (also how long /health/deep is cached)
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "5"))
+
+# Seconds a health check may spend connecting to or querying the database
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2"))
+
+# Statement timeout of the customer and order search routes, in milliseconds
+STATEMENT_TIMEOUT_SEARCH_MS = int(os.getenv("STATEMENT_TIMEOUT_SEARCH_MS", "3000"))
+
+# Statement timeout of the analytics routes, in milliseconds
+STATEMENT_TIMEOUT_ANALYTICS_MS = int(os.getenv("STATEMENT_TIMEOUT_ANALYTICS_MS", "10000"))
+
+# Cancel the running queries of GET requests whose client disconnects
+CANCEL_ON_DISCONNECT = os.getenv("CANCEL_ON_DISCONNECT", "true").lower() == "true"
+
+# Log a warning when a request holds a database connection longer than this, in milliseconds (0 turns it off)
+DB_HOLD_WARNING_MS = float(os.getenv("DB_HOLD_WARNING_MS", "200"))
+
+# Compress responses with gzip, or brotli when installed, if the client accepts it
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "true").lower() == "true"
+
+# Smallest response body worth compressing, in bytes
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
@@ -0,0 +1,22 @@
+"""
+Gunicorn settings for `radiant-graph start` (gunicorn -c python:app.gunicorn_conf).
+
+The app is imported once in the master (preload_app) and forked into WEB_CONCURRENCY
+uvicorn workers, which use uvloop and httptools when installed. On SIGTERM the master
+stops accepting connections and gives in-flight requests SERVER_GRACEFUL_TIMEOUT
+seconds to finish.
+"""
+
+from app import config
+
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = config.WEB_CONCURRENCY
+preload_app = True
+graceful_timeout = config.SERVER_GRACEFUL_TIMEOUT
+keepalive = config.SERVER_KEEPALIVE
+
+def post_fork(server, worker):
+    # Connections opened by the master while importing the app must not be shared
+    # with the workers; drop them without closing the master's sockets
+    from app.database import engine
+    engine.dispose(close=False)
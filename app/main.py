@@ -1,8 +1,16 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from . import models
-from .database import engine
-from .api import customers_router, health_router, orders_router, analytics_router
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.exc import OperationalError
+from . import config, models
+from .database import engine, warm_up_pool
+from .api import customers_router, health_router, orders_router, analytics_router, batch_router
+from .api.middleware import AdmissionMiddleware, CancelOnDisconnectMiddleware, CompressionMiddleware
+from .api.services.conditional import NotModified
+from .api.services.idempotency_service import IdempotencyError
+import importlib.util
+import os
+import sys
 import uvicorn
 import click
 
@@ -19,11 +27,75 @@ app.add_middleware(
     allow_headers=["*"], 
 )
 
+# Compress large responses for clients that accept gzip or brotli
+app.add_middleware(CompressionMiddleware)
+
+# Stop the queries of requests whose clients have gone away
+app.add_middleware(CancelOnDisconnectMiddleware)
+
+# Shed load with 503 before requests pile up waiting for database connections
+app.add_middleware(AdmissionMiddleware)
+
+# SQLSTATE of statements stopped by statement_timeout or a cancel request
+QUERY_CANCELED = "57014"
+
 # Include routers
 app.include_router(health_router)
 app.include_router(customers_router)
 app.include_router(orders_router)
 app.include_router(analytics_router)
+app.include_router(batch_router)
+
+@app.exception_handler(IdempotencyError)
+def idempotency_error_handler(request: Request, error: IdempotencyError):
+    return JSONResponse(status_code=error.status_code, content={"detail": error.detail})
+
+@app.exception_handler(NotModified)
+def not_modified_handler(request: Request, error: NotModified):
+    return Response(status_code=304, headers=error.headers)
+
+@app.exception_handler(OperationalError)
+def query_canceled_handler(request: Request, error: OperationalError):
+    """Answer 504 when a statement hit its route's timeout or was cancelled."""
+    if getattr(error.orig, "pgcode", None) != QUERY_CANCELED:
+        raise error
+    return JSONResponse(status_code=504, content={"detail": "Database query timed out"})
+
+@app.on_event("startup")
+def warm_up_connections():
+    """Connect to the database before the worker accepts its first request."""
+    if config.DB_POOL_WARMUP > 0:
+        warm_up_pool(config.DB_POOL_WARMUP)
+
+@app.on_event("startup")
+def start_health_prober():
+    """Keep a fresh database probe result for the health endpoints."""
+    if config.HEALTH_PROBER:
+        from .api.services.health_service import start_prober
+        start_prober()
+
+@app.on_event("startup")
+def start_change_listener():
+    """Apply other workers' writes to this worker's in-process caches."""
+    if config.CHANGE_LISTENER:
+        from .api.services.change_notifications import start_listener
+        start_listener(engine)
+
+@app.on_event("shutdown")
+def stop_change_listener():
+    from .api.services.change_notifications import stop_listener
+    stop_listener()
+
+@app.on_event("shutdown")
+def stop_health_prober():
+    from .api.services.health_service import stop_prober
+    stop_prober()
+
+@app.on_event("shutdown")
+def drain_order_pipeline():
+    """Commit the orders still queued for group commit before the worker exits."""
+    from .api.services.order_pipeline import reset_pipeline
+    reset_pipeline()
 
 def print_api_docs_urls():
     print("\n=== API Documentation URLs ===")
@@ -31,15 +103,41 @@ def print_api_docs_urls():
     print("ReDoc:      http://localhost:8000/redoc")
     print("=============================\n")
 
-def main():
-    """Production server entry point"""
+def main(workers: int = None, host: str = "0.0.0.0", port: int = 8000, server: str = "auto"):
+    """
+    Production server entry point.
+
+    Runs `workers` processes (default WEB_CONCURRENCY) under gunicorn with uvicorn
+    workers when gunicorn is installed, or under uvicorn's own supervisor otherwise.
+
+    Args:
+        workers: Number of worker processes
+        host: Interface to bind
+        port: Port to bind
+        server: "gunicorn", "uvicorn" or "auto"
+    """
+    workers = workers or config.WEB_CONCURRENCY
+    if server == "auto":
+        server = "gunicorn" if importlib.util.find_spec("gunicorn") else "uvicorn"
+    # Workers size their connection pools from it when they import the app
+    os.environ["WEB_CONCURRENCY"] = str(workers)
     print_api_docs_urls()
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if server == "gunicorn":
+        if importlib.util.find_spec("gunicorn") is None:
+            raise RuntimeError("--server gunicorn requires gunicorn")
+        os.execv(sys.executable, [
+            sys.executable, "-m", "gunicorn", "app.main:app",
+            "--config", "python:app.gunicorn_conf", "--bind", f"{host}:{port}"
+        ])
+    uvicorn.run(
+        "app.main:app", host=host, port=port, workers=workers,
+        timeout_keep_alive=config.SERVER_KEEPALIVE
+    )
 
 def dev():
     """Development server entry point"""
     print_api_docs_urls()
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
 
 @click.group()
 def cli():
@@ -47,15 +145,122 @@ def cli():
     pass
 
 @cli.command()
-def start():
+@click.option("--workers", type=int, default=None, help="Worker processes (default WEB_CONCURRENCY)")
+@click.option("--host", default="0.0.0.0", show_default=True)
+@click.option("--port", type=int, default=8000, show_default=True)
+@click.option("--server", type=click.Choice(["auto", "gunicorn", "uvicorn"]), default="auto", show_default=True,
+              help="Process manager; auto uses gunicorn when installed")
+def start(workers, host, port, server):
     """Start the production server"""
-    main()
+    main(workers=workers, host=host, port=port, server=server)
 
-@cli.command()
-def dev():
+@cli.command("dev")
+def dev_server():
     """Start the development server"""
     dev()
     
+@cli.command("rebuild-stats")
+def rebuild_stats():
+    """Rebuild the per-customer order counters, zip code customer sketches and geo rollups."""
+    from .database import SessionLocal
+    from .api.queries.customer_stats_queries import rebuild_customer_order_stats
+    from .api.queries.geo_rollup_queries import rebuild_geo_rollups
+    from .api.queries.zip_sketch_queries import rebuild_zip_customer_sketches
+    db = SessionLocal()
+    try:
+        count = rebuild_customer_order_stats(db)
+        sketches = rebuild_zip_customer_sketches(db)
+        rollups = rebuild_geo_rollups(db)
+    finally:
+        db.close()
+    click.echo(f"Rebuilt order counters for {count} customers, {sketches} zip code sketches and {rollups} geo rollups")
+
+@cli.command("purge-idempotency-keys")
+def purge_idempotency_keys():
+    """Delete expired idempotency keys (run periodically)."""
+    from .database import SessionLocal
+    from .api.queries.idempotency_queries import delete_expired_keys
+    db = SessionLocal()
+    try:
+        deleted = delete_expired_keys(db)
+    finally:
+        db.close()
+    click.echo(f"Deleted {deleted} expired idempotency keys")
+
+@cli.command()
+@click.option("--horizon-days", type=int, default=None, help="Keep orders newer than this hot (default ARCHIVE_HORIZON_DAYS)")
+@click.option("--batch-size", type=int, default=None, help="Orders moved per transaction (default ARCHIVE_BATCH_SIZE)")
+def archive(horizon_days, batch_size):
+    """Move orders older than the horizon into the archive tables."""
+    from .database import SessionLocal
+    from .api.services import archive_service
+    db = SessionLocal()
+    try:
+        archived = archive_service.archive_orders(db, horizon_days=horizon_days, batch_size=batch_size)
+    finally:
+        db.close()
+    click.echo(f"Archived {archived} orders")
+
+@cli.command("revenue-rollup")
+@click.option("--rebuild", is_flag=True, help="Re-sketch every day since the oldest order")
+def revenue_rollup(rebuild):
+    """Sketch completed days into the revenue rollups (run daily)."""
+    from .database import SessionLocal
+    from .api.queries import revenue_queries
+    from .api.services import revenue_service
+    db = SessionLocal()
+    try:
+        start = revenue_queries.get_first_order_day(db) if rebuild else None
+        days = revenue_service.refresh_revenue_rollups(db, start=start)
+    finally:
+        db.close()
+    click.echo(f"Rebuilt revenue rollups for {days} days")
+
+@cli.group()
+def partitions():
+    """Manage the monthly order partitions."""
+    pass
+
+@partitions.command("list")
+def list_partitions():
+    """List the partitions attached to the orders table."""
+    from .database import SessionLocal
+    from .api.queries import partition_queries
+    db = SessionLocal()
+    try:
+        for partition in partition_queries.list_partitions(db, "orders"):
+            click.echo(f"{partition['name']}: {partition['bound']}")
+    finally:
+        db.close()
+
+@partitions.command("create")
+@click.option("--months-ahead", default=3, show_default=True, help="Number of future months to cover")
+def create_partitions(months_ahead):
+    """Create monthly partitions from the current month onwards."""
+    from datetime import date
+    from .database import SessionLocal
+    from .api.queries import partition_queries
+    db = SessionLocal()
+    try:
+        created = partition_queries.create_monthly_partitions(db, date.today(), months_ahead + 1)
+    finally:
+        db.close()
+    click.echo(f"Created {len(created)} partitions: {', '.join(created) or 'none'}")
+
+@partitions.command("detach")
+@click.option("--before", required=True, type=click.DateTime(formats=["%Y-%m"]), help="Detach months before YYYY-MM")
+@click.option("--drop", is_flag=True, help="Drop the detached tables")
+def detach_partitions(before, drop):
+    """Detach monthly partitions older than the given month for archival."""
+    from .database import SessionLocal
+    from .api.queries import partition_queries
+    db = SessionLocal()
+    try:
+        detached = partition_queries.detach_partitions_before(db, before.date(), drop=drop)
+    finally:
+        db.close()
+    click.echo(f"Detached {len(detached)} partitions: {', '.join(detached) or 'none'}")
+
 @cli.command()
 def test():
     """Run the test suite."""
@@ -1,10 +1,40 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, UniqueConstraint, DateTime, Float
+from sqlalchemy import BigInteger, Column, Integer, SmallInteger, String, LargeBinary, ForeignKey, ForeignKeyConstraint, Boolean, UniqueConstraint, DateTime, Date, Float, Numeric, Index, Computed, DDL, event, text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import relationship
 from .database import Base
+from . import config
 from datetime import datetime
+import re
 
 # File to define SQLAlchemy models for the database
 
+# Tables range-partitioned by month on order_date. Each gets a DEFAULT partition on
+# creation so inserts never fail; monthly partitions are created ahead of time by
+# `radiant-graph partitions create` (see app/api/queries/partition_queries.py).
+PARTITIONED_TABLES = ("order_shipping_addresses", "orders")
+
+if not re.fullmatch(r"[A-Za-z0-9_+\-/]+", config.BUSINESS_TIMEZONE):
+    raise ValueError(f"Invalid BUSINESS_TIMEZONE: {config.BUSINESS_TIMEZONE!r}")
+
+def business_time_sql(field: str, column: str = "order_date") -> str:
+    """SQL extracting a date part of a naive-UTC timestamp column in BUSINESS_TIMEZONE."""
+    return f"CAST(extract({field} FROM {_business_local_sql(column)}) AS smallint)"
+
+def business_date_sql(column: str = "order_date") -> str:
+    """SQL of the BUSINESS_TIMEZONE calendar day of a naive-UTC timestamp column."""
+    return f"CAST({_business_local_sql(column)} AS date)"
+
+def _business_local_sql(column: str) -> str:
+    return f"(({column} AT TIME ZONE 'UTC') AT TIME ZONE '{config.BUSINESS_TIMEZONE}')"
+
+# Stored generated columns, so hour/day-of-week analytics group by an indexed column.
+# Day of week follows the API convention: 0 = Monday, 6 = Sunday.
+ORDER_HOUR_SQL = business_time_sql("hour")
+ORDER_DOW_SQL = f"{business_time_sql('isodow')} - 1"
+
+# Server default of naive-UTC timestamp columns
+UTC_NOW_DEFAULT = text("(now() at time zone 'utc')")
+
 class Customer(Base):
     """SQLAlchemy model representing a customer in the system.
     
@@ -18,6 +48,9 @@ class Customer(Base):
     last_name = Column(String, nullable=False)  
     email = Column(String, unique=True, index=True, nullable=False)
     telephone = Column(String, unique=True, index=True, nullable=False)
+    # Bumped whenever the customer's representation changes (new addresses or orders)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, server_default=UTC_NOW_DEFAULT)
     
     # Relationships
     billing_addresses = relationship("Address", back_populates="billing_customer", 
@@ -25,6 +58,7 @@ class Customer(Base):
     shipping_addresses = relationship("Address", back_populates="shipping_customer",
                                     foreign_keys="Address.shipping_customer_id")
     orders = relationship("Order", back_populates="customer")
+    order_stats = relationship("CustomerOrderStats", back_populates="customer", uselist=False)
 
     __table_args__ = (
         UniqueConstraint('email', name='uq_customer_email'),
@@ -64,12 +98,14 @@ class OrderShippingAddress(Base):
     """SQLAlchemy model representing shipping addresses for an order.
     
     This model allows multiple shipping addresses per order, which is useful
-    when items need to be delivered to different locations.
+    when items need to be delivered to different locations. Rows are partitioned
+    alongside their order, so they carry a copy of the order's order_date.
     """
     __tablename__ = "order_shipping_addresses"
 
-    id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    order_id = Column(Integer, nullable=False)
+    order_date = Column(DateTime, primary_key=True)  # Partition key, copied from the order
     address_id = Column(Integer, ForeignKey("addresses.id"), nullable=False)
     sequence = Column(Integer, nullable=False)  # Order of delivery
     
@@ -77,24 +113,227 @@ class OrderShippingAddress(Base):
     order = relationship("Order", back_populates="shipping_addresses")
     address = relationship("Address")
 
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["order_id", "order_date"], ["orders.id", "orders.order_date"]
+        ),
+        {"postgresql_partition_by": "RANGE (order_date)"},
+    )
+
 class Order(Base):
     """SQLAlchemy model representing a customer order in the system.
     
     This model stores order information including the customer, addresses, amount,
-    and order status. It supports both in-store and online orders.
+    and order status. It supports both in-store and online orders. The table is
+    range-partitioned by order_date, which is therefore part of the primary key.
     """
     __tablename__ = "orders"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     customer_id = Column(Integer, ForeignKey("customers.id"), nullable=False)
-    order_date = Column(DateTime, default=datetime.utcnow, nullable=False)
-    total_amount = Column(Float, nullable=False) 
+    order_date = Column(DateTime, primary_key=True, default=datetime.utcnow)
+    total_amount = Column(Numeric(12, 2), nullable=False)
     status = Column(String, nullable=False)  # "pending", "completed", "cancelled"
     order_type = Column(String, nullable=False)  # "in_store" or "online"
+    order_hour = Column(SmallInteger, Computed(ORDER_HOUR_SQL, persisted=True), index=True)
+    order_dow = Column(SmallInteger, Computed(ORDER_DOW_SQL, persisted=True), index=True)
+    # Row version for ETags; orders don't change once placed, so it stays 1 for now
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relationships
     customer = relationship("Customer", back_populates="orders")
     billing_address_id = Column(Integer, ForeignKey("addresses.id"), nullable=False)
     shipping_addresses = relationship("OrderShippingAddress", back_populates="order")
     
-    billing_address = relationship("Address", foreign_keys=[billing_address_id]) 
\ No newline at end of file
+    billing_address = relationship("Address", foreign_keys=[billing_address_id])
+
+    __table_args__ = (
+        {"postgresql_partition_by": "RANGE (order_date)"},
+    )
+
+class CustomerOrderStats(Base):
+    """SQLAlchemy model holding denormalized order counters for a customer.
+    
+    One row per customer with at least one order. The counters are maintained by the
+    order-creation path in the same transaction as the order itself and can be rebuilt
+    from the orders table at any time.
+    """
+    __tablename__ = "customer_order_stats"
+
+    customer_id = Column(Integer, ForeignKey("customers.id"), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    in_store_order_count = Column(Integer, nullable=False, default=0, index=True)
+    online_order_count = Column(Integer, nullable=False, default=0)
+    total_spend = Column(Numeric(14, 2), nullable=False, default=0, index=True)
+    last_order_at = Column(DateTime)
+
+    # Relationships
+    customer = relationship("Customer", back_populates="order_stats")
+
+class ArchivedOrder(Base):
+    """SQLAlchemy model representing an order moved out of the hot orders table.
+    
+    Mirrors the Order columns so archived orders serialize with the same schema.
+    Rows are written by the archival pipeline (app/api/services/archive_service.py)
+    and are read only when a lookup misses the hot table.
+    """
+    __tablename__ = "orders_archive"
+
+    id = Column(Integer, primary_key=True)
+    customer_id = Column(Integer, ForeignKey("customers.id"), nullable=False, index=True)
+    order_date = Column(DateTime, nullable=False)
+    total_amount = Column(Numeric(12, 2), nullable=False)
+    status = Column(String, nullable=False)
+    order_type = Column(String, nullable=False)
+    billing_address_id = Column(Integer, ForeignKey("addresses.id"), nullable=False)
+    order_hour = Column(SmallInteger, Computed(ORDER_HOUR_SQL, persisted=True))
+    order_dow = Column(SmallInteger, Computed(ORDER_DOW_SQL, persisted=True))
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Relationships
+    billing_address = relationship("Address", foreign_keys=[billing_address_id])
+    shipping_addresses = relationship("ArchivedOrderShippingAddress", back_populates="order")
+
+class ArchivedOrderShippingAddress(Base):
+    """SQLAlchemy model representing the shipping addresses of an archived order."""
+    __tablename__ = "order_shipping_addresses_archive"
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders_archive.id"), nullable=False, index=True)
+    order_date = Column(DateTime, nullable=False)
+    address_id = Column(Integer, ForeignKey("addresses.id"), nullable=False)
+    sequence = Column(Integer, nullable=False)
+
+    # Relationships
+    order = relationship("ArchivedOrder", back_populates="shipping_addresses")
+    address = relationship("Address")
+
+class ArchivedOrderRollup(Base):
+    """SQLAlchemy model holding pre-aggregated order counts for archived orders.
+    
+    Counts are bucketed per day and per analytics dimension ("billing_zip",
+    "shipping_zip", "hour", "dow") so analytics can add archived history to the
+    live aggregates without reading the archive tables.
+    """
+    __tablename__ = "order_archive_rollups"
+
+    bucket_date = Column(Date, primary_key=True)
+    dimension = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_order_archive_rollups_dimension_bucket", "dimension", "bucket_date"),
+    )
+
+class OrderRevenueRollup(Base):
+    """SQLAlchemy model holding per-day revenue aggregates and t-digest sketches.
+    
+    One row per day, revenue dimension ("zip", "hour", "day_of_week", "order_type",
+    "status") and key, covering hot and archived orders. Count and revenue are exact;
+    the digest columns hold the centroids of a t-digest over order values so
+    percentiles over any window can be answered by merging sketches. Rows are written
+    by `radiant-graph revenue-rollup` for completed days only.
+    """
+    __tablename__ = "order_revenue_rollups"
+
+    bucket_date = Column(Date, primary_key=True)
+    dimension = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    order_count = Column(Integer, nullable=False)
+    revenue = Column(Numeric(14, 2), nullable=False)
+    min_amount = Column(Numeric(12, 2), nullable=False)
+    max_amount = Column(Numeric(12, 2), nullable=False)
+    digest_means = Column(ARRAY(Float), nullable=False)
+    digest_weights = Column(ARRAY(Float), nullable=False)
+
+    __table_args__ = (
+        Index("ix_order_revenue_rollups_dimension_bucket", "dimension", "bucket_date"),
+    )
+
+class ZipCustomerSketch(Base):
+    """SQLAlchemy model holding a HyperLogLog sketch of the customers ordering per zip and day.
+    
+    One row per day, address type ("billing" or "shipping") and zip code, holding a
+    HyperLogLog sketch (see app/api/services/hyperloglog.py) updated by the
+    order-creation path: sparse `entries` while small, dense `registers` (NULL until
+    then, `entries` emptied) once past SPARSE_MAX_ENTRIES. Sketches of several days
+    merge into a distinct customer count for any window without reading the orders.
+    """
+    __tablename__ = "zip_customer_sketches"
+
+    bucket_date = Column(Date, primary_key=True)
+    address_type = Column(String, primary_key=True)
+    zip_code = Column(String, primary_key=True)
+    entries = Column(ARRAY(Integer), nullable=False)
+    registers = Column(LargeBinary)
+
+    __table_args__ = (
+        Index("ix_zip_customer_sketches_type_bucket", "address_type", "bucket_date"),
+    )
+
+class OrderGeoRollup(Base):
+    """SQLAlchemy model holding all-time order counts per geographic area.
+    
+    Counts per address type ("billing" or "shipping"), level ("state", "city",
+    "zip3", "zip"), parent area and key, maintained by the order-creation path in the
+    same transaction as the order. The parent enables drill-down: cities and zip3
+    prefixes belong to a state, zips to a zip3 prefix, and states to '' (national).
+    Each area's count is split over GEO_ROLLUP_SHARDS rows, one picked at random per
+    write, so concurrent orders in the same state rarely wait on one row lock; an
+    area's count is the sum over its shards. `order_count` is deliberately not
+    indexed, so its updates are HOT and leave the indexes alone.
+    """
+    __tablename__ = "order_geo_rollups"
+
+    address_type = Column(String, primary_key=True)
+    level = Column(String, primary_key=True)
+    parent = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    shard = Column(SmallInteger, primary_key=True, default=0)
+    order_count = Column(Integer, nullable=False, default=0)
+
+class IdempotencyKey(Base):
+    """SQLAlchemy model remembering the response to a request sent with an Idempotency-Key.
+    
+    One row per endpoint scope and client key, claimed in the same transaction as the
+    request's writes. `response` is NULL until the response has been stored, and the row
+    is ignored once `expires_at` has passed (expired rows are purged by
+    `radiant-graph purge-idempotency-keys`).
+    """
+    __tablename__ = "idempotency_keys"
+
+    scope = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    response = Column(JSONB)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class TableVersion(Base):
+    """SQLAlchemy model counting the changes to a table, for analytics ETags.
+    
+    Each write bumps one of TABLE_VERSION_SHARDS rows of its table, picked at random, in
+    the writer's transaction, so concurrent writers rarely wait on the same row lock.
+    A table's version is the sum over its shards and only ever grows.
+    """
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    shard = Column(SmallInteger, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    changed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+for _table in PARTITIONED_TABLES:
+    event.listen(
+        Base.metadata.tables[_table],
+        "after_create",
+        DDL(f"CREATE TABLE IF NOT EXISTS {_table}_default PARTITION OF {_table} DEFAULT")
+    )
+
+# Leave room on each page for the counters' HOT updates
+event.listen(
+    OrderGeoRollup.__table__,
+    "after_create",
+    DDL("ALTER TABLE order_geo_rollups SET (fillfactor = 70)")
+)
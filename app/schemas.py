@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List, Annotated, Dict
+from pydantic import BaseModel, EmailStr, Field, condecimal
+from typing import Any, Optional, List, Annotated, Dict
 from datetime import datetime
+from decimal import Decimal
 
 class AddressBase(BaseModel):
     """Base Pydantic model for address data.
@@ -65,7 +66,7 @@ class OrderBase(BaseModel):
     
     This model defines the common fields required for order creation and validation.
     """
-    total_amount: float  
+    total_amount: condecimal(max_digits=12, decimal_places=2)  # Order value in dollars and cents
     status: str  # Order status (e.g., "pending", "completed", "cancelled")
     billing_address_id: int  
     order_type: str  # "in_store" or "online"
@@ -81,6 +82,7 @@ class Order(OrderBase):
     order_date: datetime  # When the order was placed
     billing_address: Address  # Billing address details
     shipping_addresses: List[OrderShippingAddress]  # List of shipping addresses
+    version: int = 1  # Row version, part of the order's ETag
 
     class Config:
         orm_mode = True
@@ -91,14 +93,61 @@ class Customer(CustomerBase):
     billing_addresses: List[Address] = []  # List of billing addresses
     shipping_addresses: List[Address] = []  # List of shipping addresses
     orders: List[Order] = []  # List of customer's orders
+    version: int = 1  # Row version, bumped when addresses or orders are added
+    updated_at: Optional[datetime] = None  # When the customer last changed
 
     class Config:
         orm_mode = True
 
+class BatchGetRequest(BaseModel):
+    """Pydantic model for fetching several entities by id."""
+    ids: List[int]  # Ids to fetch, in the order the results should come back
+
+class CustomerBatch(BaseModel):
+    """Pydantic model for the customers found by a batch get."""
+    customers: List[Customer]  # Customers found, in the order asked for
+    missing: List[int]  # Requested ids that don't exist
+
+class OrderBatch(BaseModel):
+    """Pydantic model for the orders found by a batch get."""
+    orders: List[Order]  # Orders found, in the order asked for
+    missing: List[int]  # Requested ids that don't exist
+
+class BatchOperation(BaseModel):
+    """Pydantic model for one sub-request of a batch."""
+    method: str = Field("GET", regex="^(GET|POST|PUT|PATCH|DELETE)$")  # HTTP method
+    path: str  # Path and query string, e.g. "/customers/$0.id/addresses/?is_billing=true"
+    body: Any = None  # JSON body, if any
+
+class BatchRequest(BaseModel):
+    """Pydantic model for a batch of sub-requests run in one transaction."""
+    requests: List[BatchOperation]  # Run in order; later ones may refer to earlier results
+
+class BatchResult(BaseModel):
+    """Pydantic model for the response to one sub-request."""
+    status: int  # HTTP status code
+    body: Any = None  # Decoded JSON body
+
+class BatchResponse(BaseModel):
+    """Pydantic model for the responses to a batch."""
+    committed: bool  # Whether the batch's writes were committed (all succeeded)
+    results: List[BatchResult]  # One per sub-request run, stopping at the first failure
+
 class ZipCodeAnalytics(BaseModel):
     """Pydantic model for zip code-based order analytics."""
     zip_code: str  # Zip code being analyzed
     order_count: int  # Number of orders in this zip code
+    unique_customers: int  # Distinct customers, HyperLogLog estimate (~0.8% standard error)
+
+class GeoAnalytics(BaseModel):
+    """Pydantic model for order analytics of one geographic area."""
+    level: str  # state, city, zip3 or zip
+    key: str  # State code, city name, 3-digit zip prefix or 5-digit zip
+    parent: Optional[str]  # Enclosing area to drill up to (None for states)
+    order_count: int  # Number of orders in this area
+
+    class Config:
+        orm_mode = True
 
 class TimeOfDayAnalytics(BaseModel):
     """Pydantic model for time-of-day based order analytics."""
@@ -119,4 +168,21 @@ class TopInStoreCustomerAnalytics(BaseModel):
     in_store_order_count: int  # Number of in-store orders by this customer
 
     class Config:
-        orm_mode = True 
\ No newline at end of file
+        orm_mode = True
+
+class AnalyticsDashboard(BaseModel):
+    """Pydantic model for the combined analytics dashboard."""
+    zip_codes: List[ZipCodeAnalytics]  # Order counts by zip code
+    time_of_day: List[TimeOfDayAnalytics]  # Busiest hours
+    day_of_week: List[DayOfWeekAnalytics]  # Busiest days of the week
+    top_in_store_customers: List[TopInStoreCustomerAnalytics]  # Customers with the most in-store orders
+
+class RevenueAnalytics(BaseModel):
+    """Pydantic model for revenue analytics of one group of orders."""
+    group: str  # Zip code, hour, day of week, order type, status or date
+    order_count: int  # Number of orders in this group
+    total_revenue: Decimal  # Sum of order totals
+    average_order_value: Decimal  # Mean order total
+    p50: Decimal  # Median order value (approximate)
+    p90: Decimal  # 90th percentile order value (approximate)
+    p99: Decimal  # 99th percentile order value (approximate)
@@ -0,0 +1,103 @@
+"""Benchmark order creation with and without the group-commit pipeline.
+
+Creates orders from a number of concurrent client threads, each with its own session,
+first one transaction per order and then through the group-commit pipeline, and reports
+throughput and p50/p99 latency of each. Run it against a scratch database with customers
+with addresses (create_mock_data.py):
+
+    python scripts/benchmarks/group_commit.py --threads 32 --orders 5000 --max-wait-ms 2
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import text
+from app import config, schemas
+from app.database import SessionLocal
+from app.api.services import order_pipeline, orders_service
+
+def run(threads: int, orders: int, addresses: list):
+    """
+    Create `orders` orders from `threads` threads; returns (elapsed seconds, latencies).
+
+    Each thread orders for its own customer, so per-customer row locks don't serialize them.
+    """
+    latencies = []
+    lock = threading.Lock()
+
+    def client(count: int, customer_id: int, address_id: int):
+        order = schemas.OrderCreate(
+            total_amount=100, status="completed", order_type="in_store", billing_address_id=address_id,
+            shipping_addresses=[{"address_id": address_id, "sequence": 1}]
+        )
+        db = SessionLocal()
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                orders_service.create_order(db, order, customer_id)
+                db.rollback()
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+        finally:
+            db.close()
+
+    workers = [
+        threading.Thread(target=client, args=(
+            orders // threads + (index < orders % threads), *addresses[index % len(addresses)]
+        ))
+        for index in range(threads)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - started, latencies
+
+def report(label: str, elapsed: float, latencies: list):
+    cuts = statistics.quantiles(latencies, n=100)
+    print(f"{label:>14}: {len(latencies) / elapsed:8.0f} orders/s  "
+          f"p50 {cuts[49] * 1000:6.2f} ms  p99 {cuts[98] * 1000:6.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--max-wait-ms", type=float, default=config.ORDER_GROUP_COMMIT_MAX_WAIT_MS)
+    parser.add_argument("--max-items", type=int, default=config.ORDER_GROUP_COMMIT_MAX_ITEMS)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    addresses = [tuple(row) for row in db.execute(text("""
+        SELECT DISTINCT ON (customer_id) customer_id, id
+        FROM (SELECT coalesce(billing_customer_id, shipping_customer_id) AS customer_id, id FROM addresses) a
+        WHERE customer_id IS NOT NULL
+        ORDER BY customer_id, id
+        LIMIT :threads
+    """), {"threads": args.threads})]
+    db.close()
+    if not addresses:
+        raise SystemExit("The benchmark needs at least one customer address (run create_mock_data.py)")
+    # Warm up the in-process analytics caches, which load on the first order
+    run(1, 1, addresses)
+
+    config.ORDER_GROUP_COMMIT = False
+    report("per order", *run(args.threads, args.orders, addresses))
+
+    config.ORDER_GROUP_COMMIT = True
+    config.ORDER_GROUP_COMMIT_MAX_WAIT_MS = args.max_wait_ms
+    config.ORDER_GROUP_COMMIT_MAX_ITEMS = args.max_items
+    elapsed, latencies = run(args.threads, args.orders, addresses)
+    pipeline = order_pipeline.get_pipeline(SessionLocal(), orders_service.create_orders)
+    report("group commit", elapsed, latencies)
+    print(f"{pipeline.batches} transactions, {len(latencies) / max(pipeline.batches, 1):.1f} orders each")
+    order_pipeline.reset_pipeline()
+
+if __name__ == "__main__":
+    main()
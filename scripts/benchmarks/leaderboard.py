@@ -0,0 +1,51 @@
+"""Benchmark the in-memory in-store leaderboard.
+
+Feeds synthetic in-store orders from a large, skewed customer population through the
+leaderboard, then reports write and read latency per window and the number of counters
+held, which stays bounded by 30 days * LEADERBOARD_CAPACITY:
+
+    python scripts/benchmarks/leaderboard.py --customers 5000000 --orders 3000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app import config
+from app.api.services.leaderboard import Leaderboard, WINDOWS
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=1_000_000)
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--reads", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    board = Leaderboard(config.LEADERBOARD_CAPACITY, config.LEADERBOARD_TOP_SIZE)
+    start = date.today() - timedelta(days=29)
+    per_day = args.orders // 30 or 1
+    started = time.perf_counter()
+    for index in range(args.orders):
+        # Pareto-distributed customers: a few regulars, a long tail of one-off visitors
+        customer_id = min(int(rng.paretovariate(1.2)), args.customers)
+        board.record(customer_id, start + timedelta(days=min(index // per_day, 29)))
+    elapsed = time.perf_counter() - started
+    print(f"record: {elapsed / args.orders * 1e6:.2f} us/order")
+
+    counters = sum(len(summary.counts) for summary in board.days.values())
+    print(f"counters held: {counters} (bound {30 * config.LEADERBOARD_CAPACITY})")
+    for window in WINDOWS:
+        started = time.perf_counter()
+        for _ in range(args.reads):
+            board.top(window, 10)
+        elapsed = time.perf_counter() - started
+        print(f"top({window!r}, 10): {elapsed / args.reads * 1e6:.2f} us/read")
+
+if __name__ == "__main__":
+    main()
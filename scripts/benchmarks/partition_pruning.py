@@ -0,0 +1,105 @@
+"""Benchmark time-window analytics queries against the partitioned orders table.
+
+Runs EXPLAIN (ANALYZE, BUFFERS) for the analytics queries with and without an
+order_date window and reports execution time and how many partitions each plan
+touched. Optionally seeds synthetic orders first, e.g. on a scratch database:
+
+    python scripts/benchmarks/partition_pruning.py --seed-rows 200000000 --months 36
+"""
+
+import argparse
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from app.database import SessionLocal
+from app.api.queries import analytics_queries, partition_queries
+
+def seed(db, rows: int, months: int):
+    """Insert `rows` synthetic orders spread evenly over the last `months` months."""
+    start = partition_queries.add_months(date.today(), -months)
+    partition_queries.create_monthly_partitions(db, start, months + 1)
+    customer_id = db.execute(text("SELECT min(id) FROM customers")).scalar()
+    address_id = db.execute(text("SELECT min(id) FROM addresses")).scalar()
+    if customer_id is None or address_id is None:
+        raise SystemExit("Seeding needs at least one customer and address (run create_mock_data.py)")
+    span = int((datetime.utcnow() - datetime.combine(start, datetime.min.time())).total_seconds())
+    batch = 1_000_000
+    for offset in range(0, rows, batch):
+        count = min(batch, rows - offset)
+        db.execute(text("""
+            WITH new_orders AS (
+                INSERT INTO orders (customer_id, order_date, total_amount, status, order_type, billing_address_id)
+                SELECT :customer_id,
+                       now() at time zone 'utc' - make_interval(secs => (random() * :span)::int),
+                       round((random() * 990 + 10)::numeric, 2),
+                       'completed',
+                       CASE WHEN random() < 0.6 THEN 'in_store' ELSE 'online' END,
+                       :address_id
+                FROM generate_series(1, :count)
+                RETURNING id, order_date
+            )
+            INSERT INTO order_shipping_addresses (order_id, order_date, address_id, sequence)
+            SELECT id, order_date, :address_id, 1 FROM new_orders
+        """), {"customer_id": customer_id, "address_id": address_id, "span": span, "count": count})
+        db.commit()
+        print(f"Seeded {offset + count}/{rows} orders")
+    db.execute(text("ANALYZE orders"))
+    db.execute(text("ANALYZE order_shipping_addresses"))
+    db.commit()
+
+def relations(plan: dict) -> set:
+    """Collect every relation scanned anywhere in an EXPLAIN JSON plan."""
+    found = set()
+    if "Relation Name" in plan:
+        found.add(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found |= relations(child)
+    return found
+
+def explain(db, query) -> tuple:
+    """Return (execution ms, partitions scanned) for an ORM query."""
+    compiled = query.statement.compile(dialect=postgresql.dialect())
+    cursor = db.connection().connection.cursor()
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + str(compiled), compiled.params)
+    result = cursor.fetchone()[0][0]
+    scanned = {name for name in relations(result["Plan"]) if name.startswith(("orders", "order_shipping"))}
+    return result["Execution Time"], len(scanned)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed-rows", type=int, default=0, help="Synthetic orders to insert first")
+    parser.add_argument("--months", type=int, default=24, help="Months of history to spread seeded rows over")
+    parser.add_argument("--window-days", type=int, default=7, help="Width of the pruned time window")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.seed_rows:
+            seed(db, args.seed_rows, args.months)
+
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=args.window_days)
+        cases = {
+            "zip (billing)": lambda **w: analytics_queries.get_orders_by_zip_code_query(db, "billing", "desc", **w),
+            "zip (shipping)": lambda **w: analytics_queries.get_orders_by_zip_code_query(db, "shipping", "desc", **w),
+            "time of day": lambda **w: analytics_queries.get_orders_by_time_of_day_query(db, **w),
+            "day of week": lambda **w: analytics_queries.get_orders_by_day_of_week_query(db, **w),
+        }
+        total_orders = db.execute(text("SELECT count(*) FROM orders")).scalar()
+        print(f"orders: {total_orders} rows, window: last {args.window_days} days\n")
+        print(f"{'query':<16} {'full ms':>10} {'parts':>6} {'window ms':>10} {'parts':>6}")
+        for name, build in cases.items():
+            full_ms, full_parts = explain(db, build())
+            window_ms, window_parts = explain(db, build(start_date=start_date, end_date=end_date))
+            print(f"{name:<16} {full_ms:>10.1f} {full_parts:>6} {window_ms:>10.1f} {window_parts:>6}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
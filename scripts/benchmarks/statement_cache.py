@@ -0,0 +1,80 @@
+"""Benchmark the hot lookups as cached lambda statements against per-call Query construction.
+
+Runs each lookup repeatedly on one session, first built with `db.query(...)` on every
+call as before and then through the lambda statements in the query layer, and reports
+the process CPU time per lookup of each (the database's own time is not included).
+Run it against a database with customers, addresses and orders (create_mock_data.py):
+
+    python scripts/benchmarks/statement_cache.py --lookups 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import exists, or_
+from app import models
+from app.database import SessionLocal
+from app.api.queries import customer_queries, orders_queries
+
+def query_lookups(customer, order_id):
+    """The lookups as they were written before, building a Query on every call."""
+    return {
+        "get_customer": lambda db: db.query(models.Customer).filter(models.Customer.id == customer.id).first(),
+        "customer_exists": lambda db: db.query(exists().where(models.Customer.id == customer.id)).scalar(),
+        "get_customer_by_email": lambda db: db.query(models.Customer).filter(
+            models.Customer.email == customer.email).first(),
+        "get_customer_by_telephone": lambda db: db.query(models.Customer).filter(
+            models.Customer.telephone == customer.telephone).first(),
+        "get_customer_addresses": lambda db: db.query(models.Address).filter(or_(
+            models.Address.billing_customer_id == customer.id,
+            models.Address.shipping_customer_id == customer.id
+        )).all(),
+        "get_order_query": lambda db: db.query(models.Order).filter(models.Order.id == order_id).first(),
+    }
+
+def cached_lookups(customer, order_id):
+    return {
+        "get_customer": lambda db: customer_queries.get_customer(db, customer.id),
+        "customer_exists": lambda db: customer_queries.customer_exists(db, customer.id),
+        "get_customer_by_email": lambda db: customer_queries.get_customer_by_email(db, customer.email),
+        "get_customer_by_telephone": lambda db: customer_queries.get_customer_by_telephone(db, customer.telephone),
+        "get_customer_addresses": lambda db: customer_queries.get_customer_addresses(db, customer.id),
+        "get_order_query": lambda db: orders_queries.get_order_query(db, order_id),
+    }
+
+def cpu_per_lookup(db, lookup, count: int) -> float:
+    """Process CPU microseconds per call of `lookup`, after warming its caches."""
+    for _ in range(100):
+        lookup(db)
+    started = time.process_time()
+    for _ in range(count):
+        lookup(db)
+    return (time.process_time() - started) / count * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lookups", type=int, default=5000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        order = db.query(models.Order).filter(models.Order.customer_id.isnot(None)).first()
+        if order is None:
+            raise SystemExit("The benchmark needs at least one order (run create_mock_data.py)")
+        customer = order.customer
+        before = query_lookups(customer, order.id)
+        after = cached_lookups(customer, order.id)
+        print(f"{'lookup':>26}  {'query':>9}  {'cached':>9}")
+        for name in before:
+            query_us = cpu_per_lookup(db, before[name], args.lookups)
+            cached_us = cpu_per_lookup(db, after[name], args.lookups)
+            print(f"{name:>26}  {query_us:7.1f}us  {cached_us:7.1f}us  {query_us / cached_us:4.2f}x")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
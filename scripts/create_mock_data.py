@@ -11,6 +11,11 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.models import Base, Customer, Address, Order, OrderShippingAddress
 from app.database import get_db
+from app.api.queries.customer_stats_queries import rebuild_customer_order_stats
+from app.api.queries.revenue_queries import get_first_order_day
+from app.api.queries.zip_sketch_queries import rebuild_zip_customer_sketches
+from app.api.queries.geo_rollup_queries import rebuild_geo_rollups
+from app.api.services.revenue_service import refresh_revenue_rollups
 
 # Mock data
 CITIES = {
@@ -107,6 +112,7 @@ def create_mock_order(session: Session, customer: Customer, billing_address: Add
     for idx, shipping_addr in enumerate(shipping_addresses, 1):
         order_shipping = OrderShippingAddress(
             order_id=order.id,
+            order_date=order.order_date,
             address_id=shipping_addr.id,
             sequence=idx
         )
@@ -147,6 +153,12 @@ def create_mock_data():
             
             print(f"Created customer {i+1}/50 with {num_orders} orders and {num_shipping_addresses} shipping addresses")
         
+        # Orders are inserted directly, so derive the customer counters afterwards
+        rebuild_customer_order_stats(session)
+        rebuild_zip_customer_sketches(session)
+        rebuild_geo_rollups(session)
+        refresh_revenue_rollups(session, start=get_first_order_day(session))
+        
         print("Mock data creation completed successfully!")
         
     except Exception as e:
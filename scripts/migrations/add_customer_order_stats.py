@@ -0,0 +1,42 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.database import SQLALCHEMY_DATABASE_URL
+from app.api.queries.customer_stats_queries import rebuild_customer_order_stats
+
+def upgrade():
+    """Add customer_order_stats table and backfill it from existing orders."""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS customer_order_stats (
+                customer_id INTEGER PRIMARY KEY REFERENCES customers(id),
+                order_count INTEGER NOT NULL DEFAULT 0,
+                in_store_order_count INTEGER NOT NULL DEFAULT 0,
+                online_order_count INTEGER NOT NULL DEFAULT 0,
+                total_spend DOUBLE PRECISION NOT NULL DEFAULT 0,
+                last_order_at TIMESTAMP
+            )
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_customer_order_stats_in_store_order_count
+            ON customer_order_stats (in_store_order_count)
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_customer_order_stats_total_spend
+            ON customer_order_stats (total_spend)
+        """))
+
+    session = sessionmaker(bind=engine)()
+    try:
+        rebuild_customer_order_stats(session)
+    finally:
+        session.close()
+
+def downgrade():
+    """Remove customer_order_stats table."""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS customer_order_stats"))
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,29 @@
+from sqlalchemy import create_engine, text
+from app.database import SQLALCHEMY_DATABASE_URL
+
+def upgrade():
+    """Add idempotency_keys table."""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                scope VARCHAR NOT NULL,
+                key VARCHAR NOT NULL,
+                fingerprint VARCHAR(64) NOT NULL,
+                response JSONB,
+                expires_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                PRIMARY KEY (scope, key)
+            )
+        """))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_idempotency_keys_expires_at ON idempotency_keys (expires_at)
+        """))
+
+def downgrade():
+    """Remove idempotency_keys table."""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS idempotency_keys"))
+
+if __name__ == "__main__":
+    upgrade()
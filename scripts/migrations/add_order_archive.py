@@ -0,0 +1,26 @@
+from sqlalchemy import create_engine, text
+from app import models
+from app.database import SQLALCHEMY_DATABASE_URL
+
+ARCHIVE_TABLES = [
+    models.ArchivedOrder.__table__,
+    models.ArchivedOrderShippingAddress.__table__,
+    models.ArchivedOrderRollup.__table__,
+]
+
+def upgrade():
+    """Add the order archive tables and their daily analytics rollups."""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        for table in ARCHIVE_TABLES:
+            table.create(conn, checkfirst=True)
+
+def downgrade():
+    """Remove the order archive tables."""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        for table in reversed(ARCHIVE_TABLES):
+            conn.execute(text(f"DROP TABLE IF EXISTS {table.name}"))
+
+if __name__ == "__main__":
+    upgrade()
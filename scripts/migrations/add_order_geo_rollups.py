@@ -0,0 +1,47 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.database import SQLALCHEMY_DATABASE_URL
+from app.api.queries.geo_rollup_queries import rebuild_geo_rollups
+
+def upgrade():
+    """Add order_geo_rollups table and backfill it from existing orders."""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        # The rollups are derived from the orders, so an earlier layout (unsharded,
+        # with an index on order_count) is replaced rather than altered
+        conn.execute(text("""
+            DO $$ BEGIN
+                IF EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = 'order_geo_rollups')
+                   AND NOT EXISTS (SELECT 1 FROM information_schema.columns
+                                   WHERE table_name = 'order_geo_rollups' AND column_name = 'shard') THEN
+                    DROP TABLE order_geo_rollups;
+                END IF;
+            END $$
+        """))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS order_geo_rollups (
+                address_type VARCHAR NOT NULL,
+                level VARCHAR NOT NULL,
+                parent VARCHAR NOT NULL,
+                key VARCHAR NOT NULL,
+                shard SMALLINT NOT NULL DEFAULT 0,
+                order_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (address_type, level, parent, key, shard)
+            ) WITH (fillfactor = 70)
+        """))
+
+    session = sessionmaker(bind=engine)()
+    try:
+        count = rebuild_geo_rollups(session)
+    finally:
+        session.close()
+    print(f"Built {count} geo rollups")
+
+def downgrade():
+    """Remove order_geo_rollups table."""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS order_geo_rollups"))
+
+if __name__ == "__main__":
+    upgrade()
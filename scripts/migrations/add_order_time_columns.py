@@ -0,0 +1,51 @@
+from sqlalchemy import create_engine, text
+from app import config
+from app.models import ORDER_HOUR_SQL, ORDER_DOW_SQL
+from app.database import SQLALCHEMY_DATABASE_URL
+
+def upgrade():
+    """Add stored order_hour/order_dow columns evaluated in BUSINESS_TIMEZONE.
+
+    Safe to re-run after changing BUSINESS_TIMEZONE: the columns are dropped and
+    regenerated, and the archived hour/day-of-week rollups are recomputed to match.
+    """
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        for table in ("orders", "orders_archive"):
+            conn.execute(text(f"""
+                ALTER TABLE {table}
+                    DROP COLUMN IF EXISTS order_hour,
+                    DROP COLUMN IF EXISTS order_dow
+            """))
+            conn.execute(text(f"""
+                ALTER TABLE {table}
+                    ADD COLUMN order_hour SMALLINT GENERATED ALWAYS AS ({ORDER_HOUR_SQL}) STORED,
+                    ADD COLUMN order_dow SMALLINT GENERATED ALWAYS AS ({ORDER_DOW_SQL}) STORED
+            """))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_order_hour ON orders (order_hour)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_orders_order_dow ON orders (order_dow)"))
+
+        # Archived rollups were bucketed with the previous definition (UTC, Sunday = 0)
+        conn.execute(text("DELETE FROM order_archive_rollups WHERE dimension IN ('hour', 'dow')"))
+        for dimension, column in (("hour", "order_hour"), ("dow", "order_dow")):
+            conn.execute(text(f"""
+                INSERT INTO order_archive_rollups (bucket_date, dimension, key, order_count)
+                SELECT CAST(order_date AS date), '{dimension}', CAST({column} AS text), count(*)
+                FROM orders_archive
+                GROUP BY 1, 3
+            """))
+    print(f"order_hour/order_dow now use {config.BUSINESS_TIMEZONE}")
+
+def downgrade():
+    """Remove order_hour/order_dow columns."""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        for table in ("orders", "orders_archive"):
+            conn.execute(text(f"""
+                ALTER TABLE {table}
+                    DROP COLUMN IF EXISTS order_hour,
+                    DROP COLUMN IF EXISTS order_dow
+            """))
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,45 @@
+from sqlalchemy import create_engine, text
+from app import models
+from app.database import SQLALCHEMY_DATABASE_URL, SessionLocal
+from app.api.queries.revenue_queries import get_first_order_day
+from app.api.services.revenue_service import refresh_revenue_rollups
+
+def upgrade():
+    """Store order amounts as NUMERIC and build the revenue rollups.
+
+    Changing the column type rewrites orders, orders_archive and
+    customer_order_stats, so run this in a maintenance window on large tables.
+    """
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        for table in ("orders", "orders_archive"):
+            conn.execute(text(f"""
+                ALTER TABLE {table}
+                    ALTER COLUMN total_amount TYPE NUMERIC(12, 2)
+                    USING round(CAST(total_amount AS numeric), 2)
+            """))
+        conn.execute(text("""
+            ALTER TABLE customer_order_stats
+                ALTER COLUMN total_spend TYPE NUMERIC(14, 2)
+                USING round(CAST(total_spend AS numeric), 2)
+        """))
+    models.OrderRevenueRollup.__table__.create(bind=engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        days = refresh_revenue_rollups(db, start=get_first_order_day(db))
+    finally:
+        db.close()
+    print(f"Built revenue rollups for {days} days")
+
+def downgrade():
+    """Drop the revenue rollups and store order amounts as floats again."""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS order_revenue_rollups"))
+        for table, column in (("orders", "total_amount"), ("orders_archive", "total_amount"),
+                              ("customer_order_stats", "total_spend")):
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE DOUBLE PRECISION"))
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,37 @@
+from sqlalchemy import create_engine, text
+from app.database import SQLALCHEMY_DATABASE_URL
+
+def upgrade():
+    """Add row versions to customers and orders, and the table_versions change counters."""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        # Constant defaults: no table rewrite, even for the partitioned orders table
+        conn.execute(text("""
+            ALTER TABLE customers
+                ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1,
+                ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+                    DEFAULT (now() at time zone 'utc')
+        """))
+        conn.execute(text("ALTER TABLE orders ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1"))
+        conn.execute(text("ALTER TABLE orders_archive ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1"))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS table_versions (
+                table_name VARCHAR NOT NULL,
+                shard SMALLINT NOT NULL,
+                version BIGINT NOT NULL,
+                changed_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                PRIMARY KEY (table_name, shard)
+            )
+        """))
+
+def downgrade():
+    """Remove row versions and the table_versions change counters."""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS table_versions"))
+        conn.execute(text("ALTER TABLE orders_archive DROP COLUMN IF EXISTS version"))
+        conn.execute(text("ALTER TABLE orders DROP COLUMN IF EXISTS version"))
+        conn.execute(text("ALTER TABLE customers DROP COLUMN IF EXISTS version, DROP COLUMN IF EXISTS updated_at"))
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,41 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.database import SQLALCHEMY_DATABASE_URL
+from app.api.queries.zip_sketch_queries import rebuild_zip_customer_sketches
+
+def upgrade():
+    """Add zip_customer_sketches table and backfill it from existing orders."""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS zip_customer_sketches (
+                bucket_date DATE NOT NULL,
+                address_type VARCHAR NOT NULL,
+                zip_code VARCHAR NOT NULL,
+                entries INTEGER[] NOT NULL,
+                registers BYTEA,
+                PRIMARY KEY (bucket_date, address_type, zip_code)
+            )
+        """))
+        # Tables created before sketches could switch to dense
+        conn.execute(text("ALTER TABLE zip_customer_sketches ADD COLUMN IF NOT EXISTS registers BYTEA"))
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_zip_customer_sketches_type_bucket
+            ON zip_customer_sketches (address_type, bucket_date)
+        """))
+
+    session = sessionmaker(bind=engine)()
+    try:
+        count = rebuild_zip_customer_sketches(session)
+    finally:
+        session.close()
+    print(f"Built {count} zip code sketches")
+
+def downgrade():
+    """Remove zip_customer_sketches table."""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS zip_customer_sketches"))
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,95 @@
+from datetime import date
+from sqlalchemy import create_engine, text
+from app import models
+from app.database import SQLALCHEMY_DATABASE_URL
+from app.api.queries.partition_queries import add_months, month_start, partition_name
+
+ORDER_COLUMNS = "id, customer_id, order_date, total_amount, status, order_type, billing_address_id"
+
+def upgrade(months_ahead: int = 3):
+    """Convert orders and order_shipping_addresses into monthly range-partitioned tables.
+
+    The existing tables are renamed, partitioned replacements are created from the
+    models (including their DEFAULT partitions), one partition per month is created
+    for the existing data plus `months_ahead` future months, and the rows are copied
+    over with their ids preserved. Runs in a single transaction.
+    """
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        for table in models.PARTITIONED_TABLES:
+            conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned"))
+            conn.execute(text(f"ALTER INDEX {table}_pkey RENAME TO {table}_unpartitioned_pkey"))
+            conn.execute(text(f"ALTER INDEX IF EXISTS ix_{table}_id RENAME TO ix_{table}_unpartitioned_id"))
+
+        models.Order.__table__.create(conn)
+        models.OrderShippingAddress.__table__.create(conn)
+
+        oldest, newest = conn.execute(text(
+            "SELECT min(order_date), max(order_date) FROM orders_unpartitioned"
+        )).fetchone()
+        first = month_start(oldest.date() if oldest else date.today())
+        last = add_months(max(newest.date() if newest else date.today(), date.today()), months_ahead)
+        month = first
+        while month <= last:
+            upper = add_months(month, 1)
+            for table in reversed(models.PARTITIONED_TABLES):
+                conn.execute(text(f"""
+                    CREATE TABLE {partition_name(table, month)} PARTITION OF {table}
+                    FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')
+                """))
+            month = upper
+
+        conn.execute(text(f"""
+            INSERT INTO orders ({ORDER_COLUMNS})
+            SELECT {ORDER_COLUMNS} FROM orders_unpartitioned
+        """))
+        conn.execute(text("""
+            INSERT INTO order_shipping_addresses (id, order_id, order_date, address_id, sequence)
+            SELECT s.id, s.order_id, o.order_date, s.address_id, s.sequence
+            FROM order_shipping_addresses_unpartitioned s
+            JOIN orders_unpartitioned o ON o.id = s.order_id
+        """))
+
+        for table in models.PARTITIONED_TABLES:
+            conn.execute(text(f"DROP TABLE {table}_unpartitioned"))
+            # The new serial sequence was created while the old one still held the name
+            sequence = conn.execute(text(
+                "SELECT pg_get_serial_sequence(:table, 'id')"
+            ), {"table": table}).scalar()
+            conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {table}_id_seq"))
+            conn.execute(text(
+                f"SELECT setval('{table}_id_seq', COALESCE((SELECT max(id) FROM {table}), 0) + 1, false)"
+            ))
+
+def downgrade():
+    """Collapse the partitioned tables back into plain tables."""
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE orders_plain (LIKE orders INCLUDING DEFAULTS)"))
+        conn.execute(text("INSERT INTO orders_plain SELECT * FROM orders"))
+        conn.execute(text(
+            "CREATE TABLE order_shipping_addresses_plain (LIKE order_shipping_addresses INCLUDING DEFAULTS)"
+        ))
+        conn.execute(text("INSERT INTO order_shipping_addresses_plain SELECT * FROM order_shipping_addresses"))
+        for table in models.PARTITIONED_TABLES:
+            conn.execute(text(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE"))
+            conn.execute(text(f"DROP TABLE {table} CASCADE"))
+        for table in reversed(models.PARTITIONED_TABLES):
+            conn.execute(text(f"ALTER TABLE {table}_plain RENAME TO {table}"))
+            conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id)"))
+            conn.execute(text(f"CREATE INDEX ix_{table}_id ON {table} (id)"))
+            conn.execute(text(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id"))
+        conn.execute(text("ALTER TABLE order_shipping_addresses DROP COLUMN order_date"))
+        conn.execute(text("""
+            ALTER TABLE orders
+                ADD FOREIGN KEY (customer_id) REFERENCES customers(id),
+                ADD FOREIGN KEY (billing_address_id) REFERENCES addresses(id)
+        """))
+        conn.execute(text("""
+            ALTER TABLE order_shipping_addresses
+                ADD FOREIGN KEY (order_id) REFERENCES orders(id),
+                ADD FOREIGN KEY (address_id) REFERENCES addresses(id)
+        """))
+
+if __name__ == "__main__":
+    upgrade()
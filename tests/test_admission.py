@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+from app import config, database
+from app.api.middleware import AdmissionMiddleware
+from app.api.services import admission
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+def controller(slots=1, analytics_limit=1, timeout=1.0):
+    return admission.AdmissionController(
+        slots,
+        {admission.WRITE: slots, admission.READ: slots, admission.ANALYTICS: analytics_limit},
+        {admission.WRITE: timeout, admission.READ: timeout, admission.ANALYTICS: timeout}
+    )
+
+def test_routes_are_classified():
+    assert admission.classify("POST", "/orders/customers/1/orders/") == admission.WRITE
+    assert admission.classify("GET", "/customers/1") == admission.READ
+    assert admission.classify("GET", "/analytics/orders/zip-code/") == admission.ANALYTICS
+    assert admission.classify("GET", "/analytics/stream") is None
+    assert admission.classify("GET", "/health") is None
+
+def test_freed_slots_go_to_writes_first(loop):
+    async def scenario():
+        limits = controller(slots=1, analytics_limit=1)
+        assert await limits.acquire(admission.READ)
+        order = []
+
+        async def request(route_class):
+            assert await limits.acquire(route_class)
+            order.append(route_class)
+            limits.release(route_class)
+
+        tasks = [loop.create_task(request(admission.ANALYTICS)), loop.create_task(request(admission.WRITE))]
+        await asyncio.sleep(0.01)
+        limits.release(admission.READ)
+        await asyncio.gather(*tasks)
+        return order, limits
+
+    order, limits = loop.run_until_complete(scenario())
+    assert order == [admission.WRITE, admission.ANALYTICS]
+    assert limits.in_flight == 0
+    assert limits.snapshot()["classes"]["analytics"]["queue_wait_max_ms"] > 0
+
+def test_analytics_cannot_take_every_slot(loop):
+    async def scenario():
+        limits = controller(slots=2, analytics_limit=1, timeout=0.05)
+        assert await limits.acquire(admission.ANALYTICS)
+        assert not await limits.acquire(admission.ANALYTICS)
+        assert await limits.acquire(admission.WRITE)
+        return limits
+
+    stats = loop.run_until_complete(scenario()).snapshot()["classes"]
+    assert stats["analytics"]["rejected"] == 1
+    assert stats["write"]["in_flight"] == 1
+
+def test_queued_requests_are_shed_with_retry_after(loop, monkeypatch):
+    monkeypatch.setattr(config, "ADMISSION_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(config, "ADMISSION_QUEUE_TIMEOUT", 0.05)
+    admission.reset_admission_controller()
+
+    async def scenario():
+        hold = asyncio.Event()
+
+        async def slow_app(scope, receive, send):
+            await hold.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        middleware = AdmissionMiddleware(slow_app)
+        sent = {1: [], 2: []}
+
+        def call(number):
+            scope = {"type": "http", "method": "POST", "path": "/customers/", "headers": [], "query_string": b""}
+
+            async def send(message):
+                sent[number].append(message)
+            return middleware(scope, None, send)
+
+        first = loop.create_task(call(1))
+        await asyncio.sleep(0.01)
+        await call(2)
+        hold.set()
+        await first
+        return sent
+
+    try:
+        sent = loop.run_until_complete(scenario())
+    finally:
+        admission.reset_admission_controller()
+    assert sent[1][0]["status"] == 200
+    assert sent[2][0]["status"] == 503
+    assert (b"retry-after", b"1") in sent[2][0]["headers"]
+
+def test_health_reports_admission_and_pool_waits(client):
+    admission.reset_admission_controller()
+    client.get("/customers/")
+    limits = admission.get_admission_controller()
+    token = admission.current_class.set(admission.ANALYTICS)
+    try:
+        database.engine.connect().close()
+    finally:
+        admission.current_class.reset(token)
+
+    health = client.get("/health").json()
+    assert health["pool"]["size"] == database.POOL_SIZE
+    classes = health["admission"]["classes"]
+    assert classes["read"]["admitted"] == 1
+    assert classes["read"]["in_flight"] == 0
+    assert limits.stats[admission.ANALYTICS].pool_waits == 1
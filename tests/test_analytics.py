@@ -143,6 +143,23 @@ def test_get_orders_by_day_of_week(client):
     assert all(0 <= item["day_of_week"] < 7 for item in data)
     assert all(item["order_count"] >= 0 for item in data)
 
+def test_day_of_week_and_hour_use_api_convention(client):
+    """Day of week is 0 = Monday and hours are bucketed in the business timezone (UTC here)."""
+    response = client.post("/customers/", json=BASE_CUSTOMER)
+    customer_id = response.json()["id"]
+    response = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS)
+    address_id = response.json()["id"]
+
+    before = datetime.utcnow()
+    response = create_test_order(client, customer_id, address_id, before)
+    assert response.status_code == status.HTTP_200_OK
+    placed = datetime.fromisoformat(response.json()["order_date"])
+
+    response = client.get("/analytics/orders/day-of-week/?limit=1")
+    assert response.json() == [{"day_of_week": placed.weekday(), "order_count": 1}]
+    response = client.get("/analytics/orders/time-of-day/?limit=1")
+    assert response.json() == [{"hour": placed.hour, "order_count": 1}]
+
 def test_get_top_in_store_customers(client, db):
     """Test getting top customers by in-store orders."""
     # Create multiple customers with different numbers of orders
@@ -197,6 +214,33 @@ def test_get_top_in_store_customers(client, db):
     assert data[1]["in_store_order_count"] == 9   # Second customer should have 9 orders
     assert data[2]["in_store_order_count"] == 8   # Third customer should have 8 orders
 
+def test_rebuild_customer_order_stats_matches_incremental_counters(client, db):
+    """Rebuilding the counters from scratch yields the incrementally maintained values."""
+    from app.models import CustomerOrderStats
+    from app.api.queries.customer_stats_queries import rebuild_customer_order_stats
+
+    response = client.post("/customers/", json=BASE_CUSTOMER)
+    customer_id = response.json()["id"]
+    response = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS)
+    address_id = response.json()["id"]
+    for order_type in ["in_store", "in_store", "online"]:
+        order_data = create_order_data(address_id, [address_id], datetime.now())
+        order_data["order_type"] = order_type
+        response = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data)
+        assert response.status_code == status.HTTP_200_OK
+
+    def snapshot():
+        stats = db.query(CustomerOrderStats).filter_by(customer_id=customer_id).one()
+        return (stats.order_count, stats.in_store_order_count,
+                stats.online_order_count, stats.total_spend, stats.last_order_at)
+
+    incremental = snapshot()
+    assert incremental[:4] == (3, 2, 1, 300.0)
+
+    assert rebuild_customer_order_stats(db) == 1
+    db.expire_all()
+    assert snapshot() == incremental
+
 def test_get_in_store_orders_by_time_of_day(client):
     # Create a customer
     response = client.post("/customers/", json=BASE_CUSTOMER)
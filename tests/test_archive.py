@@ -0,0 +1,87 @@
+import pytest
+from fastapi import status
+from datetime import datetime
+from app import models
+from app.api.services import archive_service
+from app.api.queries.customer_stats_queries import rebuild_customer_order_stats
+from .mock_data import BASE_CUSTOMER, get_test_addresses_with_zip_codes, create_order_data
+
+def create_orders(client, customer_id, address_id, count):
+    order_ids = []
+    for _ in range(count):
+        order_data = create_order_data(address_id, [address_id], datetime.now())
+        response = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data)
+        assert response.status_code == status.HTTP_200_OK
+        order_ids.append(response.json()["id"])
+    return order_ids
+
+@pytest.fixture
+def customer_with_archived_orders(client, db):
+    """Create a customer with three archived orders followed by two hot orders."""
+    response = client.post("/customers/", json=BASE_CUSTOMER)
+    customer_id = response.json()["id"]
+    address = get_test_addresses_with_zip_codes(["94105"])[0]
+    response = client.post(f"/customers/{customer_id}/addresses/", json=address)
+    address_id = response.json()["id"]
+
+    archived_ids = create_orders(client, customer_id, address_id, 3)
+    # A negative horizon puts the cutoff in the future, so everything is archived
+    assert archive_service.archive_orders(db, horizon_days=-1, batch_size=2) == 3
+    hot_ids = create_orders(client, customer_id, address_id, 2)
+    return customer_id, archived_ids, hot_ids
+
+def test_archive_moves_orders_and_shipping_rows(db, customer_with_archived_orders):
+    _, archived_ids, hot_ids = customer_with_archived_orders
+    assert sorted(order.id for order in db.query(models.Order).all()) == hot_ids
+    assert sorted(order.id for order in db.query(models.ArchivedOrder).all()) == archived_ids
+    assert db.query(models.ArchivedOrderShippingAddress).count() == len(archived_ids)
+    assert db.query(models.OrderShippingAddress).count() == len(hot_ids)
+
+def test_get_order_falls_back_to_archive(client, customer_with_archived_orders):
+    customer_id, archived_ids, _ = customer_with_archived_orders
+    response = client.get(f"/orders/{archived_ids[0]}")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["id"] == archived_ids[0]
+    assert data["customer_id"] == customer_id
+    assert data["shipping_addresses"][0]["address"]["zip_code"] == "94105"
+
+def test_customer_orders_continue_into_archive(client, customer_with_archived_orders):
+    customer_id, archived_ids, hot_ids = customer_with_archived_orders
+    response = client.get(f"/orders/customers/{customer_id}/orders/")
+    assert [order["id"] for order in response.json()] == sorted(hot_ids + archived_ids, reverse=True)
+
+    response = client.get(f"/orders/customers/{customer_id}/orders/?skip=1&limit=2")
+    assert [order["id"] for order in response.json()] == [hot_ids[0], archived_ids[2]]
+
+    response = client.get(f"/orders/customers/{customer_id}/orders/?skip=3&limit=10")
+    assert [order["id"] for order in response.json()] == [archived_ids[1], archived_ids[0]]
+
+def test_analytics_include_archive_rollups(client, db, customer_with_archived_orders):
+    customer_id, archived_ids, hot_ids = customer_with_archived_orders
+    total = len(archived_ids) + len(hot_ids)
+    for address_type in ["billing", "shipping"]:
+        response = client.get(f"/analytics/orders/zip-code/?address_type={address_type}")
+        assert response.json() == [{"zip_code": "94105", "order_count": total, "unique_customers": 1}]
+    response = client.get("/analytics/orders/time-of-day/?limit=24")
+    assert sum(item["order_count"] for item in response.json()) == total
+    response = client.get("/analytics/orders/day-of-week/")
+    assert sum(item["order_count"] for item in response.json()) == total
+
+    # Lifetime counters survive archival and a rebuild from scratch
+    rebuild_customer_order_stats(db)
+    response = client.get("/analytics/customers/top-in-store/")
+    assert response.json()[0]["in_store_order_count"] == total
+
+def test_archiving_invalidates_cached_customers(client, db):
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    address = get_test_addresses_with_zip_codes(["94105"])[0]
+    address_id = client.post(f"/customers/{customer_id}/addresses/", json=address).json()["id"]
+    order_ids = create_orders(client, customer_id, address_id, 2)
+    cached = client.get(f"/customers/{customer_id}")
+    assert [order["id"] for order in cached.json()["orders"]] == order_ids
+
+    assert archive_service.archive_orders(db, horizon_days=-1) == 2
+    response = client.get(f"/customers/{customer_id}", headers={"If-None-Match": cached.headers["ETag"]})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["orders"] == [] and response.json()["version"] > cached.json()["version"]
@@ -0,0 +1,153 @@
+import pytest
+from datetime import datetime
+from fastapi import status
+from fastapi.testclient import TestClient
+from app import config, database, models
+from app.main import app
+from app.database import SingleTransaction, after_commit
+from app.api.services import batch_service, orders_service
+from app.api.services.cache import get_cache
+from .conftest import TestingSessionLocal
+from .mock_data import BASE_CUSTOMER, BASE_ADDRESS, create_order_data, get_test_addresses
+
+def onboarding(order_data):
+    """Create a customer with a billing and two shipping addresses, then their first order."""
+    billing, *shipping = get_test_addresses(3)
+    return {"requests": [
+        {"method": "POST", "path": "/customers/", "body": BASE_CUSTOMER},
+        {"method": "POST", "path": "/customers/$0.id/addresses/?is_billing=true", "body": billing},
+        {"method": "POST", "path": "/customers/$0.id/addresses/", "body": shipping[0]},
+        {"method": "POST", "path": "/customers/$0.id/addresses/", "body": shipping[1]},
+        {"method": "POST", "path": "/orders/customers/$0.id/orders/", "body": order_data},
+        {"path": "/customers/$0.id"},
+    ]}
+
+def test_onboarding_in_one_transaction(client, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(orders_service.leaderboard, "record_order", recorded.append)
+    # The group-commit pipeline's session could not see the uncommitted customer
+    monkeypatch.setattr(config, "ORDER_GROUP_COMMIT", True)
+    order_data = {**create_order_data("$1.id", [], datetime.utcnow()),
+                  "shipping_addresses": [{"address_id": "$2.id", "sequence": 1}, {"address_id": "$3.id", "sequence": 2}]}
+
+    response = client.post("/batch", json=onboarding(order_data))
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert body["committed"] is True
+    assert [result["status"] for result in body["results"]] == [200] * 6
+    customer_id = body["results"][0]["body"]["id"]
+    order = body["results"][4]["body"]
+    assert order["customer_id"] == customer_id and order["billing_address_id"] == body["results"][1]["body"]["id"]
+    customer = body["results"][5]["body"]
+    assert len(customer["billing_addresses"]) == 1 and len(customer["shipping_addresses"]) == 2
+    assert [o["id"] for o in customer["orders"]] == [order["id"]]
+    # Side effects of the order ran once the batch committed
+    assert [o.id for o in recorded] == [order["id"]]
+
+    other = TestingSessionLocal()
+    try:
+        assert other.query(models.Order).filter(models.Order.customer_id == customer_id).count() == 1
+    finally:
+        other.close()
+
+def test_failed_sub_request_rolls_back_the_batch(client, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(orders_service.leaderboard, "record_order", recorded.append)
+    # Billing address of another (nonexistent) address id
+    response = client.post("/batch", json=onboarding(create_order_data(999, [], datetime.utcnow())))
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    body = response.json()
+    assert body["committed"] is False
+    assert [result["status"] for result in body["results"]] == [200, 200, 200, 200, 400]
+    assert body["results"][4]["body"] == {"detail": "Invalid billing address"}
+
+    customer_id = body["results"][0]["body"]["id"]
+    assert client.get(f"/customers/{customer_id}").status_code == status.HTTP_404_NOT_FOUND
+    assert client.get("/customers/").json() == []
+    assert recorded == []
+    # Nothing of the rolled back batch is left, so it can be retried
+    assert client.post("/customers/", json=BASE_CUSTOMER).status_code == status.HTTP_200_OK
+
+def test_batches_read_their_writes_and_cache_nothing(client, monkeypatch):
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    assert client.get(f"/customers/{customer_id}").json()["shipping_addresses"] == []
+    cached = []
+    monkeypatch.setattr(get_cache(), "set_many", lambda namespace, values, ttl: cached.append(namespace))
+
+    response = client.post("/batch", json={"requests": [
+        {"method": "POST", "path": f"/customers/{customer_id}/addresses/", "body": BASE_ADDRESS},
+        {"path": f"/customers/{customer_id}"},
+    ]})
+    # Not the customer cached before the batch, and nothing uncommitted cached
+    assert len(response.json()["results"][1]["body"]["shipping_addresses"]) == 1
+    assert cached == []
+
+def test_failed_commit_rolls_back(db, monkeypatch):
+    calls = []
+    transaction = SingleTransaction(db)
+    transaction.begin()
+    after_commit(db, lambda: calls.append("invalidate"), also_on_rollback=True)
+    after_commit(db, lambda: calls.append("record"))
+
+    def fail():
+        raise RuntimeError("commit failed")
+
+    monkeypatch.setattr(db, "commit", fail)
+    with pytest.raises(RuntimeError):
+        transaction.commit()
+    assert calls == ["invalidate"] and not db.in_transaction()
+    transaction.rollback()
+    assert calls == ["invalidate"]
+
+def test_invalid_batches(client, monkeypatch):
+    response = client.post("/batch", json={"requests": [{"path": "/customers/$1.id"}]})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert "has not run" in response.json()["results"][0]["body"]["detail"]
+
+    response = client.post("/batch", json={"requests": [
+        {"method": "POST", "path": "/customers/", "body": BASE_CUSTOMER},
+        {"method": "POST", "path": "/customers/$0.customer_id/addresses/", "body": BASE_ADDRESS},
+    ]})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert client.get("/customers/").json() == []
+
+    nested = client.post("/batch", json={"requests": [{"method": "POST", "path": "/batch", "body": {"requests": []}}]})
+    assert nested.json()["results"][0]["body"] == {"detail": "Batches cannot be nested"}
+    # Validation errors of sub-requests are reported like any other failure
+    invalid = client.post("/batch", json={"requests": [{"method": "POST", "path": "/customers/", "body": {}}]})
+    assert invalid.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert invalid.json()["results"][0]["body"]["detail"][0]["loc"][0] == "body"
+
+    monkeypatch.setattr(config, "BATCH_MAX_REQUESTS", 1)
+    response = client.post("/batch", json={"requests": [{"path": "/customers/"}] * 2})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_references():
+    results = [batch_service.schemas.BatchResult(status=200, body={"id": 7, "addresses": [{"id": 9}]})]
+    assert batch_service.resolve_path("/customers/$0.id/orders/?x=$0.addresses.0.id", results) == "/customers/7/orders/?x=9"
+    assert batch_service.resolve({"a": "$0.id", "b": ["$0.addresses.0"], "c": "pa$0.id"}, results) \
+        == {"a": 7, "b": [{"id": 9}], "c": "pa$0.id"}
+
+def test_batches_through_the_request_sessions(db, monkeypatch):
+    """Without the test override of get_db: sub-requests share the batch's own session."""
+    monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+    with TestClient(app) as client:
+        response = client.post("/batch", json={"requests": [
+            {"method": "POST", "path": "/customers/", "body": BASE_CUSTOMER},
+            # Redirected to the path with a trailing slash
+            {"method": "POST", "path": "/customers/$0.id/addresses", "body": BASE_ADDRESS},
+            {"method": "POST", "path": "/orders/customers/$0.id/orders/", "body": create_order_data("$1.id", [], datetime.utcnow())},
+        ]})
+        assert response.status_code == status.HTTP_200_OK, response.json()
+        assert response.json()["committed"] is True
+        customer_id = response.json()["results"][0]["body"]["id"]
+        customer = client.get(f"/customers/{customer_id}").json()
+        assert len(customer["shipping_addresses"]) == 1 and len(customer["orders"]) == 1
+
+        # A status that is no success fails the batch, which writes nothing
+        response = client.post("/batch", json={"requests": [
+            {"method": "POST", "path": "/customers/", "body": {**BASE_CUSTOMER, "email": "other@example.com"}},
+            {"method": "POST", "path": "/orders/customers/$0.id/orders/", "body": create_order_data(999, [], datetime.utcnow())},
+        ]})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST and response.json()["committed"] is False
+        assert [c["id"] for c in client.get("/customers/").json()] == [customer_id]
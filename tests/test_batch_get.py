@@ -0,0 +1,55 @@
+from datetime import datetime
+from fastapi import status
+from app import config
+from app.api.services.dataloader import DataLoader
+from .mock_data import BASE_ADDRESS, create_order_data, get_test_customers
+
+def create_orders(client, count):
+    customer_id = client.post("/customers/", json=get_test_customers(1)[0]).json()["id"]
+    address_id = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS).json()["id"]
+    order_data = create_order_data(address_id, [address_id], datetime.utcnow())
+    return [client.post(f"/orders/customers/{customer_id}/orders/", json=order_data).json() for _ in range(count)]
+
+def test_orders_by_ids_keep_the_requested_order(client):
+    orders = create_orders(client, 3)
+    ids = [orders[2]["id"], 999, orders[0]["id"], orders[2]["id"]]
+    response = client.get("/orders/batch", params={"ids": ",".join(map(str, ids))})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"orders": [orders[2], orders[0]], "missing": [999]}
+    # Served from the cache the second time
+    assert client.get("/orders/batch", params={"ids": str(orders[1]["id"])}).json()["orders"] == [orders[1]]
+    assert client.get("/orders/batch", params={"ids": str(orders[1]["id"])}).json()["orders"] == [orders[1]]
+
+    assert client.get("/orders/batch", params={"ids": "1,x"}).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert client.get("/orders/batch").status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    # The list route keeps its shape
+    assert client.get("/orders/").json() == orders
+
+def test_customers_batch_get(client, monkeypatch):
+    customers = [client.post("/customers/", json=customer).json() for customer in get_test_customers(3)]
+    response = client.post("/customers/batch-get", json={"ids": [customers[1]["id"], 999, customers[0]["id"]]})
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert [customer["id"] for customer in body["customers"]] == [customers[1]["id"], customers[0]["id"]]
+    assert body["customers"][0]["email"] == customers[1]["email"]
+    assert body["missing"] == [999]
+
+    monkeypatch.setattr(config, "BATCH_GET_MAX_IDS", 2)
+    response = client.post("/customers/batch-get", json={"ids": [c["id"] for c in customers]})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_dataloader_batches_and_memoizes():
+    calls = []
+
+    def batch_load(keys):
+        calls.append(keys)
+        return {key: key * 10 for key in keys if key != 3}
+
+    loader = DataLoader(batch_load, max_batch_size=2)
+    assert loader.load_many([1, 2, 1, 3]) == [10, 20, 10, None]
+    assert calls == [[1, 2], [3]]
+    assert loader.load(2) == 20 and loader.load(4) == 40
+    loader.prime(5, 50)
+    loader.clear(1)
+    assert loader.load_many([5, 1]) == [50, 10]
+    assert calls == [[1, 2], [3], [4], [1]]
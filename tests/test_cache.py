@@ -0,0 +1,155 @@
+import threading
+import time
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from fastapi import status
+from app import config
+from app.api.services import cache
+from .mock_data import BASE_CUSTOMER, BASE_ADDRESS, create_order_data
+
+VALUE = {"id": 1, "total_amount": Decimal("12.50"), "order_date": datetime(2024, 5, 1, 12, 30), "tags": ["a"]}
+ENCODED = {"id": 1, "total_amount": "12.50", "order_date": "2024-05-01T12:30:00", "tags": ["a"]}
+
+def local_cache(max_entries=100):
+    return cache.Cache(cache.LocalDriver(max_entries), cache.JsonSerializer())
+
+@pytest.mark.parametrize("name", ["json", "orjson", "msgpack"])
+def test_serializers_round_trip_response_data(name):
+    if name != "json":
+        pytest.importorskip(name)
+    serializer = cache.get_serializer(name)
+    assert serializer.loads(serializer.dumps(VALUE)) == ENCODED
+
+def test_local_driver_evicts_least_recently_used_and_expires():
+    driver = cache.LocalDriver(max_entries=2)
+    driver.set_many({"a": b"1", "b": b"2"}, ttl=60)
+    driver.get_many(["a"])
+    driver.set_many({"c": b"3"}, ttl=60)
+    assert driver.get_many(["a", "b", "c"]) == [b"1", None, b"3"]
+
+    driver.set_many({"d": b"4"}, ttl=0.01)
+    time.sleep(0.02)
+    assert driver.get_many(["d"]) == [None]
+
+def test_keys_are_namespaced_and_versioned(monkeypatch):
+    shared = local_cache()
+    shared.set_many("order", {1: {"id": 1}}, ttl=60)
+    assert shared.key("order", 1) == f"radiant:order:v{cache.NAMESPACES['order']}:1"
+    assert shared.get_many("customer", [1]) == {}
+    monkeypatch.setitem(cache.NAMESPACES, "order", cache.NAMESPACES["order"] + 1)
+    assert shared.get_many("order", [1]) == {}
+
+def test_concurrent_misses_load_once():
+    shared = local_cache()
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.05)
+        return {"id": 7}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(shared.get_or_load("order", 7, load, ttl=60)))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [{"id": 7}] * 10
+
+def test_waits_for_another_replica_holding_the_load_lock():
+    driver = cache.LocalDriver(100)
+    replica_a, replica_b = cache.Cache(driver, cache.JsonSerializer()), cache.Cache(driver, cache.JsonSerializer())
+    assert driver.add(replica_a.key("order", 3) + ":lock", b"1", ttl=5)
+    threading.Timer(0.05, lambda: replica_a.set_many("order", {3: {"id": 3}}, ttl=60)).start()
+    assert replica_b.get_or_load("order", 3, lambda: pytest.fail("loaded twice"), ttl=60) == {"id": 3}
+
+def test_multi_get_loads_only_missing_keys():
+    shared = local_cache()
+    shared.set_many("order", {1: {"id": 1}, 3: {"id": 3}}, ttl=60)
+    requested = []
+
+    def load(missing):
+        requested.append(missing)
+        return {order_id: {"id": order_id} for order_id in missing if order_id != 4}
+
+    assert shared.get_many_or_load("order", [1, 2, 3, 4], load, ttl=60) == {1: {"id": 1}, 2: {"id": 2}, 3: {"id": 3}}
+    assert requested == [[2, 4]]
+    assert shared.get_many("order", [2]) == {2: {"id": 2}}
+
+def test_loads_raced_by_a_delete_are_not_cached():
+    shared = local_cache()
+
+    def load_not_found():
+        # The customer is created and its cached "not found" invalidated mid-load
+        shared.delete("customer_exists", [5])
+        return None
+
+    assert shared.get_or_load("customer_exists", 5, load_not_found, ttl=60, negative_ttl=30) is None
+    assert shared.get_many("customer_exists", [5]) == {}
+    # Later loads are cached again
+    assert shared.get_or_load("customer_exists", 5, lambda: True, ttl=60) is True
+    assert shared.get_many("customer_exists", [5]) == {5: True}
+
+    def load_many(missing):
+        shared.delete("order", [1])
+        return {order_id: {"id": order_id} for order_id in missing}
+
+    assert shared.get_many_or_load("order", [1, 2], load_many, ttl=60) == {1: {"id": 1}, 2: {"id": 2}}
+    assert shared.get_many("order", [1, 2]) == {2: {"id": 2}}
+
+def test_redis_driver():
+    fakeredis = pytest.importorskip("fakeredis")
+    shared = cache.Cache(cache.RedisDriver(client=fakeredis.FakeRedis()), cache.JsonSerializer())
+    assert shared.get_many_or_load("order", [1, 2], lambda missing: {key: {"id": key} for key in missing}, ttl=60) \
+        == {1: {"id": 1}, 2: {"id": 2}}
+    assert shared.get_many("order", [1, 2, 3]) == {1: {"id": 1}, 2: {"id": 2}}
+    assert shared.driver.add("lock", b"1", ttl=5) and not shared.driver.add("lock", b"1", ttl=5)
+    shared.delete("order", [1])
+    assert shared.get_many("order", [1, 2]) == {2: {"id": 2}}
+    assert shared.get_many_or_load("order", [1], lambda missing: shared.delete("order", [1]) or {1: {"id": 1}}, ttl=60) \
+        == {1: {"id": 1}}
+    assert shared.get_many("order", [1]) == {}
+
+def test_failing_driver_degrades_to_loading():
+    class DownDriver(cache.NullDriver):
+        def get_many(self, keys):
+            raise ConnectionError("cache is down")
+
+    shared = cache.Cache(DownDriver(), cache.JsonSerializer())
+    assert shared.get_or_load("order", 1, lambda: {"id": 1}, ttl=60) == {"id": 1}
+
+def test_customer_cache_is_invalidated_by_writes(client):
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    assert client.get(f"/customers/{customer_id}").json()["billing_addresses"] == []
+
+    address_id = client.post(f"/customers/{customer_id}/addresses/?is_billing=true", json=BASE_ADDRESS).json()["id"]
+    customer = client.get(f"/customers/{customer_id}").json()
+    assert [address["id"] for address in customer["billing_addresses"]] == [address_id]
+
+    order = client.post(f"/orders/customers/{customer_id}/orders/",
+                        json=create_order_data(address_id, [address_id], datetime.utcnow())).json()
+    assert [row["id"] for row in client.get(f"/customers/{customer_id}").json()["orders"]] == [order["id"]]
+    assert client.get(f"/orders/{order['id']}").json() == order
+    assert client.get("/customers/").json() == [client.get(f"/customers/{customer_id}").json()]
+    assert client.get("/orders/").json() == [order]
+    assert client.get("/customers/999999").status_code == status.HTTP_404_NOT_FOUND
+
+def test_analytics_responses_are_cached_for_their_ttl(client, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_ANALYTICS_TTL", 60)
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    address_id = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS).json()["id"]
+    order_data = create_order_data(address_id, [address_id], datetime.utcnow())
+    client.post(f"/orders/customers/{customer_id}/orders/", json=order_data)
+
+    first = client.get("/analytics/orders/zip-code/").json()
+    client.post(f"/orders/customers/{customer_id}/orders/", json=order_data)
+    assert client.get("/analytics/orders/zip-code/").json() == first
+    assert client.get("/analytics/orders/zip-code/?order_by=asc").json()[0]["order_count"] == 2
+
+    monkeypatch.setattr(config, "CACHE_ANALYTICS_TTL", 0)
+    assert client.get("/analytics/orders/zip-code/").json()[0]["order_count"] == 2
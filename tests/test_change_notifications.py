@@ -0,0 +1,121 @@
+import time
+import pytest
+from datetime import datetime
+from decimal import Decimal
+from fastapi import status
+from app.api.queries import notification_queries
+from app.api.services import change_notifications, columnar_analytics, leaderboard
+from .conftest import engine
+from .mock_data import BASE_CUSTOMER, BASE_ADDRESS, create_order_data
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    leaderboard.reset_leaderboard()
+    columnar_analytics.reset_snapshot()
+    yield
+    leaderboard.reset_leaderboard()
+    columnar_analytics.reset_snapshot()
+
+@pytest.fixture
+def listener(db):
+    listener = change_notifications.ChangeListener(engine)
+    listener.connect()
+    yield listener
+    listener.stop()
+
+def create_customer_with_address(client):
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    address_id = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS).json()["id"]
+    return customer_id, address_id
+
+def create_in_store_order(client, customer_id, address_id):
+    order_data = {**create_order_data(address_id, [address_id], datetime.utcnow()), "order_type": "in_store"}
+    response = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data)
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+def notify_from_other_worker(db, monkeypatch, order_ids, customer_id):
+    """Announce in-store orders as if another worker had created them."""
+    monkeypatch.setattr(notification_queries, "WORKER_ID", "other-worker")
+    now = datetime.utcnow()
+    for order_id in order_ids:
+        notification_queries.notify_change(
+            db, "order", id=order_id, order_date=now.isoformat(), customer_id=customer_id,
+            order_type="in_store", status="completed", total_amount="100.00", hour=now.hour,
+            dow=now.weekday(), billing_zip="94105", shipping_zips=["94105"]
+        )
+    db.commit()
+    monkeypatch.undo()
+
+def test_writes_notify_on_commit(client, db, listener):
+    customer_id, address_id = create_customer_with_address(client)
+    order = create_in_store_order(client, customer_id, address_id)
+
+    changes = listener.poll(timeout=2)
+    assert [change["kind"] for change in changes] == ["customer", "address", "order"]
+    assert all(change["worker"] == notification_queries.WORKER_ID for change in changes)
+    assert changes[2]["id"] == order["id"]
+    assert changes[2]["billing_zip"] == BASE_ADDRESS["zip_code"]
+    assert changes[2]["shipping_zips"] == [BASE_ADDRESS["zip_code"]]
+
+    # Rolled back writes are never announced
+    notification_queries.notify_change(db, "customer", id=customer_id)
+    db.rollback()
+    assert listener.poll(timeout=0.2) == []
+
+def test_other_workers_orders_update_local_caches(client, db, listener, monkeypatch):
+    customer_id, address_id = create_customer_with_address(client)
+    create_in_store_order(client, customer_id, address_id)
+    board = leaderboard.get_leaderboard(db)
+    snapshot = columnar_analytics.get_snapshot(db)
+    listener.poll(timeout=2)
+
+    # This worker's own notifications are skipped: its write path already applied them
+    create_in_store_order(client, customer_id, address_id)
+    change_notifications.apply_changes(listener.poll(timeout=2))
+    assert board.top("today", 1) == [(customer_id, 2)]
+    assert snapshot.zip_counts("billing") == [(BASE_ADDRESS["zip_code"], 2)]
+
+    # A burst from another worker is applied once per order, even if delivered twice
+    notify_from_other_worker(db, monkeypatch, [1001, 1002, 1003], customer_id)
+    changes = listener.poll(timeout=2)
+    assert len(changes) == 3
+    change_notifications.apply_changes(changes + changes)
+    assert board.top("today", 1) == [(customer_id, 5)]
+    assert dict(snapshot.zip_counts("billing")) == {"94105": 3, BASE_ADDRESS["zip_code"]: 2}
+    assert dict(snapshot.zip_counts("shipping")) == {"94105": 3, BASE_ADDRESS["zip_code"]: 2}
+
+def test_listener_thread_applies_changes(client, db, monkeypatch):
+    customer_id, address_id = create_customer_with_address(client)
+    board = leaderboard.get_leaderboard(db)
+
+    change_notifications.start_listener(engine)
+    try:
+        # Give the listener time to connect before writing
+        time.sleep(0.2)
+        notify_from_other_worker(db, monkeypatch, [1001], customer_id)
+        deadline = time.monotonic() + 5
+        while board.top("today", 1) != [(customer_id, 1)] and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        change_notifications.stop_listener()
+    assert board.top("today", 1) == [(customer_id, 1)]
+
+def test_oversized_orders_are_announced_by_id(client, db, listener, monkeypatch):
+    customer_id, address_id = create_customer_with_address(client)
+    listener.poll(timeout=2)
+    monkeypatch.setattr(notification_queries, "MAX_PAYLOAD_BYTES", 100)
+    monkeypatch.setattr(notification_queries, "WORKER_ID", "other-worker")
+    order = create_in_store_order(client, customer_id, address_id)
+    monkeypatch.undo()
+
+    raw = []
+    resolve = listener._resolve
+    monkeypatch.setattr(listener, "_resolve", lambda changes: resolve(raw.extend(changes) or changes))
+    changes = listener.poll(timeout=2)
+    assert raw == [{"kind": "order", "worker": "other-worker", "id": order["id"], "customer_id": customer_id, "resolve": True}]
+    assert [change["kind"] for change in changes] == ["order"]
+    change = changes[0]
+    assert change["id"] == order["id"] and change["worker"] == "other-worker"
+    assert change["billing_zip"] == BASE_ADDRESS["zip_code"] and change["shipping_zips"] == [BASE_ADDRESS["zip_code"]]
+    assert change["order_type"] == "in_store" and Decimal(change["total_amount"]) == Decimal(str(order["total_amount"]))
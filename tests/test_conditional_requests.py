@@ -0,0 +1,115 @@
+from datetime import datetime, timezone
+from fastapi import status
+from app import config
+from app.api import middleware
+from app.api.queries import version_queries
+from app.api.services import analytics_service, conditional, orders_service
+from app.api.services.cache import reset_cache
+from .mock_data import BASE_CUSTOMER, BASE_ADDRESS, create_order_data
+
+def fail(*args, **kwargs):
+    raise AssertionError("a 304 must not load the response")
+
+def create_order(client, customer_id, address_id):
+    order_data = create_order_data(address_id, [address_id], datetime.utcnow())
+    return client.post(f"/orders/customers/{customer_id}/orders/", json=order_data).json()
+
+def test_customer_etag_changes_with_its_addresses(client):
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    first = client.get(f"/customers/{customer_id}")
+    etag, last_modified = first.headers["ETag"], first.headers["Last-Modified"]
+    assert etag.startswith('W/"')
+
+    cached = client.get(f"/customers/{customer_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+    assert cached.content == b"" and cached.headers["ETag"] == etag
+    assert client.get(f"/customers/{customer_id}", headers={"If-Modified-Since": last_modified}).status_code \
+        == status.HTTP_304_NOT_MODIFIED
+
+    client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS)
+    changed = client.get(f"/customers/{customer_id}", headers={"If-None-Match": etag})
+    assert changed.status_code == status.HTTP_200_OK
+    assert changed.headers["ETag"] != etag and changed.json()["version"] == 2
+    assert client.get("/customers/999", headers={"If-None-Match": "*"}).status_code == status.HTTP_404_NOT_FOUND
+
+def test_order_304_skips_loading_the_order(client, monkeypatch):
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    address_id = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS).json()["id"]
+    order_id = create_order(client, customer_id, address_id)["id"]
+    etag = client.get(f"/orders/{order_id}").headers["ETag"]
+
+    monkeypatch.setattr(orders_service, "get_order", fail)
+    # From the cached order, then from its row
+    for _ in range(2):
+        response = client.get(f"/orders/{order_id}", headers={"If-None-Match": f'"other", {etag}'})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        reset_cache()
+
+def test_analytics_304_skips_the_aggregate(client, db, monkeypatch):
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    address_id = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS).json()["id"]
+    create_order(client, customer_id, address_id)
+    url = "/analytics/orders/time-of-day/?limit=3"
+    etag = client.get(url).headers["ETag"]
+    assert client.get("/analytics/orders/time-of-day/?limit=4").headers["ETag"] != etag
+
+    aggregate = analytics_service.get_orders_by_time_of_day
+    monkeypatch.setattr(analytics_service, "get_orders_by_time_of_day", fail)
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == status.HTTP_304_NOT_MODIFIED
+
+    monkeypatch.setattr(analytics_service, "get_orders_by_time_of_day", aggregate)
+    version = version_queries.get_table_versions(db, ["orders"])[0]
+    create_order(client, customer_id, address_id)
+    assert version_queries.get_table_versions(db, ["orders"])[0] == version + 1
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()[0]["order_count"] == 2
+
+def test_analytics_etags_roll_over_without_writes(client, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_ANALYTICS_TTL", 0)
+    clock = {"now": datetime(2026, 3, 1, 23, 59, 59, tzinfo=timezone.utc).timestamp()}
+    monkeypatch.setattr(conditional.time, "time", lambda: clock["now"])
+
+    def etags(url):
+        before = client.get(url).headers["ETag"]
+        clock["now"] += 2
+        try:
+            return before, client.get(url).headers["ETag"]
+        finally:
+            clock["now"] -= 2
+
+    # Nothing can change without a write
+    before, after = etags("/analytics/orders/time-of-day/")
+    assert before == after
+    # "today" is another day after midnight
+    before, after = etags("/analytics/customers/top-in-store/?window=today")
+    assert before != after
+    # The columnar snapshot may have lagged the table versions by up to a poll
+    monkeypatch.setattr(config, "ANALYTICS_BACKEND", "columnar")
+    before, after = etags("/analytics/orders/time-of-day/")
+    assert before != after
+
+def test_large_responses_are_compressed(client, monkeypatch):
+    monkeypatch.setattr(config, "COMPRESSION_MIN_SIZE", 200)
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS)
+
+    response = client.get(f"/customers/{customer_id}", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    # The client decompressed the body
+    assert int(response.headers["Content-Length"]) < len(response.content)
+    assert response.json()["id"] == customer_id
+
+    assert "Content-Encoding" not in client.get(f"/customers/{customer_id}", headers={"Accept-Encoding": "identity"}).headers
+    assert "Content-Encoding" not in client.get("/health/live", headers={"Accept-Encoding": "gzip"}).headers
+
+def test_encoding_negotiation(monkeypatch):
+    monkeypatch.setattr(middleware, "brotli", object())
+    assert middleware.negotiate_encoding("gzip, deflate, br") == "br"
+    assert middleware.negotiate_encoding("br;q=0.5, gzip") == "gzip"
+    assert middleware.negotiate_encoding("*") == "br"
+    assert middleware.negotiate_encoding("gzip;q=0, identity") is None
+    monkeypatch.setattr(middleware, "brotli", None)
+    assert middleware.negotiate_encoding("br, gzip;q=0.1") == "gzip"
+    assert middleware.negotiate_encoding("br") is None
@@ -0,0 +1,41 @@
+import logging
+from datetime import datetime
+from fastapi import routing
+from sqlalchemy import text
+from app import config
+from app.api.services import customers_service
+from .mock_data import BASE_CUSTOMER, BASE_ADDRESS, create_order_data
+
+def test_connection_is_released_before_serialization(client, db, monkeypatch):
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    address_id = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS).json()["id"]
+    order_data = create_order_data(address_id, [address_id], datetime.utcnow())
+    order = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data).json()
+
+    in_transaction = []
+    serialize_response = routing.serialize_response
+
+    async def recording_serialize_response(**kwargs):
+        in_transaction.append(db.in_transaction())
+        return await serialize_response(**kwargs)
+
+    monkeypatch.setattr(routing, "serialize_response", recording_serialize_response)
+    # ORM results, including their relationships, are converted before the release
+    assert client.get(f"/orders/customers/{customer_id}/orders/").json() == [order]
+    assert client.get(f"/customers/{customer_id}/addresses/").json()[0]["id"] == address_id
+    assert client.get("/customers/").json()[0]["id"] == customer_id
+    assert in_transaction == [False, False, False]
+
+def test_long_connection_holds_are_logged(client, monkeypatch, caplog):
+    def slow_search(db, query):
+        db.execute(text("SELECT pg_sleep(0.05)"))
+        return []
+
+    monkeypatch.setattr(customers_service, "search_customers", slow_search)
+    with caplog.at_level(logging.WARNING, logger="app.database"):
+        client.get("/customers/search/john")
+        assert not caplog.records
+
+        monkeypatch.setattr(config, "DB_HOLD_WARNING_MS", 10)
+        client.get("/customers/search/john")
+    assert [record.getMessage().split(" held")[0] for record in caplog.records] == ["/customers/search/{query}"]
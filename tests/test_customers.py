@@ -1,6 +1,7 @@
 import pytest
 from fastapi import status
-from .mock_data import BASE_CUSTOMER, BASE_ADDRESS, get_test_customers, get_test_addresses
+from datetime import datetime
+from .mock_data import BASE_CUSTOMER, BASE_ADDRESS, get_test_customers, get_test_addresses, create_order_data
 
 def test_create_customer(client):
     response = client.post("/customers/", json=BASE_CUSTOMER)
@@ -101,3 +102,30 @@ def test_search_customers(client):
     assert response.status_code == status.HTTP_200_OK
     data = response.json()
     assert len(data) == 3  # Should find all customers with "John" in their name
+
+def test_get_customers_sorted_by_total_spend(client):
+    # Create customers with increasing spend, plus one customer without orders
+    customers = get_test_customers(4)
+    customer_ids = []
+    for i, customer in enumerate(customers):
+        response = client.post("/customers/", json=customer)
+        customer_id = response.json()["id"]
+        customer_ids.append(customer_id)
+        if i == 3:
+            continue
+        response = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS)
+        address_id = response.json()["id"]
+        order_data = create_order_data(address_id, [address_id], datetime.now())
+        order_data["total_amount"] = 10.0 * (i + 1)
+        response = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data)
+        assert response.status_code == status.HTTP_200_OK
+
+    response = client.get("/customers/?sort_by=total_spend")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert [customer["id"] for customer in data] == [
+        customer_ids[2], customer_ids[1], customer_ids[0], customer_ids[3]
+    ]
+
+    response = client.get("/customers/?sort_by=unknown")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
@@ -0,0 +1,59 @@
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import text
+from app import config, database
+from app.api.services import analytics_service
+from .mock_data import BASE_CUSTOMER, create_order_data, get_test_addresses_with_zip_codes
+
+def test_dashboard_combines_the_analytics(client):
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    address_ids = [
+        client.post(f"/customers/{customer_id}/addresses/", json=address).json()["id"]
+        for address in get_test_addresses_with_zip_codes(["12345", "54321"])
+    ]
+    for address_id in address_ids + address_ids[:1]:
+        order_data = create_order_data(address_id, [address_id], datetime.utcnow())
+        client.post(f"/orders/customers/{customer_id}/orders/", json=order_data)
+
+    params = {"start_date": "2000-01-01T00:00:00", "hour_limit": 3, "customer_limit": 1}
+    dashboard = client.get("/analytics/dashboard", params=params).json()
+    assert dashboard == {
+        "zip_codes": client.get("/analytics/orders/zip-code/", params={"start_date": params["start_date"]}).json(),
+        "time_of_day": client.get("/analytics/orders/time-of-day/",
+                                  params={"start_date": params["start_date"], "limit": 3}).json(),
+        "day_of_week": client.get("/analytics/orders/day-of-week/", params={"start_date": params["start_date"]}).json(),
+        "top_in_store_customers": client.get("/analytics/customers/top-in-store/", params={"limit": 1}).json(),
+    }
+    assert dashboard["zip_codes"][0] == {"zip_code": "12345", "order_count": 2, "unique_customers": 1}
+
+def test_dashboard_parts_run_concurrently_and_cache_as_one(client, monkeypatch):
+    calls = []
+    binds = []
+    lock = threading.Lock()
+
+    def slow_part(db, **kwargs):
+        db.execute(text("SELECT pg_sleep(0.3)"))
+        with lock:
+            calls.append(id(db))
+            binds.append(db.get_bind())
+        return []
+
+    for name in ("get_orders_by_zip_code", "get_orders_by_time_of_day", "get_orders_by_day_of_week",
+                 "get_top_in_store_customers"):
+        monkeypatch.setattr(analytics_service, name, slow_part)
+
+    started = time.monotonic()
+    assert client.get("/analytics/dashboard").json() == {
+        "zip_codes": [], "time_of_day": [], "day_of_week": [], "top_in_store_customers": []
+    }
+    assert time.monotonic() - started < 0.9
+    # Each part on its own session, the extra ones outside the request pool
+    assert len(set(calls)) == 4
+    assert binds.count(database.dashboard_engine) == 3
+    assert database.dashboard_engine.pool.size() == config.ANALYTICS_DASHBOARD_CONCURRENCY
+
+    monkeypatch.setattr(config, "CACHE_ANALYTICS_TTL", 60)
+    for _ in range(2):
+        client.get("/analytics/dashboard", params={"hour_limit": 5})
+    assert len(calls) == 8
@@ -0,0 +1,61 @@
+import pytest
+from datetime import datetime
+from fastapi import status
+from sqlalchemy import event
+from .conftest import engine
+from .mock_data import BASE_CUSTOMER, BASE_ADDRESS, create_order_data, get_test_customers
+
+@pytest.fixture
+def statements():
+    """Collect the SQL statements run against the test database."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+def customer_reads(statements):
+    return [statement for statement in statements if "FROM customers" in statement]
+
+def test_existence_checks_do_not_load_customers(client, statements):
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    address_id = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS).json()["id"]
+
+    statements.clear()
+    order_data = create_order_data(address_id, [address_id], datetime.utcnow())
+    assert client.post(f"/orders/customers/{customer_id}/orders/", json=order_data).status_code == status.HTTP_200_OK
+    assert client.get(f"/customers/{customer_id}/addresses/").status_code == status.HTTP_200_OK
+    assert client.get(f"/orders/customers/{customer_id}/orders/").status_code == status.HTTP_200_OK
+    # The existence of the customer was cached when it was first checked
+    assert customer_reads(statements) == []
+
+def test_missing_customers_are_cached_until_created(client, statements):
+    first, second = get_test_customers(2)
+    customer_id = client.post("/customers/", json=first).json()["id"]
+    next_id = customer_id + 1
+
+    statements.clear()
+    for _ in range(3):
+        response = client.get(f"/customers/{next_id}/addresses/")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert len(customer_reads(statements)) == 1
+    assert all("EXISTS" in statement for statement in customer_reads(statements))
+    assert client.get(f"/customers/{next_id}").status_code == status.HTTP_404_NOT_FOUND
+
+    assert client.post("/customers/", json=second).json()["id"] == next_id
+    assert client.get(f"/customers/{next_id}/addresses/").status_code == status.HTTP_200_OK
+    assert client.get(f"/customers/{next_id}").json()["email"] == second["email"]
+
+def test_missing_orders_are_cached_until_created(client):
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    address_id = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS).json()["id"]
+    order_data = create_order_data(address_id, [address_id], datetime.utcnow())
+    first = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data).json()
+
+    assert client.get(f"/orders/{first['id'] + 1}").status_code == status.HTTP_404_NOT_FOUND
+    second = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data).json()
+    assert second["id"] == first["id"] + 1
+    assert client.get(f"/orders/{second['id']}").json() == second
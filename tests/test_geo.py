@@ -0,0 +1,68 @@
+import itertools
+import pytest
+from types import SimpleNamespace
+from fastapi import status
+from datetime import datetime
+from app import models
+from app.api.queries import geo_rollup_queries
+from app.api.queries.geo_rollup_queries import rebuild_geo_rollups
+from .mock_data import BASE_CUSTOMER, BASE_ADDRESS, create_order_data
+
+PLACES = [
+    # (city, state, zip_code, orders)
+    ("San Francisco", "CA", "94105", 4),
+    ("San Francisco", "CA", "94110-1234", 2),
+    ("Los Angeles", "CA", "90012", 3),
+    ("Austin", "TX", "73301", 1),
+]
+
+@pytest.fixture
+def geo_orders(client, monkeypatch):
+    """Create orders billed to and shipped to several places, spread over the rollup shards."""
+    shards = itertools.cycle(range(geo_rollup_queries.GEO_ROLLUP_SHARDS))
+    monkeypatch.setattr(geo_rollup_queries, "random", SimpleNamespace(randrange=lambda stop: next(shards)))
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    address_ids = []
+    for city, state, zip_code, _ in PLACES:
+        address = {**BASE_ADDRESS, "city": city, "state": state, "zip_code": zip_code}
+        address_ids.append(client.post(f"/customers/{customer_id}/addresses/", json=address).json()["id"])
+    for address_id, (_, _, _, orders) in zip(address_ids, PLACES):
+        for _ in range(orders):
+            # Every order also ships to Austin
+            order_data = create_order_data(address_id, [address_id, address_ids[-1]], datetime.utcnow())
+            response = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data)
+            assert response.status_code == status.HTTP_200_OK
+    return customer_id
+
+def geo(client, **params):
+    response = client.get("/analytics/orders/geo/", params=params)
+    assert response.status_code == status.HTTP_200_OK
+    return [(row["key"], row["parent"], row["order_count"]) for row in response.json()]
+
+def test_geo_levels_and_drill_down(client, geo_orders):
+    assert geo(client) == [("CA", None, 9), ("TX", None, 1)]
+    assert geo(client, level="city", parent="ca") == [("San Francisco", "CA", 6), ("Los Angeles", "CA", 3)]
+    assert geo(client, level="zip3", parent="CA") == [("941", "CA", 6), ("900", "CA", 3)]
+    assert geo(client, level="zip", parent="941") == [("94105", "941", 4), ("94110", "941", 2)]
+    assert geo(client, level="zip", limit=2) == [("94105", "941", 4), ("90012", "900", 3)]
+    assert geo(client, level="zip", parent="000") == []
+
+    # Shipping rows: each order ships to its own place and to Austin
+    assert geo(client, address_type="shipping") == [("TX", None, 11), ("CA", None, 9)]
+    assert geo(client, level="city", address_type="shipping", parent="TX") == [("Austin", "TX", 11)]
+
+def test_geo_rollups_rebuild_matches_write_path(client, db, geo_orders):
+    # Concurrent orders to one state count in different rows
+    assert db.query(models.OrderGeoRollup).filter_by(address_type="billing", level="state", key="CA").count() == 9
+    levels = ["state", "city", "zip3", "zip"]
+    before = {
+        (level, address_type): geo(client, level=level, address_type=address_type, limit=1000)
+        for level in levels for address_type in ("billing", "shipping")
+    }
+    assert rebuild_geo_rollups(db) == sum(len(rows) for rows in before.values())
+    for (level, address_type), rows in before.items():
+        assert geo(client, level=level, address_type=address_type, limit=1000) == rows
+
+def test_geo_rejects_unknown_level(client):
+    response = client.get("/analytics/orders/geo/?level=county")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
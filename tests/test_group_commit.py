@@ -0,0 +1,107 @@
+import threading
+import pytest
+from datetime import datetime
+from fastapi import status
+from sqlalchemy.exc import IntegrityError
+from app import config, models, schemas
+from app.api.services import order_pipeline, orders_service
+from .conftest import TestingSessionLocal
+from .mock_data import BASE_CUSTOMER, BASE_ADDRESS, create_order_data
+
+@pytest.fixture(autouse=True)
+def group_commit(monkeypatch):
+    monkeypatch.setattr(config, "ORDER_GROUP_COMMIT", True)
+    # Long enough for every test order to land in the same batch
+    monkeypatch.setattr(config, "ORDER_GROUP_COMMIT_MAX_WAIT_MS", 200)
+    order_pipeline.reset_pipeline()
+    yield
+    order_pipeline.reset_pipeline()
+
+def create_customer_with_address(client):
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    address_id = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS).json()["id"]
+    return customer_id, address_id
+
+def order_create(address_id):
+    return schemas.OrderCreate(**create_order_data(address_id, [address_id], datetime.utcnow()))
+
+def create_concurrently(items):
+    """Create each (order, customer_id) from its own thread and session; returns ids or errors."""
+    results = [None] * len(items)
+
+    def create(index, order, customer_id):
+        db = TestingSessionLocal()
+        try:
+            results[index] = orders_service.create_order(db, order, customer_id).id
+        except Exception as error:
+            results[index] = error
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=create, args=(index, *item)) for index, item in enumerate(items)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_post_contract_is_unchanged(client):
+    customer_id, address_id = create_customer_with_address(client)
+    order_data = create_order_data(address_id, [address_id], datetime.utcnow())
+
+    response = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data)
+    assert response.status_code == status.HTTP_200_OK
+    order = response.json()
+    assert order["customer_id"] == customer_id
+    assert order["shipping_addresses"][0]["address_id"] == address_id
+    assert client.get(f"/orders/{order['id']}").json() == order
+
+def test_concurrent_orders_share_one_transaction(client, db):
+    customer_id, address_id = create_customer_with_address(client)
+
+    ids = create_concurrently([(order_create(address_id), customer_id) for _ in range(20)])
+    assert sorted(ids) == list(range(1, 21))
+    assert order_pipeline.get_pipeline(db, orders_service.create_orders).batches == 1
+
+    stats = db.query(models.CustomerOrderStats).filter_by(customer_id=customer_id).one()
+    assert stats.order_count == 20
+    rollups = db.query(models.OrderGeoRollup).filter_by(
+        address_type="billing", level="zip", key=BASE_ADDRESS["zip_code"]
+    ).all()
+    assert sum(rollup.order_count for rollup in rollups) == 20
+
+def test_failing_order_fails_alone(client, db):
+    customer_id, address_id = create_customer_with_address(client)
+
+    results = create_concurrently([
+        (order_create(address_id), customer_id),
+        (order_create(999999), customer_id),
+        (order_create(address_id), customer_id),
+    ])
+    assert isinstance(results[1], IntegrityError)
+    good = [results[0], results[2]]
+    assert all(isinstance(order_id, int) for order_id in good)
+    assert sorted(order.id for order in db.query(models.Order)) == sorted(good)
+    assert db.query(models.CustomerOrderStats).filter_by(customer_id=customer_id).one().order_count == 2
+
+def test_failing_side_effects_do_not_fail_committed_orders(client, db, monkeypatch):
+    customer_id, address_id = create_customer_with_address(client)
+
+    def fail(order):
+        raise RuntimeError("post-commit failure")
+
+    monkeypatch.setattr(orders_service.columnar_analytics, "record_order", fail)
+    results = create_concurrently([(order_create(address_id), customer_id) for _ in range(3)])
+    assert sorted(results) == [1, 2, 3]
+    assert order_pipeline.get_pipeline(db, orders_service.create_orders).batches == 1
+
+def test_failure_after_commit_is_not_retried(client, db, monkeypatch):
+    customer_id, address_id = create_customer_with_address(client)
+
+    def fail(db, order_ids):
+        raise RuntimeError("post-commit failure")
+
+    monkeypatch.setattr(orders_service.orders_queries, "get_orders_by_ids", fail)
+    results = create_concurrently([(order_create(address_id), customer_id) for _ in range(3)])
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert db.query(models.Order).count() == 3
@@ -0,0 +1,61 @@
+import time
+import pytest
+from fastapi import status
+from sqlalchemy import Column, Integer, MetaData, String, Table
+from app import models
+from app.api.queries import health_queries
+from app.api.services import health_service
+
+@pytest.fixture(autouse=True)
+def fresh_health():
+    health_service.reset_deep_status()
+    yield
+    health_service.reset_deep_status()
+
+def test_liveness_does_no_io(client, monkeypatch):
+    monkeypatch.setattr(health_service, "get_health_engine", lambda: pytest.fail("liveness touched the database"))
+    response = client.get("/health/live")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"status": "alive"}
+
+def test_readiness_uses_the_cached_probe(client, monkeypatch):
+    prober = health_service.get_prober()
+    prober.probe()
+    monkeypatch.setattr(health_service, "get_health_engine", lambda: pytest.fail("readiness touched the database"))
+    response = client.get("/health/ready")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["database"] == "connected"
+    assert client.get("/health").json()["status"] == "healthy"
+
+    # A probe that stopped reporting, e.g. because it hangs, is a failure
+    monkeypatch.setattr(prober, "checked_at", time.monotonic() - 10 * prober.interval)
+    assert client.get("/health/ready").status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert client.get("/health").json()["status"] == "unhealthy"
+
+def test_failed_probe_reports_the_error(monkeypatch):
+    class DownEngine:
+        def connect(self):
+            raise ConnectionError("database is down")
+
+    monkeypatch.setattr(health_service, "get_health_engine", lambda: DownEngine())
+    prober = health_service.DatabaseProber(interval=5)
+    prober.probe()
+    assert not prober.is_healthy()
+    assert prober.error == "ConnectionError: database is down"
+
+def test_deep_check_reports_pool_replication_and_schema(client):
+    response = client.get("/health/deep")
+    report = response.json()
+    assert response.status_code == status.HTTP_200_OK, report
+    assert report["replication"]["role"] == "primary"
+    assert report["schema"] == {"up_to_date": True, "missing": []}
+    assert set(report["pool"]) == {"size", "checked_out", "overflow"}
+    assert "classes" in report["admission"]
+
+def test_missing_tables_and_columns_are_listed():
+    metadata = MetaData()
+    models.Customer.__table__.to_metadata(metadata)
+    metadata.tables["customers"].append_column(Column("loyalty_tier", String))
+    Table("loyalty_programs", metadata, Column("id", Integer, primary_key=True))
+    with health_service.get_health_engine().connect() as connection:
+        assert health_queries.get_missing_schema(connection, metadata) == ["customers.loyalty_tier", "loyalty_programs"]
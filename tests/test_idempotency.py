@@ -0,0 +1,127 @@
+import threading
+import time
+from datetime import datetime
+from fastapi import status
+from app import config, models, schemas
+from app.api.queries import idempotency_queries
+from app.api.services import customers_service, idempotency_service
+from .conftest import TestingSessionLocal
+from .mock_data import BASE_CUSTOMER, BASE_ADDRESS, create_order_data
+
+def test_retries_replay_the_stored_response(client, db):
+    headers = {"Idempotency-Key": "customer-1"}
+    first = client.post("/customers/", json=BASE_CUSTOMER, headers=headers)
+    assert first.status_code == status.HTTP_200_OK
+    assert "Idempotent-Replayed" not in first.headers
+    customer_id = first.json()["id"]
+
+    # Served by the worker's front cache, then by the key table
+    for _ in range(2):
+        retry = client.post("/customers/", json=BASE_CUSTOMER, headers=headers)
+        assert retry.json() == first.json()
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        idempotency_service.reset_front_cache()
+
+    address = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS, headers=headers).json()
+    order_data = create_order_data(address["id"], [address["id"]], datetime.utcnow())
+    order = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data, headers=headers).json()
+    assert client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS, headers=headers).json() == address
+    assert client.post(f"/orders/customers/{customer_id}/orders/", json=order_data, headers=headers).json() == order
+
+    assert db.query(models.Customer).count() == 1
+    assert db.query(models.Address).count() == 1
+    assert db.query(models.Order).count() == 1
+    assert db.query(models.CustomerOrderStats).one().order_count == 1
+
+def test_key_reused_with_a_different_request_is_rejected(client):
+    headers = {"Idempotency-Key": "customer-1"}
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER, headers=headers).json()["id"]
+
+    other = {**BASE_CUSTOMER, "email": "other@example.com"}
+    response = client.post("/customers/", json=other, headers=headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    # Keys are scoped per endpoint and the path is part of the request
+    assert client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS, headers=headers).status_code \
+        == status.HTTP_200_OK
+    assert client.post(f"/customers/{customer_id + 1}/addresses/", json=BASE_ADDRESS, headers=headers).status_code \
+        == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_failed_requests_release_their_key(client):
+    headers = {"Idempotency-Key": "address-1"}
+    response = client.post("/customers/999/addresses/", json=BASE_ADDRESS, headers=headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    response = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+def test_concurrent_duplicates_run_once(db):
+    customer = schemas.CustomerCreate(**BASE_CUSTOMER)
+    results = []
+
+    def create():
+        session = TestingSessionLocal()
+
+        def handler():
+            time.sleep(0.2)
+            return customers_service.create_customer(session, customer)
+
+        try:
+            results.append(idempotency_service.run_once(
+                session, "customer-1", "create_customer", {"customer": customer}, handler, schemas.Customer
+            ))
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=create) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(replayed for _, replayed in results) == [False, True, True]
+    assert len({response["id"] for response, _ in results}) == 1
+    assert db.query(models.Customer).count() == 1
+
+def test_expired_keys_are_reused_and_purged(client, db, monkeypatch):
+    monkeypatch.setattr(config, "IDEMPOTENCY_KEY_TTL", 0.05)
+    headers = {"Idempotency-Key": "customer-1"}
+    first = client.post("/customers/", json=BASE_CUSTOMER, headers=headers).json()
+    time.sleep(0.1)
+    other = {**BASE_CUSTOMER, "email": "other@example.com", "telephone": "+11234567899"}
+    second = client.post("/customers/", json=other, headers=headers)
+    assert second.status_code == status.HTTP_200_OK
+    assert second.json()["id"] != first["id"]
+
+    time.sleep(0.1)
+    assert idempotency_queries.delete_expired_keys(db) == 1
+    assert db.query(models.IdempotencyKey).count() == 0
+
+def test_failure_storing_the_response_rolls_back_the_writes(client, db, monkeypatch):
+    # Orders with a key never go through the pipeline, whose commit would be separate
+    monkeypatch.setattr(config, "ORDER_GROUP_COMMIT", True)
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    address_id = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS).json()["id"]
+    order_data = create_order_data(address_id, [address_id], datetime.utcnow())
+    store_response = idempotency_queries.store_response
+
+    def fail(*args):
+        raise RuntimeError("lost connection")
+
+    monkeypatch.setattr(idempotency_queries, "store_response", fail)
+    headers = {"Idempotency-Key": "order-1"}
+    try:
+        client.post(f"/orders/customers/{customer_id}/orders/", json=order_data, headers=headers)
+    except RuntimeError:
+        pass
+    other = TestingSessionLocal()
+    try:
+        assert other.query(models.Order).count() == 0
+        assert other.query(models.IdempotencyKey).count() == 0
+    finally:
+        other.close()
+
+    monkeypatch.setattr(idempotency_queries, "store_response", store_response)
+    response = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert db.query(models.Order).count() == 1
@@ -0,0 +1,124 @@
+import random
+import pytest
+from fastapi import status
+from datetime import date, datetime, timedelta
+from collections import Counter
+from sqlalchemy import text
+from app import config
+from app.api.services import leaderboard
+from .mock_data import BASE_ADDRESS, create_order_data, get_test_customers
+
+@pytest.fixture(autouse=True)
+def fresh_leaderboard():
+    leaderboard.reset_leaderboard()
+    yield
+    leaderboard.reset_leaderboard()
+
+def test_space_saving_is_bounded_and_keeps_heavy_hitters():
+    rng = random.Random(0)
+    summary = leaderboard.SpaceSaving(capacity=50)
+    exact = Counter()
+    for _ in range(50_000):
+        # A few heavy customers and a long tail of occasional ones
+        customer_id = rng.randrange(10) if rng.random() < 0.3 else rng.randrange(10, 100_000)
+        summary.update(customer_id)
+        exact[customer_id] += 1
+
+    assert len(summary.counts) <= 50
+    assert all(summary.counts[item] >= exact[item] for item in summary.counts)
+    heavy = [item for item, _ in exact.most_common(10)]
+    top = sorted(summary.counts, key=summary.counts.get, reverse=True)[:10]
+    assert set(top) == set(heavy)
+
+def test_windows_slide_by_day():
+    board = leaderboard.Leaderboard(capacity=100, top_size=10)
+    today = date(2024, 5, 31)
+    board.seed([(today - timedelta(days=20), 1, 5), (today - timedelta(days=3), 2, 3)], today)
+    for _ in range(2):
+        board.record(3, today)
+
+    assert board.top("today", 10) == [(3, 2)]
+    assert board.top("7d", 10) == [(2, 3), (3, 2)]
+    assert board.top("30d", 10) == [(1, 5), (2, 3), (3, 2)]
+
+    board.advance(today + timedelta(days=10))
+    assert board.top("today", 10) == []
+    assert board.top("7d", 10) == []
+    assert board.top("30d", 10) == [(2, 3), (3, 2)]
+
+def test_incremental_top_matches_window_counts():
+    rng = random.Random(1)
+    board = leaderboard.Leaderboard(capacity=30, top_size=5)
+    start = date(2024, 1, 1)
+    for step in range(5_000):
+        day = start + timedelta(days=step // 500)
+        board.record(rng.randrange(60), day)
+        if step % 97 == 0:
+            for window in leaderboard.WINDOWS:
+                expected = sorted(board.window_counts[window].items(), key=lambda item: (-item[1], item[0]))[:5]
+                assert board.top(window, 5) == expected
+
+def test_top_in_store_window_endpoint(client, db, monkeypatch):
+    customer_ids = []
+    for index, customer in enumerate(get_test_customers(4)):
+        customer_id = client.post("/customers/", json=customer).json()["id"]
+        address_id = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS).json()["id"]
+        customer_ids.append((customer_id, address_id))
+        for _ in range(index + 1):
+            order_data = {**create_order_data(address_id, [address_id], datetime.utcnow()), "order_type": "in_store"}
+            assert client.post(f"/orders/customers/{customer_id}/orders/", json=order_data).status_code == status.HTTP_200_OK
+
+    response = client.get("/analytics/customers/top-in-store/?window=today&limit=3")
+    assert response.status_code == status.HTTP_200_OK
+    assert [row["in_store_order_count"] for row in response.json()] == [4, 3, 2]
+    assert response.json() == client.get("/analytics/customers/top-in-store/?limit=3").json()
+
+    # Orders created through this worker are counted immediately
+    customer_id, address_id = customer_ids[0]
+    for _ in range(5):
+        order_data = {**create_order_data(address_id, [address_id], datetime.utcnow()), "order_type": "in_store"}
+        client.post(f"/orders/customers/{customer_id}/orders/", json=order_data)
+    response = client.get("/analytics/customers/top-in-store/?window=7d&limit=1")
+    assert response.json()[0]["customer_id"] == customer_id
+    assert response.json()[0]["in_store_order_count"] == 6
+
+    # Changes made outside this worker show up once the leaderboard reconciles with SQL
+    db.execute(text("""
+        DELETE FROM order_shipping_addresses
+        WHERE order_id IN (SELECT id FROM orders WHERE customer_id = :id)
+    """), {"id": customer_id})
+    db.execute(text("UPDATE orders SET order_date = order_date - interval '10 days' WHERE customer_id = :id"),
+               {"id": customer_id})
+    db.commit()
+    assert client.get("/analytics/customers/top-in-store/?window=7d&limit=1").json()[0]["customer_id"] == customer_id
+    monkeypatch.setattr(config, "LEADERBOARD_RECONCILE_INTERVAL", 0)
+    response = client.get("/analytics/customers/top-in-store/?window=7d&limit=1")
+    assert response.json()[0]["customer_id"] == customer_ids[3][0]
+    response = client.get("/analytics/customers/top-in-store/?window=30d&limit=1")
+    assert response.json()[0]["customer_id"] == customer_id
+
+def test_seeded_orders_are_not_counted_again(client, db, monkeypatch):
+    customer_id = client.post("/customers/", json=get_test_customers(1)[0]).json()["id"]
+    address_id = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS).json()["id"]
+
+    def create_in_store_order():
+        order_data = {**create_order_data(address_id, [address_id], datetime.utcnow()), "order_type": "in_store"}
+        order = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data).json()
+        return {**order, "order_date": datetime.fromisoformat(order["order_date"])}
+
+    # The notification of an order the seed already counted arrives late
+    order = create_in_store_order()
+    board = leaderboard.get_leaderboard(db)
+    leaderboard.record_changes([order])
+    assert board.top("today", 1) == [(customer_id, 1)]
+
+    # Also across re-seeds, while new orders keep counting
+    monkeypatch.setattr(config, "LEADERBOARD_RECONCILE_INTERVAL", 0)
+    order = create_in_store_order()
+    board = leaderboard.get_leaderboard(db)
+    leaderboard.record_changes([order, {**order, "id": order["id"] + 1}])
+    assert board.top("today", 1) == [(customer_id, 3)]
+
+def test_top_in_store_rejects_unknown_window(client):
+    response = client.get("/analytics/customers/top-in-store/?window=1y")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
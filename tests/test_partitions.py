@@ -0,0 +1,84 @@
+import pytest
+from fastapi import status
+from datetime import date, datetime, timedelta
+from sqlalchemy import text
+from app.api.queries import partition_queries
+from .mock_data import BASE_CUSTOMER, BASE_ADDRESS, create_order_data
+
+@pytest.fixture
+def customer_with_orders(client):
+    """Create a customer with three orders and return the customer and order IDs."""
+    response = client.post("/customers/", json=BASE_CUSTOMER)
+    customer_id = response.json()["id"]
+    response = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS)
+    address_id = response.json()["id"]
+    order_ids = []
+    for _ in range(3):
+        order_data = create_order_data(address_id, [address_id], datetime.now())
+        response = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data)
+        assert response.status_code == status.HTTP_200_OK
+        order_ids.append(response.json()["id"])
+    return customer_id, order_ids
+
+def test_create_partitions_moves_rows_out_of_default(client, db, customer_with_orders):
+    """Creating the current month's partition moves existing rows out of the default partition."""
+    customer_id, order_ids = customer_with_orders
+    this_month = date.today().replace(day=1)
+
+    created = partition_queries.create_monthly_partitions(db, this_month, 2)
+    assert partition_queries.partition_name("orders", this_month) in created
+    assert partition_queries.partition_name("order_shipping_addresses", this_month) in created
+    assert len(created) == 4
+
+    # Running again is a no-op
+    assert partition_queries.create_monthly_partitions(db, this_month, 2) == []
+
+    assert db.execute(text("SELECT count(*) FROM orders_default")).scalar() == 0
+    assert db.execute(text(
+        f"SELECT count(*) FROM {partition_queries.partition_name('orders', this_month)}"
+    )).scalar() == len(order_ids)
+
+    # Orders remain readable through the parent table with their shipping addresses
+    response = client.get(f"/orders/{order_ids[0]}")
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()["shipping_addresses"]) == 1
+
+def test_detach_partitions_before(db, customer_with_orders):
+    """Old partitions are detached, children first, and keep their rows."""
+    this_month = date.today().replace(day=1)
+    last_month = partition_queries.add_months(this_month, -1)
+    partition_queries.create_monthly_partitions(db, last_month, 2)
+
+    detached = partition_queries.detach_partitions_before(db, this_month)
+    assert detached == [
+        partition_queries.partition_name("order_shipping_addresses", last_month),
+        partition_queries.partition_name("orders", last_month),
+    ]
+    attached = [p["name"] for p in partition_queries.list_partitions(db, "orders")]
+    assert partition_queries.partition_name("orders", last_month) not in attached
+    assert partition_queries.partition_name("orders", this_month) in attached
+
+    for name in detached:
+        db.execute(text(f"DROP TABLE {name}"))
+    db.commit()
+
+def test_order_listing_and_analytics_time_window(client, customer_with_orders):
+    """Time-window filters on order_date apply to listings and analytics."""
+    customer_id, order_ids = customer_with_orders
+    now = datetime.utcnow()
+    past = {"start_date": (now - timedelta(days=30)).isoformat(), "end_date": (now - timedelta(days=1)).isoformat()}
+    recent = {"start_date": (now - timedelta(hours=1)).isoformat(), "end_date": (now + timedelta(hours=1)).isoformat()}
+
+    response = client.get(f"/orders/customers/{customer_id}/orders/", params=recent)
+    assert len(response.json()) == len(order_ids)
+    response = client.get("/orders/", params=past)
+    assert response.json() == []
+
+    response = client.get("/analytics/orders/zip-code/", params={"address_type": "shipping", **recent})
+    assert response.json() == [{
+        "zip_code": BASE_ADDRESS["zip_code"], "order_count": len(order_ids), "unique_customers": 1
+    }]
+    response = client.get("/analytics/orders/zip-code/", params=past)
+    assert response.json() == []
+    response = client.get("/analytics/orders/time-of-day/", params={"limit": 24, **past})
+    assert sum(item["order_count"] for item in response.json()) == 0
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import time
+import pytest
+from fastapi import status
+from sqlalchemy import text
+from app import config, database
+from app.main import app
+from app.api.services import customers_service
+from .conftest import TestingSessionLocal
+
+def sleeping_search(seconds):
+    def search(db, query):
+        db.execute(text("SELECT pg_sleep(:seconds)"), {"seconds": seconds})
+        return []
+    return search
+
+def running_sleeps(db):
+    db.rollback()
+    return db.execute(text(
+        "SELECT count(*) FROM pg_stat_activity WHERE query LIKE 'SELECT pg_sleep%' AND pid <> pg_backend_pid()"
+    )).scalar()
+
+def test_slow_query_hits_the_route_timeout(client, db, monkeypatch):
+    monkeypatch.setattr(config, "STATEMENT_TIMEOUT_SEARCH_MS", 100)
+    monkeypatch.setattr(customers_service, "search_customers", sleeping_search(5))
+
+    started = time.monotonic()
+    response = client.get("/customers/search/john")
+    assert response.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+    assert time.monotonic() - started < 2
+
+    # The timeout ends with the request and never sticks to the connection
+    db.rollback()
+    assert db.execute(text("SHOW statement_timeout")).scalar() == "0"
+    assert client.get("/customers/").status_code == status.HTTP_200_OK
+
+def test_queries_within_the_timeout_succeed(client, monkeypatch):
+    monkeypatch.setattr(customers_service, "search_customers", sleeping_search(0.05))
+    assert client.get("/customers/search/john").json() == []
+
+def test_client_disconnect_cancels_the_query(client, db, monkeypatch):
+    monkeypatch.setattr(customers_service, "search_customers", sleeping_search(5))
+    db.rollback()
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http", "root_path": "",
+        "path": "/customers/search/john", "raw_path": b"/customers/search/john", "query_string": b"",
+        "headers": [(b"host", b"testserver")], "client": ("testclient", 50000), "server": ("testserver", 80),
+    }
+    sent = []
+    request = iter([{"type": "http.request", "body": b"", "more_body": False}])
+
+    async def receive():
+        message = next(request, None)
+        if message is None:
+            # The client gives up while the query runs
+            await asyncio.sleep(0.3)
+            message = {"type": "http.disconnect"}
+        return message
+
+    async def send(message):
+        sent.append(message)
+
+    loop = asyncio.new_event_loop()
+    try:
+        started = time.monotonic()
+        loop.run_until_complete(app(scope, receive, send))
+        elapsed = time.monotonic() - started
+    finally:
+        loop.close()
+
+    assert elapsed < 2
+    assert sent[0]["status"] == status.HTTP_504_GATEWAY_TIMEOUT
+    assert json.loads(sent[1]["body"]) == {"detail": "Database query timed out"}
+    assert running_sleeps(db) == 0
+
+def test_released_connections_are_forgotten(db):
+    connections = database.RequestConnections()
+    token = database.request_connections.set(connections)
+    try:
+        session = TestingSessionLocal()
+        session.execute(text("SELECT 1"))
+        assert list(connections._connections) == [session]
+        # A read-only session is closed without a commit or rollback
+        session.close()
+        assert connections._connections == {}
+    finally:
+        database.request_connections.reset(token)
@@ -0,0 +1,110 @@
+import random
+import pytest
+from fastapi import status
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from app.api.services.tdigest import TDigest
+from app.api.services.revenue_service import refresh_revenue_rollups
+from .mock_data import BASE_CUSTOMER, get_test_addresses_with_zip_codes, create_order_data
+
+@pytest.fixture
+def customer_addresses(client):
+    """Create a customer with a billing address in each of two zip codes."""
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    address_ids = [
+        client.post(f"/customers/{customer_id}/addresses/", json=address).json()["id"]
+        for address in get_test_addresses_with_zip_codes(["12345", "54321"])
+    ]
+    return customer_id, address_ids
+
+def create_order(client, customer_id, address_id, amount, order_type="online"):
+    order_data = create_order_data(address_id, [address_id], datetime.utcnow())
+    order_data["total_amount"] = amount
+    order_data["order_type"] = order_type
+    response = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data)
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+def test_tdigest_percentiles_and_merge():
+    rng = random.Random(0)
+    values = [rng.uniform(0, 1000) for _ in range(20000)]
+    digest = TDigest(100)
+    parts = [TDigest(100) for _ in range(10)]
+    for index, value in enumerate(values):
+        digest.add(value)
+        parts[index % 10].add(value)
+    merged = TDigest(100)
+    for part in parts:
+        merged.merge(part)
+
+    ordered = sorted(values)
+    for q in (0.5, 0.9, 0.99):
+        exact = ordered[int(q * len(ordered))]
+        assert abs(digest.quantile(q) - exact) < 10
+        assert abs(merged.quantile(q) - exact) < 10
+    assert merged.count == len(values)
+    assert len(merged.means) < 200
+
+def test_revenue_sums_keep_cents(client, customer_addresses):
+    customer_id, (address_id, _) = customer_addresses
+    for amount in (0.1, 0.2, 19.99):
+        order = create_order(client, customer_id, address_id, amount)
+    assert order["total_amount"] == 19.99
+
+    response = client.get("/analytics/revenue/?group_by=zip")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [{
+        "group": "12345", "order_count": 3, "total_revenue": 20.29,
+        "average_order_value": 6.76, "p50": 0.2, "p90": 19.99, "p99": 19.99
+    }]
+
+def test_revenue_rejects_fractional_cents_and_bad_groups(client, customer_addresses):
+    customer_id, (address_id, _) = customer_addresses
+    order_data = create_order_data(address_id, [address_id], datetime.utcnow())
+    order_data["total_amount"] = 10.005
+    response = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert client.get("/analytics/revenue/?group_by=customer").status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+def test_revenue_merges_rollups_with_live_orders(client, db, customer_addresses):
+    """Completed days come from the sketches, today from the orders, with the same totals."""
+    customer_id, address_ids = customer_addresses
+    for index in range(40):
+        order_type = "in_store" if index % 4 == 0 else "online"
+        create_order(client, customer_id, address_ids[index % 2], 10 + index, order_type)
+
+    # Move half of the orders to earlier days (shipping rows are keyed by the order date)
+    db.execute(text("DELETE FROM order_shipping_addresses WHERE order_id % 2 = 0"))
+    db.execute(text("""
+        UPDATE orders SET order_date = order_date - make_interval(days => CAST(id % 3 + 1 AS int))
+        WHERE id % 2 = 0
+    """))
+    db.commit()
+    groups = ["zip", "hour", "day_of_week", "order_type", "status", "date"]
+    live = {group: client.get(f"/analytics/revenue/?group_by={group}").json() for group in groups}
+    # A window starting inside a sketched day counts that day's later orders only
+    window = {"start_date": (datetime.utcnow() - timedelta(days=2, hours=1)).isoformat()}
+    live_window = client.get("/analytics/revenue/?group_by=date", params=window).json()
+
+    assert refresh_revenue_rollups(db) == 3
+    assert refresh_revenue_rollups(db) == 2  # Re-sketches the lookback window only
+    for group in groups:
+        rolled_up = client.get(f"/analytics/revenue/?group_by={group}").json()
+        assert rolled_up == live[group], group
+    assert client.get("/analytics/revenue/?group_by=date", params=window).json() == live_window
+    in_window = db.execute(text("SELECT count(*) FROM orders WHERE order_date >= :start"),
+                           {"start": window["start_date"]}).scalar()
+    assert sum(row["order_count"] for row in live_window) == in_window
+
+    by_type = {row["group"]: row for row in live["order_type"]}
+    assert by_type["in_store"]["order_count"] == 10
+    assert by_type["in_store"]["total_revenue"] == sum(10 + index for index in range(0, 40, 4))
+    assert sum(row["order_count"] for row in live["date"]) == 40
+
+    # A window starting at midnight reads whole sketched days
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    response = client.get("/analytics/revenue/?group_by=date", params={
+        "start_date": (today - timedelta(days=1)).isoformat()
+    })
+    dates = sorted(row["group"] for row in response.json())
+    assert dates == [(today - timedelta(days=1)).date().isoformat(), today.date().isoformat()]
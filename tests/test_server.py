@@ -0,0 +1,38 @@
+import pytest
+from click.testing import CliRunner
+from app import config, database, main
+
+@pytest.fixture
+def uvicorn_runs(monkeypatch):
+    runs = []
+    monkeypatch.setattr(main.uvicorn, "run", lambda app, **options: runs.append((app, options)))
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    return runs
+
+def test_connection_budget_is_split_between_workers(monkeypatch):
+    monkeypatch.setattr(config, "CHANGE_LISTENER", True)
+    monkeypatch.setattr(config, "ANALYTICS_DASHBOARD_CONCURRENCY", 3)
+    assert database.pool_limits(100, 4) == (19, 0)
+    assert database.pool_limits(0, 4) == (5, 10)
+    with pytest.raises(ValueError):
+        database.pool_limits(4, 4)
+    monkeypatch.setattr(config, "CHANGE_LISTENER", False)
+    assert database.pool_limits(100, 4) == (20, 0)
+
+def test_start_runs_the_requested_workers(uvicorn_runs):
+    result = CliRunner().invoke(main.cli, ["start", "--workers", "3", "--server", "uvicorn", "--port", "9000"])
+    assert result.exit_code == 0, result.output
+    assert uvicorn_runs == [("app.main:app", {
+        "host": "0.0.0.0", "port": 9000, "workers": 3, "timeout_keep_alive": config.SERVER_KEEPALIVE
+    })]
+    assert main.os.environ["WEB_CONCURRENCY"] == "3"
+
+def test_dev_starts_the_reloading_server(uvicorn_runs):
+    result = CliRunner().invoke(main.cli, ["dev"])
+    assert result.exit_code == 0, result.output
+    assert uvicorn_runs == [("app.main:app", {"host": "0.0.0.0", "port": 8000, "reload": True})]
+
+def test_warm_up_opens_pooled_connections():
+    database.engine.dispose()
+    database.warm_up_pool(2)
+    assert database.engine.pool.checkedin() == 2
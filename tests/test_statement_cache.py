@@ -0,0 +1,17 @@
+from app.api.queries import customer_queries
+from .mock_data import BASE_ADDRESS, get_test_customers
+
+def test_cached_lookups_bind_each_calls_arguments(client, db):
+    customers = [client.post("/customers/", json=customer).json() for customer in get_test_customers(2)]
+    address = client.post(f"/customers/{customers[1]['id']}/addresses/", json=BASE_ADDRESS).json()
+
+    # Each statement is compiled once; later calls must still use their own values
+    for customer in customers:
+        assert customer_queries.get_customer(db, customer["id"]).email == customer["email"]
+        assert customer_queries.get_customer_by_email(db, customer["email"]).id == customer["id"]
+        assert customer_queries.get_customer_by_telephone(db, customer["telephone"]).id == customer["id"]
+        assert customer_queries.customer_exists(db, customer["id"])
+    assert not customer_queries.customer_exists(db, customers[1]["id"] + 1)
+    assert customer_queries.get_customer_by_email(db, "nobody@example.com") is None
+    assert customer_queries.get_customer_addresses(db, customers[0]["id"]) == []
+    assert [a.id for a in customer_queries.get_customer_addresses(db, customers[1]["id"])] == [address["id"]]
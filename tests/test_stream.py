@@ -0,0 +1,98 @@
+import asyncio
+import json
+import pytest
+from collections import Counter
+from datetime import datetime
+from fastapi import status
+from app import config
+from app.api.services import event_bus, leaderboard
+from .mock_data import BASE_CUSTOMER, BASE_ADDRESS, create_order_data
+
+@pytest.fixture(autouse=True)
+def fresh_bus(monkeypatch):
+    monkeypatch.setattr(config, "STREAM_FLUSH_INTERVAL", 0.01)
+    event_bus.reset_event_bus()
+    leaderboard.reset_leaderboard()
+    yield
+    event_bus.reset_event_bus()
+    leaderboard.reset_leaderboard()
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    # Let the flusher notice it has no subscribers left
+    loop.run_until_complete(asyncio.sleep(5 * config.STREAM_FLUSH_INTERVAL))
+    loop.close()
+
+async def connected():
+    return False
+
+def parse(message: bytes) -> dict:
+    fields = dict(line.split(": ", 1) for line in message.decode().strip().split("\n"))
+    assert fields["event"] == "delta"
+    return {"id": int(fields["id"]), **json.loads(fields["data"])}
+
+def test_batches_are_shared_and_slow_consumers_coalesced(loop, monkeypatch):
+    monkeypatch.setattr(config, "STREAM_MAX_PENDING", 3)
+
+    async def scenario():
+        bus = event_bus.bus
+        fast, slow = bus.subscribe(), bus.subscribe()
+        for hour in range(10):
+            bus.publish({"orders": 1, "hour": {hour % 2: 1}})
+            bus.flush()
+            fast.drain()
+        assert bus.flush() is None  # nothing pending
+        return fast, slow
+
+    fast, slow = loop.run_until_complete(scenario())
+    assert not fast.queue and slow.coalesced > 0
+    assert len(slow.queue) <= 3
+    # The merged batches still add up to every published delta, ending at the last batch
+    batches = slow.drain()
+    assert sum(batch.orders for batch in batches) == 10
+    assert sum((batch.counts["hour"] for batch in batches), Counter()) == {0: 5, 1: 5}
+    assert batches[-1].sequence == 10
+
+def test_stream_pushes_order_deltas(client, db, loop):
+    customer_id = client.post("/customers/", json=BASE_CUSTOMER).json()["id"]
+    billing_id = client.post(f"/customers/{customer_id}/addresses/", json=BASE_ADDRESS).json()["id"]
+    shipping_id = client.post(f"/customers/{customer_id}/addresses/",
+                              json={**BASE_ADDRESS, "zip_code": "94105"}).json()["id"]
+    leaderboard.get_leaderboard(db)
+
+    stream = event_bus.stream(connected)
+    assert loop.run_until_complete(stream.__anext__()).startswith(b"retry: ")
+    for order_type in ("in_store", "in_store", "online"):
+        order_data = {**create_order_data(billing_id, [billing_id, shipping_id], datetime.utcnow()),
+                      "order_type": order_type}
+        response = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data)
+        assert response.status_code == status.HTTP_200_OK
+    delta = parse(loop.run_until_complete(stream.__anext__()))
+    loop.run_until_complete(stream.aclose())
+
+    order = client.get(f"/orders/{response.json()['id']}").json()
+    hour = str(datetime.fromisoformat(order["order_date"]).hour)
+    assert delta["id"] == 1
+    assert delta["orders"] == 3
+    assert delta["hour"] == {hour: 3}
+    assert sum(delta["day_of_week"].values()) == 3
+    assert delta["billing_zip"] == {"12345": 3}
+    assert delta["shipping_zip"] == {"12345": 3, "94105": 3}
+    assert delta["order_type"] == {"in_store": 2, "online": 1}
+    assert delta["leaderboard"]["today"] == [{"customer_id": customer_id, "in_store_order_count": 2}]
+    assert event_bus.bus.subscriber_count == 0
+
+def test_unchanged_leaderboard_is_not_resent(loop):
+    async def scenario():
+        bus = event_bus.bus
+        subscriber = bus.subscribe()
+        top = {"today": [{"customer_id": 1, "in_store_order_count": 1}]}
+        for _ in range(2):
+            bus.publish({"orders": 1, "leaderboard": top})
+            bus.flush()
+        return [json.loads(batch.payload().decode().split("data: ")[1]) for batch in subscriber.drain()]
+
+    first, second = loop.run_until_complete(scenario())
+    assert "leaderboard" in first and "leaderboard" not in second
@@ -0,0 +1,160 @@
+import pytest
+from fastapi import status
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from app import models
+from app.api.services import hyperloglog
+from app.api.queries.zip_sketch_queries import get_unique_customers_by_zip, rebuild_zip_customer_sketches
+from .mock_data import get_test_customers, get_test_addresses_with_zip_codes, create_order_data
+
+# Estimates must be within three standard errors of the exact count
+TOLERANCE = 3 * hyperloglog.RELATIVE_ERROR
+
+def test_hyperloglog_accuracy_and_merge():
+    days = [hyperloglog.HyperLogLog() for _ in range(5)]
+    exact = [set() for _ in range(5)]
+    for value in range(200_000):
+        # Most customers order on two different days
+        for day in {value % 5, (value * 7) % 5}:
+            days[day].add(value)
+            exact[day].add(value)
+
+    merged = hyperloglog.HyperLogLog()
+    for day, values in zip(days, exact):
+        assert abs(day.count() - len(values)) <= TOLERANCE * len(values)
+        merged.merge(day)
+    assert abs(merged.count() - 200_000) <= TOLERANCE * 200_000
+    assert hyperloglog.HyperLogLog(merged.entries()).count() == merged.count()
+
+def test_hyperloglog_small_counts_are_exact():
+    sketch = hyperloglog.HyperLogLog()
+    for value in range(1, 101):
+        sketch.add(value)
+        sketch.add(value)
+        assert sketch.count() == value
+
+def test_sparse_and_dense_sketches_merge_per_zip(db):
+    """Dense sketches merged in Python agree with merging the sketches in memory."""
+    sketches = {}
+    for day, zip_code, values in [
+        (1, "00001", range(0, 5000)), (2, "00001", range(3000, 9000)), (3, "00001", range(8000, 8500)),
+        (1, "00002", range(0, 4000)), (1, "00003", range(0, 300)), (2, "00003", range(200, 400)),
+    ]:
+        sketch = hyperloglog.HyperLogLog()
+        for value in values:
+            sketch.add(value)
+        sketches[(datetime(2024, 3, day).date(), zip_code)] = sketch
+    db.execute(models.ZipCustomerSketch.__table__.insert(), [
+        {"bucket_date": day, "address_type": "billing", "zip_code": zip_code, "entries": entries, "registers": registers}
+        for (day, zip_code), sketch in sketches.items()
+        for entries, registers in [sketch.storage()]
+    ])
+    db.commit()
+
+    expected = {}
+    for (_, zip_code), sketch in sketches.items():
+        expected.setdefault(zip_code, hyperloglog.HyperLogLog()).merge(sketch)
+    assert get_unique_customers_by_zip(db) == {zip_code: sketch.count() for zip_code, sketch in expected.items()}
+
+def test_zip_sketches_match_exact_distinct_counts(db):
+    """Sketches rebuilt from generated orders estimate COUNT(DISTINCT customer_id) per zip and window."""
+    db.execute(text("""
+        INSERT INTO customers (id, first_name, last_name, email, telephone)
+        SELECT n, 'First', 'Last', 'customer' || n || '@example.com', '+1' || (5550000000 + n)
+        FROM generate_series(1, 6000) AS n
+    """))
+    db.execute(text("""
+        INSERT INTO addresses (id, street_address, city, state, zip_code, billing_customer_id,
+                               is_billing_address, is_shipping_address)
+        SELECT n, n || ' Main St', 'City', 'ST', lpad(CAST(n % 4 AS text), 5, '0'), n, TRUE, TRUE
+        FROM generate_series(1, 6000) AS n
+    """))
+    # 20000 orders: customers order repeatedly, from their own zip, over ten days
+    db.execute(text("""
+        INSERT INTO orders (id, customer_id, order_date, total_amount, status, order_type, billing_address_id)
+        SELECT n, c, date '2024-03-01' + make_interval(days => n / 2000 % 10, mins => n % 600), 10, 'completed', 'online', c
+        FROM generate_series(1, 20000) AS n, LATERAL (SELECT (n * 7919) % 6000 + 1 AS c) AS customer
+    """))
+    db.execute(text("""
+        INSERT INTO order_shipping_addresses (order_id, order_date, address_id, sequence)
+        SELECT id, order_date, (customer_id + 1) % 6000 + 1, 1 FROM orders
+    """))
+    db.commit()
+    assert rebuild_zip_customer_sketches(db) == 2 * 4 * 10
+
+    windows = [(None, None), (datetime(2024, 3, 3), datetime(2024, 3, 5)), (datetime(2024, 3, 9), None)]
+    for address_type, join in (
+        ("billing", "JOIN addresses a ON a.id = o.billing_address_id"),
+        ("shipping", "JOIN order_shipping_addresses s ON s.order_id = o.id JOIN addresses a ON a.id = s.address_id"),
+    ):
+        for start, end in windows:
+            exact = dict(db.execute(text(f"""
+                SELECT a.zip_code, count(DISTINCT o.customer_id) FROM orders o {join}
+                WHERE (CAST(:start AS timestamp) IS NULL OR o.order_date >= :start)
+                  AND (CAST(:end AS timestamp) IS NULL OR o.order_date < :end)
+                GROUP BY a.zip_code
+            """), {"start": start, "end": end}).fetchall())
+            estimated = get_unique_customers_by_zip(db, address_type, start, end)
+            assert estimated.keys() == exact.keys()
+            for zip_code, count in exact.items():
+                assert abs(estimated[zip_code] - count) <= TOLERANCE * count, (address_type, start, zip_code)
+
+def test_zip_analytics_report_unique_customers(client, db):
+    """The order-creation path keeps the sketches current, matching a rebuild."""
+    zip_codes = ["12345", "54321"]
+    for index, customer in enumerate(get_test_customers(3)):
+        customer_id = client.post("/customers/", json=customer).json()["id"]
+        address_ids = [
+            client.post(f"/customers/{customer_id}/addresses/", json=address).json()["id"]
+            for address in get_test_addresses_with_zip_codes(zip_codes)
+        ]
+        # Every customer orders twice from 12345; customer 0 also ships to 54321
+        for _ in range(2):
+            shipping = address_ids if index == 0 else address_ids[:1]
+            order_data = create_order_data(address_ids[0], shipping, datetime.utcnow())
+            response = client.post(f"/orders/customers/{customer_id}/orders/", json=order_data)
+            assert response.status_code == status.HTTP_200_OK
+
+    expected = {
+        "billing": [{"zip_code": "12345", "order_count": 6, "unique_customers": 3}],
+        "shipping": [
+            {"zip_code": "12345", "order_count": 6, "unique_customers": 3},
+            {"zip_code": "54321", "order_count": 2, "unique_customers": 1},
+        ],
+    }
+    for address_type, rows in expected.items():
+        response = client.get(f"/analytics/orders/zip-code/?address_type={address_type}")
+        assert response.json() == rows
+
+    rebuild_zip_customer_sketches(db)
+    for address_type, rows in expected.items():
+        response = client.get(f"/analytics/orders/zip-code/?address_type={address_type}")
+        assert response.json() == rows
+    tomorrow = (datetime.utcnow() + timedelta(days=1)).date().isoformat()
+    response = client.get(f"/analytics/orders/zip-code/?start_date={tomorrow}T00:00:00")
+    assert response.json() == []
+
+def test_sketches_switch_from_sparse_to_dense(client, db, monkeypatch):
+    monkeypatch.setattr(hyperloglog, "SPARSE_MAX_ENTRIES", 3)
+    sketch = hyperloglog.HyperLogLog()
+    for value in range(10):
+        sketch.add(value)
+    assert sketch.storage() == ([], sketch.dense())
+    assert hyperloglog.HyperLogLog(dense=sketch.dense()).registers == sketch.registers
+
+    # Five customers order from one zip code: the write path converts the sketch on the fourth
+    for customer in get_test_customers(5):
+        customer_id = client.post("/customers/", json=customer).json()["id"]
+        address_id = client.post(f"/customers/{customer_id}/addresses/", json=get_test_addresses_with_zip_codes(["12345"])[0]).json()["id"]
+        for _ in range(2):
+            order_data = create_order_data(address_id, [address_id], datetime.utcnow())
+            assert client.post(f"/orders/customers/{customer_id}/orders/", json=order_data).status_code == status.HTTP_200_OK
+    entries, registers = db.execute(text(
+        "SELECT entries, registers FROM zip_customer_sketches WHERE address_type = 'billing'"
+    )).one()
+    assert entries == [] and len(registers) == hyperloglog.REGISTERS
+    assert get_unique_customers_by_zip(db, "billing") == {"12345": 5}
+
+    rebuild_zip_customer_sketches(db)
+    assert db.execute(text("SELECT registers FROM zip_customer_sketches WHERE address_type = 'billing'")).scalar() == registers
+    assert get_unique_customers_by_zip(db, "billing") == {"12345": 5}